@@ -2,72 +2,505 @@
 """
 Code Quality Analyzer
 Automated tool for senior fullstack tasks
+
+Scans a JavaScript/TypeScript source tree (e.g. web/frontend/src) for:
+- file sizes (lines, bytes) and oversized files
+- function lengths (function declarations, block-bodied arrows, methods)
+- the import graph: fan-in/fan-out, unresolved relative imports, import cycles
+- duplicate code: runs of identical normalized lines across or within files
+- performance anti-patterns from performance_rules.py (quadratic lookups, N+1
+  queries, unbounded selects, serial awaits), each with an estimated cost class
+
+Per-file analysis runs in worker processes and is cached by content hash in
+<target>/.code-quality-cache.json, so only new or edited files are re-read and
+re-analysed. --since <git-rev> trusts the cache without even stat-ing a file when git
+reports it unchanged since that revision and the git blob id recorded with its cache
+entry matches the revision's (otherwise the size/mtime check applies). The cross-file passes
+(imports, duplicates) work on the cached per-file summaries, so they never re-read
+sources.
 """
 
 import os
+import re
 import sys
 import json
+import time
+import bisect
+import hashlib
 import argparse
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
+from performance_rules import RULES as PERFORMANCE_RULES, check_performance
+
+SOURCE_SUFFIXES = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs')
+SKIPPED_DIRS = {'node_modules', 'dist', 'build', 'coverage', '__pycache__'}
+CACHE_NAME = '.code-quality-cache.json'
+CACHE_VERSION = 2
+
+MAX_FILE_LINES = 500
+MAX_FUNCTION_LINES = 80
+# Consecutive normalized lines that make a duplicate block
+DUPLICATE_WINDOW = 6
+# Fewer files to analyse than this are done in-process: starting workers costs more
+POOL_THRESHOLD = 8
+
+# Comments and string/template literals. Quoted strings must close on their own line,
+# so a stray apostrophe in JSX text only affects that line.
+LITERALS = re.compile(r"//[^\n]*|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`", re.S)
+IDENT = r'[A-Za-z_$][\w$]*'
+PARAMS = r'\((?:[^()]|\([^()]*\))*\)'
+FUNCTION_PATTERNS = [
+    re.compile(rf'\bfunction\s*\*?\s*(?P<name>{IDENT})?\s*{PARAMS}\s*\{{'),
+    re.compile(rf'\b(?:const|let|var)\s+(?P<name>{IDENT})\s*=\s*(?:async\s+)?(?:{PARAMS}|{IDENT})\s*=>\s*\{{'),
+    re.compile(rf'^[ \t]*(?P<name>{IDENT})\s*:\s*(?:async\s+)?(?:{PARAMS}|{IDENT})\s*=>\s*\{{', re.M),
+    re.compile(rf'^[ \t]*(?:static\s+)?(?:async\s+)?(?P<name>{IDENT})\s*{PARAMS}\s*\{{', re.M),
+]
+NOT_METHODS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with', 'else'}
+IMPORT_PATTERNS = [
+    re.compile(r'\bimport\s*(?:[\w$*{},\s]+?\s*from\s*)?([\'"])'),
+    re.compile(r'\bexport\s*[\w$*{},\s]+?\s*from\s*([\'"])'),
+    re.compile(r'\b(?:require|import)\s*\(\s*([\'"])'),
+]
+MEANINGFUL = re.compile(r'[\w$]{2}')
+
+
+def mask_literals(text: str) -> str:
+    """Blank out comments and literal contents, keeping quotes, offsets and newlines."""
+    def blank(match):
+        s = match.group(0)
+        if s[0] in '\'"`':
+            return s[0] + re.sub(r'[^\n]', ' ', s[1:-1]) + s[-1]
+        return re.sub(r'[^\n]', ' ', s)
+    return LITERALS.sub(blank, text)
+
+
+def brace_pairs(masked: str, opening: str = '{', closing: str = '}') -> Dict[int, int]:
+    """Offset of every opening bracket mapped to the offset of its matching closing one."""
+    pairs = {}
+    stack = []
+    for match in re.finditer(re.escape(opening) + '|' + re.escape(closing), masked):
+        if match.group(0) == opening:
+            stack.append(match.start())
+        elif stack:
+            pairs[stack.pop()] = match.start()
+    return pairs
+
+
+def find_functions(masked: str, pairs: Dict[int, int], line_of) -> List[Dict]:
+    functions = {}
+    for pattern in FUNCTION_PATTERNS:
+        for match in pattern.finditer(masked):
+            name = match.group('name') or '<anonymous>'
+            if name in NOT_METHODS:
+                continue
+            brace = match.end() - 1
+            if brace in functions or brace not in pairs:
+                continue
+            start, end = line_of(match.start('name') if match.group('name') else match.start()), line_of(pairs[brace])
+            functions[brace] = {'name': name, 'line': start, 'length': end - start + 1}
+    return sorted(functions.values(), key=lambda f: f['line'])
+
+
+def find_imports(text: str, masked: str, line_of) -> List[List]:
+    """[specifier, line] of every import, re-export and require, first occurrence only."""
+    imports = {}
+    for pattern in IMPORT_PATTERNS:
+        for match in pattern.finditer(masked):
+            quote = match.start(1)
+            close = masked.find(masked[quote], quote + 1)
+            if close != -1:
+                spec = text[quote + 1:close]
+                imports[spec] = min(imports.get(spec, quote), quote)
+    return sorted([spec, line_of(offset)] for spec, offset in imports.items())
+
+
+def duplicate_windows(masked: str) -> List[List]:
+    """[hash, first line, last line] for every run of DUPLICATE_WINDOW meaningful lines."""
+    lines = []
+    for number, line in enumerate(masked.split('\n'), 1):
+        normalized = ' '.join(line.split())
+        if MEANINGFUL.search(normalized) and not normalized.startswith(('import ', 'export {')):
+            lines.append((number, normalized))
+    windows = []
+    for i in range(len(lines) - DUPLICATE_WINDOW + 1):
+        chunk = '\n'.join(line for _, line in lines[i:i + DUPLICATE_WINDOW])
+        digest = hashlib.blake2b(chunk.encode('utf-8'), digest_size=8).hexdigest()
+        windows.append([digest, lines[i][0], lines[i + DUPLICATE_WINDOW - 1][0]])
+    return windows
+
+
+def analyze_source(text: str) -> Dict:
+    """Per-file summary of one source file (runs in worker processes)."""
+    masked = mask_literals(text)
+    newlines = [m.start() for m in re.finditer('\n', text)]
+
+    def line_of(offset):
+        return bisect.bisect_left(newlines, offset) + 1
+
+    lines = text.split('\n')
+    braces = brace_pairs(masked)
+    return {
+        'lines': len(lines) - (1 if text.endswith('\n') else 0),
+        'code_lines': sum(1 for line in masked.split('\n') if line.strip()),
+        'functions': find_functions(masked, braces, line_of),
+        'imports': find_imports(text, masked, line_of),
+        'windows': duplicate_windows(masked),
+        'performance': check_performance(text, masked, braces, brace_pairs(masked, '(', ')'), line_of),
+    }
+
+
+def analyze_file(path: str) -> Dict:
+    data = Path(path).read_bytes()
+    summary = analyze_source(data.decode('utf-8', errors='replace'))
+    summary['sha256'] = hashlib.sha256(data).hexdigest()
+    # git's object id of the same content, matched against a revision's tree by --since
+    summary['blob'] = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+    summary['bytes'] = len(data)
+    return summary
+
+
+def resolve_import(source: str, spec: str, files: set) -> Optional[str]:
+    """Tree-relative path a relative import points to, or None if nothing matches."""
+    base = os.path.normpath(os.path.join(os.path.dirname(source), spec)).replace(os.sep, '/')
+    candidates = [base] + [base + s for s in SOURCE_SUFFIXES] + [f"{base}/index{s}" for s in SOURCE_SUFFIXES]
+    return next((c for c in candidates if c in files), None)
+
+
+def import_cycles(graph: Dict[str, List[str]]) -> List[List[str]]:
+    """Strongly connected components with more than one file (Tarjan, iterative)."""
+    index, low, on_stack, stack, cycles = {}, {}, set(), [], []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph[child])))
+                elif child in on_stack:
+                    low[node] = min(low[node], index[child])
+                continue
+            work.pop()
+            if work:
+                low[work[-1][0]] = min(low[work[-1][0]], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1:
+                    cycles.append(sorted(component))
+    return sorted(cycles)
+
+
+def duplicate_blocks(summaries: Dict[str, Dict]) -> List[Dict]:
+    """Merge duplicated windows into blocks: {file, line, end_line, lines, also_in}."""
+    locations = {}
+    for path, summary in summaries.items():
+        for digest, first, last in summary['windows']:
+            locations.setdefault(digest, []).append((path, first))
+    repeated = {digest: locs for digest, locs in locations.items() if len(locs) > 1}
+
+    blocks = []
+    for path in sorted(summaries):
+        block = None
+        for digest, first, last in summaries[path]['windows']:
+            others = [(p, f) for p, f in repeated.get(digest, ()) if p != path or abs(f - first) >= DUPLICATE_WINDOW]
+            if not others:
+                block = None
+                continue
+            if block is None:
+                block = {'file': path, 'line': first, 'end_line': last, 'partners': set()}
+                blocks.append(block)
+            block['end_line'] = last
+            block['partners'].update(others)
+    for block in blocks:
+        block['lines'] = block['end_line'] - block['line'] + 1
+        # The same block elsewhere shows up once per overlapping window: keep its first line
+        also_in = []
+        for path, line in sorted(block.pop('partners')):
+            if also_in and also_in[-1][0] == path and line - also_in[-1][2] <= DUPLICATE_WINDOW:
+                also_in[-1][2] = line
+            else:
+                also_in.append([path, line, line])
+        block['also_in'] = [f"{path}:{line}" for path, line, _ in also_in]
+    return blocks
+
+
+def git(target: Path, rev: str, *args) -> str:
+    try:
+        return subprocess.run(['git', '-C', str(target), *args], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        detail = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) else e
+        raise ValueError(f"Cannot list changes since {rev}: {detail}")
+
+
+def changed_since(target: Path, rev: str) -> set:
+    """Files under target changed since a git revision, plus untracked ones."""
+    changed = git(target, rev, 'diff', '--name-only', '--relative', rev, '--').split('\n')
+    changed += git(target, rev, 'ls-files', '--others', '--exclude-standard').split('\n')
+    return {path for path in changed if path}
+
+
+def blob_ids(target: Path, rev: str) -> Dict[str, str]:
+    """Git blob id of every file under target at a revision."""
+    blobs = {}
+    for entry in git(target, rev, 'ls-tree', '-r', '-z', rev).split('\0'):
+        meta, _, path = entry.partition('\t')
+        if path:
+            blobs[path] = meta.split()[2]
+    return blobs
+
 
 class CodeQualityAnalyzer:
     """Main class for code quality analyzer functionality"""
-    
-    def __init__(self, target_path: str, verbose: bool = False):
+
+    def __init__(self, target_path: str, verbose: bool = False, since: Optional[str] = None,
+                 jobs: Optional[int] = None, use_cache: bool = True):
         self.target_path = Path(target_path)
         self.verbose = verbose
+        self.since = since
+        self.jobs = jobs or os.cpu_count() or 1
+        self.use_cache = use_cache
         self.results = {}
-    
+
     def run(self) -> Dict:
         """Execute the main functionality"""
         print(f"🚀 Running {self.__class__.__name__}...")
         print(f"📁 Target: {self.target_path}")
-        
+
         try:
             self.validate_target()
             self.analyze()
             self.generate_report()
-            
+
             print("✅ Completed successfully!")
             return self.results
-            
+
         except Exception as e:
             print(f"❌ Error: {e}")
             sys.exit(1)
-    
+
     def validate_target(self):
         """Validate the target path exists and is accessible"""
         if not self.target_path.exists():
             raise ValueError(f"Target path does not exist: {self.target_path}")
-        
+        if not self.target_path.is_dir():
+            raise ValueError(f"Target path is not a directory: {self.target_path}")
+
         if self.verbose:
             print(f"✓ Target validated: {self.target_path}")
-    
+
+    def source_files(self) -> List[str]:
+        """Source files under the target, relative to it."""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.target_path):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d not in SKIPPED_DIRS)
+            rel = Path(dirpath).relative_to(self.target_path)
+            files.extend((rel / f).as_posix() for f in sorted(filenames) if f.endswith(SOURCE_SUFFIXES))
+        return files
+
+    def load_cache(self) -> Dict:
+        try:
+            with open(self.target_path / CACHE_NAME) as f:
+                cache = json.load(f)
+            if cache.get('version') == CACHE_VERSION and cache.get('analyzer') == analyzer_fingerprint():
+                return cache
+        except (OSError, ValueError):
+            pass
+        return {'files': {}, 'summaries': {}}
+
+    def write_cache(self, files: Dict, summaries: Dict):
+        path = self.target_path / CACHE_NAME
+        cache = {'version': CACHE_VERSION, 'analyzer': analyzer_fingerprint(), 'files': files,
+                 'summaries': {files[p]['sha256']: summaries[p] for p in files}}
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f, separators=(',', ':'))
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def summarize_files(self, files: List[str]) -> Dict[str, Dict]:
+        """Per-file summaries, from the cache where the file is unchanged."""
+        cache = self.load_cache() if self.use_cache else {'files': {}, 'summaries': {}}
+        known, by_hash = cache['files'], cache['summaries']
+        # Unchanged since the revision: the content is the revision's blob
+        trusted = {}
+        if self.since:
+            changed = changed_since(self.target_path, self.since)
+            trusted = {p: blob for p, blob in blob_ids(self.target_path, self.since).items() if p not in changed}
+
+        summaries, stats, pending = {}, {}, []
+        for path in files:
+            old = known.get(path)
+            if old and path in trusted and old.get('blob') == trusted[path] and old['sha256'] in by_hash:
+                summaries[path], stats[path] = by_hash[old['sha256']], old
+                continue
+            st = (self.target_path / path).stat()
+            if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns and old['sha256'] in by_hash:
+                summaries[path], stats[path] = by_hash[old['sha256']], old
+                continue
+            stats[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            pending.append(path)
+
+        if self.jobs > 1 and len(pending) >= POOL_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                fresh = pool.map(analyze_file, [str(self.target_path / p) for p in pending], chunksize=4)
+                fresh = dict(zip(pending, fresh))
+        else:
+            fresh = {p: analyze_file(str(self.target_path / p)) for p in pending}
+        for path, summary in fresh.items():
+            stats[path]['sha256'] = summary.pop('sha256')
+            stats[path]['blob'] = summary.pop('blob')
+            summaries[path] = summary
+
+        if self.use_cache and (pending or set(known) != set(files)):
+            self.write_cache(stats, summaries)
+        self.results['analyzed'] = len(pending)
+        self.results['cached'] = len(files) - len(pending)
+        return summaries
+
     def analyze(self):
         """Perform the main analysis or operation"""
         if self.verbose:
             print("📊 Analyzing...")
-        
-        # Main logic here
+        start = time.perf_counter()
+        files = self.source_files()
+        summaries = self.summarize_files(files)
+        findings = []
+
+        # File sizes and function lengths
+        for path in files:
+            summary = summaries[path]
+            if summary['lines'] > MAX_FILE_LINES:
+                findings.append({'rule': 'large-file', 'severity': 'warning', 'file': path, 'line': 1,
+                                 'message': f"{summary['lines']} lines (max {MAX_FILE_LINES})"})
+            for function in summary['functions']:
+                if function['length'] > MAX_FUNCTION_LINES:
+                    findings.append({'rule': 'long-function', 'severity': 'warning', 'file': path,
+                                     'line': function['line'],
+                                     'message': f"{function['name']} is {function['length']} lines (max {MAX_FUNCTION_LINES})"})
+
+        # Performance anti-patterns (performance_rules.py)
+        for path in files:
+            for finding in summaries[path]['performance']:
+                rule = PERFORMANCE_RULES[finding['rule']]
+                findings.append({'rule': finding['rule'], 'severity': rule['severity'], 'file': path,
+                                 'line': finding['line'], 'message': finding['message'], 'cost': rule['cost']})
+
+        # Import graph over the files in the tree
+        known = set(files)
+        graph = {path: [] for path in files}
+        fan_in = {path: 0 for path in files}
+        external = {}
+        for path in files:
+            for spec, line in summaries[path]['imports']:
+                if not spec.startswith('.'):
+                    package = '/'.join(spec.split('/')[:2 if spec.startswith('@') else 1])
+                    external[package] = external.get(package, 0) + 1
+                    continue
+                resolved = resolve_import(path, spec, known)
+                if resolved is None:
+                    if not spec.endswith(('.css', '.svg', '.png', '.json')):
+                        findings.append({'rule': 'unresolved-import', 'severity': 'error', 'file': path, 'line': line,
+                                         'message': f"Cannot resolve '{spec}'"})
+                    continue
+                graph[path].append(resolved)
+                fan_in[resolved] += 1
+        cycles = import_cycles(graph)
+        for cycle in cycles:
+            findings.append({'rule': 'import-cycle', 'severity': 'warning', 'file': cycle[0], 'line': 1,
+                             'message': f"Import cycle: {' -> '.join(cycle)}"})
+
+        # Duplicate code
+        duplicates = duplicate_blocks(summaries)
+        for block in duplicates:
+            findings.append({'rule': 'duplicate-code', 'severity': 'info', 'file': block['file'], 'line': block['line'],
+                             'message': f"{block['lines']} lines duplicated in {', '.join(block['also_in'][:5])}"
+                                        + (f" and {len(block['also_in']) - 5} more" if len(block['also_in']) > 5 else '')})
+
         self.results['status'] = 'success'
         self.results['target'] = str(self.target_path)
-        self.results['findings'] = []
-        
+        if self.since:
+            self.results['since'] = self.since
+        self.results['summary'] = {
+            'files': len(files),
+            'lines': sum(s['lines'] for s in summaries.values()),
+            'code_lines': sum(s['code_lines'] for s in summaries.values()),
+            'functions': sum(len(s['functions']) for s in summaries.values()),
+            'duplicated_lines': sum(b['lines'] for b in duplicates),
+            'import_cycles': len(cycles),
+        }
+        self.results['files'] = [
+            {'file': path, 'bytes': summaries[path]['bytes'], 'lines': summaries[path]['lines'], 'code_lines': summaries[path]['code_lines'],
+             'functions': len(summaries[path]['functions']),
+             'longest_function': max((f['length'] for f in summaries[path]['functions']), default=0),
+             'imports': len(graph[path]), 'imported_by': fan_in[path]}
+            for path in files
+        ]
+        self.results['external_imports'] = dict(sorted(external.items(), key=lambda item: (-item[1], item[0])))
+        self.results['findings'] = sorted(findings, key=lambda f: (f['file'], f['line'], f['rule']))
+        self.results['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
         # Add analysis results
         if self.verbose:
             print(f"✓ Analysis complete: {len(self.results.get('findings', []))} findings")
-    
+
     def generate_report(self):
         """Generate and display the report"""
+        summary = self.results.get('summary', {})
         print("\n" + "="*50)
         print("REPORT")
         print("="*50)
         print(f"Target: {self.results.get('target')}")
         print(f"Status: {self.results.get('status')}")
+        print(f"Files: {summary.get('files', 0)} ({self.results.get('analyzed', 0)} analysed, "
+              f"{self.results.get('cached', 0)} cached) in {self.results.get('elapsed_ms', 0):.1f} ms")
+        print(f"Lines: {summary.get('lines', 0)} ({summary.get('code_lines', 0)} code), "
+              f"functions: {summary.get('functions', 0)}")
+        print(f"Duplicated lines: {summary.get('duplicated_lines', 0)}, import cycles: {summary.get('import_cycles', 0)}")
         print(f"Findings: {len(self.results.get('findings', []))}")
+        counts = {}
+        for finding in self.results.get('findings', []):
+            counts[finding['rule']] = counts.get(finding['rule'], 0) + 1
+        for rule, count in sorted(counts.items()):
+            print(f"  {rule}: {count}")
+        if self.verbose:
+            for finding in self.results.get('findings', []):
+                print(f"  {finding['file']}:{finding['line']} [{finding['rule']}] {finding['message']}")
         print("="*50 + "\n")
 
+
+def analyzer_fingerprint() -> str:
+    """Hash of this script and its rule pack, so cached summaries are dropped when the analysis changes."""
+    h = hashlib.sha256(Path(__file__).read_bytes())
+    h.update(Path(__file__).with_name('performance_rules.py').read_bytes())
+    return h.hexdigest()[:16]
+
+
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(
@@ -91,16 +524,33 @@ def main():
         '--output', '-o',
         help='Output file path'
     )
-    
+    parser.add_argument(
+        '--since',
+        help='Only re-analyse files changed since this git revision'
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        help='Worker processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignore and do not write the per-file cache'
+    )
+
     args = parser.parse_args()
-    
+
     tool = CodeQualityAnalyzer(
         args.target,
-        verbose=args.verbose
+        verbose=args.verbose,
+        since=args.since,
+        jobs=args.jobs,
+        use_cache=not args.no_cache
     )
-    
+
     results = tool.run()
-    
+
     if args.json:
         output = json.dumps(results, indent=2)
         if args.output:
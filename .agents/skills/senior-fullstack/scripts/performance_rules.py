@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Performance Rules
+Anti-pattern rule pack for code_quality_analyzer.py (Supabase client code)
+
+Rules, each with the cost class reported on its findings:
+- quadratic-lookup  O(n*m)            .find/.filter/.some/... inside a loop or an
+                                      iteration callback (e.g. OIL_LIBRARY.find per oil)
+- n-plus-one        O(n) round trips  a Supabase query inside a loop or iteration
+                                      callback, or an await inside a for/while body
+- unbounded-select  O(table)          .from(...).select(...) with no filter, limit,
+                                      range or single()
+- select-star       O(rows*columns)   select('*') fetching every column
+- serial-await      sum of latencies  consecutive independent reads awaited one after
+                                      another instead of with Promise.all
+
+The checks run on source already masked by the analyzer (comments and literal
+contents blanked, offsets preserved), so they are regex and bracket matching
+rather than a full JavaScript parse.
+"""
+
+import re
+from typing import Dict, List
+
+RULES = {
+    'quadratic-lookup': {'severity': 'warning', 'cost': 'O(n*m)'},
+    'n-plus-one': {'severity': 'warning', 'cost': 'O(n) round trips'},
+    'unbounded-select': {'severity': 'warning', 'cost': 'O(table)'},
+    'select-star': {'severity': 'info', 'cost': 'O(rows*columns)'},
+    'serial-await': {'severity': 'info', 'cost': 'sum of latencies'},
+}
+
+ITERATION_CALL = re.compile(r'\.(?:map|forEach|filter|reduce|reduceRight|flatMap|some|every|find|findIndex)\s*\(')
+LOOP_STATEMENT = re.compile(r'\b(?:for|while)\s*(?:await\s*)?\(')
+LINEAR_LOOKUP = re.compile(r'\.(?P<method>find|findIndex|findLast|filter|some|every|indexOf|lastIndexOf)\s*\(')
+CALLBACK = re.compile(r'\s*(?:async\s+)?(?:function\b|[\w$]+\s*=>|\([^()]*\)\s*=>)')
+RECEIVER = re.compile(r'([\w$.\]\)]+)\s*$')
+QUERY = re.compile(r'\bsupabase\s*\.\s*(?:from|rpc)\s*\(')
+FROM = re.compile(r'\.from\s*\(')
+SELECT = re.compile(r'\.select\s*\(')
+BOUNDED = re.compile(r'\.(?:limit|range|single|maybeSingle|eq|neq|in|gt|gte|lt|lte|like|ilike|is|match|'
+                     r'filter|or|not|contains|containedBy|textSearch)\s*\(|\bhead\s*:\s*true')
+MUTATION = re.compile(r'\.(?:insert|update|upsert|delete|rpc)\s*\(')
+STATEMENT_AWAIT = re.compile(r'(?:(?:const|let|var)\s+(?P<bind>[^;=]+?)\s*=\s*)?\bawait\b')
+IDENT = re.compile(r'[A-Za-z_$][\w$]*')
+
+
+def statement_end(masked: str, pos: int) -> int:
+    """Offset of the ';' (or closing bracket) that ends the statement running at pos."""
+    depth = 0
+    for match in re.compile(r'[()\[\]{};]').finditer(masked, pos):
+        ch = match.group(0)
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+            if depth < 0:
+                return match.start()
+        elif depth == 0:
+            return match.start()
+    return len(masked)
+
+
+def loop_regions(masked: str, braces: Dict[int, int], parens: Dict[int, int]) -> Dict[str, List]:
+    """
+    Spans executed once per element.
+
+    Returns:
+        {'callbacks': [(start, end)], 'bodies': [(start, end)]} - iteration callback
+        arguments, and for/while bodies
+    """
+    callbacks = []
+    for match in ITERATION_CALL.finditer(masked):
+        paren = match.end() - 1
+        if paren in parens:
+            callbacks.append((paren, parens[paren]))
+    bodies = []
+    for match in LOOP_STATEMENT.finditer(masked):
+        paren = match.end() - 1
+        if paren not in parens:
+            continue
+        after = parens[paren] + 1
+        body = after + len(masked[after:]) - len(masked[after:].lstrip())
+        if masked[body:body + 1] == '{' and body in braces:
+            bodies.append((body, braces[body]))
+        else:
+            bodies.append((body, statement_end(masked, body)))
+    return {'callbacks': callbacks, 'bodies': bodies}
+
+
+def previous_char(masked: str, pos: int) -> str:
+    """Last non-blank character before pos ('' at the start of the file)."""
+    while pos > 0 and masked[pos - 1].isspace():
+        pos -= 1
+    return masked[pos - 1] if pos > 0 else ''
+
+
+def inside(offset: int, regions) -> bool:
+    return any(start < offset < end for start, end in regions)
+
+
+def check_loops(masked: str, regions: Dict[str, List], line_of) -> List[Dict]:
+    findings = []
+    loops = regions['callbacks'] + regions['bodies']
+    for match in LINEAR_LOOKUP.finditer(masked):
+        method = match.group('method')
+        if not inside(match.start(), loops):
+            continue
+        # Array scans take a callback; indexOf takes the value to look for
+        if method not in ('indexOf', 'lastIndexOf') and not CALLBACK.match(masked, match.end()):
+            continue
+        receiver = RECEIVER.search(masked, max(0, match.start() - 80), match.start())
+        receiver = receiver.group(1) if receiver else 'array'
+        findings.append({'rule': 'quadratic-lookup', 'line': line_of(match.start()),
+                         'message': f"{receiver}.{method}() inside a loop scans {receiver} once per element; "
+                                    f"index it in a Map/Set first"})
+
+    flagged = set()
+    for match in QUERY.finditer(masked):
+        if inside(match.start(), loops):
+            line = line_of(match.start())
+            flagged.add(line)
+            findings.append({'rule': 'n-plus-one', 'line': line,
+                             'message': "Supabase query issued once per element; batch it with .in() or a single upsert"})
+    for match in STATEMENT_AWAIT.finditer(masked):
+        line = line_of(match.start())
+        if line not in flagged and inside(match.start(), regions['bodies']):
+            flagged.add(line)
+            findings.append({'rule': 'n-plus-one', 'line': line,
+                             'message': "await inside a loop body makes one sequential round trip per element"})
+    return findings
+
+
+def check_selects(text: str, masked: str, line_of) -> List[Dict]:
+    findings = []
+    for match in FROM.finditer(masked):
+        start = match.start()
+        statement = masked[max(0, masked.rfind(';', 0, start), masked.rfind('{', 0, start), masked.rfind('}', 0, start)):start]
+        chain = masked[start:statement_end(masked, start)]
+        select = SELECT.search(chain)
+        if not select:
+            continue
+        at = start + select.start()
+        # Select-star: the first argument is a string starting with '*' (head: true only counts)
+        arg = start + select.end()
+        while masked[arg:arg + 1].isspace():
+            arg += 1
+        if (masked[arg:arg + 1] in ('"', "'", '`') and text[arg + 1:arg + 2] == '*'
+                and not re.search(r'\bhead\s*:\s*true', chain)):
+            findings.append({'rule': 'select-star', 'line': line_of(at),
+                             'message': "select('*') fetches every column; list the columns the caller uses"})
+        # Queries assigned to a let are usually narrowed further down
+        if MUTATION.search(chain) or BOUNDED.search(chain) or re.search(r'\blet\s+[\w$]+\s*=', statement):
+            continue
+        findings.append({'rule': 'unbounded-select', 'line': line_of(at),
+                         'message': "select without a filter, limit or range reads the whole table; "
+                                    "aggregate in SQL or page with .range()"})
+    return findings
+
+
+def check_serial_awaits(masked: str, regions: Dict[str, List], line_of) -> List[Dict]:
+    findings = []
+    loops = regions['callbacks'] + regions['bodies']
+    chain = []
+    previous_end = None
+    for match in STATEMENT_AWAIT.finditer(masked):
+        # Only awaits that start a statement
+        if previous_char(masked, match.start()) not in ('', ';', '{', '}'):
+            continue
+        end = statement_end(masked, match.end())
+        expression = masked[match.end():end]
+        names = set(IDENT.findall(expression))
+        # Reads whose results are bound and that do not use an earlier result in the run
+        parallel = bool(match.group('bind')) and not MUTATION.search(expression)
+        contiguous = previous_end is not None and not masked[previous_end + 1:match.start()].strip()
+        entry = {'start': match.start(), 'bound': set(IDENT.findall(match.group('bind') or ''))}
+        if chain and contiguous and parallel and all(b['bound'].isdisjoint(names) for b in chain):
+            chain.append(entry)
+        else:
+            findings.extend(serial_finding(chain, loops, line_of))
+            chain = [entry] if parallel else []
+        previous_end = end
+    findings.extend(serial_finding(chain, loops, line_of))
+    return findings
+
+
+def serial_finding(chain, loops, line_of) -> List[Dict]:
+    if len(chain) < 2 or inside(chain[0]['start'], loops):
+        return []
+    return [{'rule': 'serial-await', 'line': line_of(chain[0]['start']),
+             'message': f"{len(chain)} independent awaits run one after another; start them together with Promise.all"}]
+
+
+def check_performance(text: str, masked: str, braces: Dict[int, int], parens: Dict[int, int], line_of) -> List[Dict]:
+    """
+    Run every rule over one file.
+
+    Returns:
+        list of {rule, line, message}, by line
+    """
+    regions = loop_regions(masked, braces, parens)
+    findings = (check_loops(masked, regions, line_of) + check_selects(text, masked, line_of)
+                + check_serial_awaits(masked, regions, line_of))
+    return sorted(findings, key=lambda f: (f['line'], f['rule']))
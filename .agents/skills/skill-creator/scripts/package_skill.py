@@ -3,29 +3,174 @@
 Skill Packager - Creates a distributable .skill file of a skill folder
 
 Usage:
-    python utils/package_skill.py <path/to/skill-folder> [output-directory]
+    python utils/package_skill.py <path/to/skill-folder> [output-directory] [--full] [--jobs N] [--verbose]
+    python utils/package_skill.py --all <path/to/skills-root> [output-directory]
 
 Example:
     python utils/package_skill.py skills/public/my-skill
     python utils/package_skill.py skills/public/my-skill ./dist
+    python utils/package_skill.py --all .agents/skills ./dist
+
+Packaging is incremental. Next to each <name>.skill a <name>.skill.manifest.json
+records every member's size, mtime, SHA-256 and where its compressed bytes sit in
+the archive. On the next run:
+
+- Files whose size and mtime are unchanged are not re-read.
+- If no content changed, the run does nothing. Validation is skipped too.
+- Otherwise the archive is rewritten. Unchanged members' compressed bytes are copied
+  straight from the previous archive, and only new or changed files are compressed.
+
+Large members are compressed in parallel worker processes. Already-compressed assets
+(images, archives, fonts, media) are stored with ZIP_STORED instead of deflated
+again. --full ignores the manifest.
 """
 
+import hashlib
+import json
+import os
+import struct
 import sys
+import tempfile
+import time
+import zlib
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from quick_validate import validate_skill
 
+MANIFEST_VERSION = 1
+COMPRESS_LEVEL = 6
+# Members at least this big are deflated in worker processes
+PARALLEL_THRESHOLD = 256 * 1024
+READ_CHUNK = 1 << 20
+# Formats that are already compressed: deflating them again only costs time
+STORED_SUFFIXES = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar', '.jar', '.whl', '.skill',
+    '.woff', '.woff2', '.mp3', '.mp4', '.m4a', '.mov', '.webm', '.ogg',
+}
+# ZIP 2.0 (deflate), made on Unix so the mode bits are kept
+VERSION_NEEDED = 20
+VERSION_MADE_BY = (3 << 8) | 20
+UTF8_FLAG = 0x800
+MAX_ZIP32 = 0xFFFFFFFF
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compress_file(path, method):
+    """
+    Read and compress one file.
+
+    Returns:
+        (method, crc32, file_size, data) - deflate falls back to stored when it
+        does not make the file smaller
+    """
+    data = Path(path).read_bytes()
+    crc = zlib.crc32(data)
+    if method == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        packed = compressor.compress(data) + compressor.flush()
+        if len(packed) < len(data):
+            return method, crc, len(data), packed
+    return zipfile.ZIP_STORED, crc, len(data), data
+
+
+def dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800))  # ZIP cannot represent dates before 1980
+    return ((t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday,
+            t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2)
+
+
+class SkillArchiveWriter:
+    """Minimal ZIP writer that accepts members already compressed."""
+
+    def __init__(self, f):
+        self.f = f
+        self.central = []
+
+    def add(self, arcname, entry, data):
+        """Write a member; entry has method, crc, size, mtime and mode. Returns the data offset."""
+        name = arcname.encode('utf-8')
+        flags = UTF8_FLAG if not arcname.isascii() else 0
+        date, clock = dos_datetime(entry['mtime'])
+        offset = self.f.tell()
+        if offset > MAX_ZIP32 or len(data) > MAX_ZIP32 or entry['size'] > MAX_ZIP32:
+            raise ValueError(f"{arcname}: skills larger than 4 GiB need ZIP64, which is not supported")
+        self.f.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, VERSION_NEEDED, flags, entry['method'],
+                                 clock, date, entry['crc'], len(data), entry['size'], len(name), 0))
+        self.f.write(name)
+        data_offset = self.f.tell()
+        self.f.write(data)
+        self.central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, VERSION_MADE_BY, VERSION_NEEDED,
+                                        flags, entry['method'], clock, date, entry['crc'], len(data),
+                                        entry['size'], len(name), 0, 0, 0, 0,
+                                        (entry['mode'] & 0xFFFF) << 16, offset) + name)
+        return data_offset
+
+    def close(self):
+        start = self.f.tell()
+        for record in self.central:
+            self.f.write(record)
+        size = self.f.tell() - start
+        count = len(self.central)
+        if count > 0xFFFF or start > MAX_ZIP32:
+            raise ValueError("Too many members for a ZIP without ZIP64")
+        self.f.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, size, start, 0))
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def scan_skill(skill_path, previous, exclude):
+    """
+    Current members of a skill folder.
+
+    Returns:
+        {arcname: {path, size, mtime, mtime_ns, mode, sha256}} in archive order;
+        the hash is reused from `previous` when size and mtime are unchanged
+    """
+    entries = {}
+    for file_path in sorted(skill_path.rglob('*')):
+        if not file_path.is_file() or file_path in exclude:
+            continue
+        arcname = file_path.relative_to(skill_path.parent).as_posix()
+        st = file_path.stat()
+        old = previous.get(arcname)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            digest = old['sha256']
+        else:
+            digest = file_digest(file_path)
+        entries[arcname] = {'path': str(file_path), 'size': st.st_size, 'mtime': st.st_mtime,
+                            'mtime_ns': st.st_mtime_ns, 'mode': st.st_mode, 'sha256': digest}
+    return entries
 
-def package_skill(skill_path, output_dir=None):
+
+def package_skill(skill_path, output_dir=None, full=False, pool=None, verbose=True):
     """
     Package a skill folder into a .skill file.
 
     Args:
         skill_path: Path to the skill folder
         output_dir: Optional output directory for the .skill file (defaults to current directory)
+        full: Ignore the manifest and rebuild every member
+        pool: Optional ProcessPoolExecutor for compressing large members
+        verbose: Print a line per added or changed member
 
     Returns:
-        Path to the created .skill file, or None if error
+        Path to the .skill file (created, updated or already up to date), or None if error
     """
     skill_path = Path(skill_path).resolve()
 
@@ -44,15 +189,6 @@ def package_skill(skill_path, output_dir=None):
         print(f"❌ Error: SKILL.md not found in {skill_path}")
         return None
 
-    # Run validation before packaging
-    print("🔍 Validating skill...")
-    valid, message = validate_skill(skill_path)
-    if not valid:
-        print(f"❌ Validation failed: {message}")
-        print("   Please fix the validation errors before packaging.")
-        return None
-    print(f"✅ {message}\n")
-
     # Determine output location
     skill_name = skill_path.name
     if output_dir:
@@ -62,19 +198,95 @@ def package_skill(skill_path, output_dir=None):
         output_path = Path.cwd()
 
     skill_filename = output_path / f"{skill_name}.skill"
+    manifest_path = output_path / f"{skill_name}.skill.manifest.json"
+
+    manifest = None if full else load_manifest(manifest_path)
+    previous = manifest['entries'] if manifest else {}
+    # Compressed bytes can only be reused from the archive the manifest describes
+    archive_ok = (manifest is not None and skill_filename.exists()
+                  and skill_filename.stat().st_size == manifest.get('archive_size'))
+    reusable = previous if archive_ok else {}
+
+    entries = scan_skill(skill_path, previous, {skill_filename, manifest_path})
+    skill_md_arcname = skill_md.relative_to(skill_path.parent).as_posix()
+    unchanged = {a for a, e in entries.items() if a in reusable and reusable[a]['sha256'] == e['sha256']}
 
-    # Create the .skill file (zip format)
+    if archive_ok and len(unchanged) == len(entries) == len(previous):
+        # Contents match the archive: refresh touched mtimes so the next scan stays cheap
+        touched = [a for a, e in entries.items() if previous[a]['mtime_ns'] != e['mtime_ns']]
+        for arcname in touched:
+            previous[arcname]['mtime_ns'] = entries[arcname]['mtime_ns']
+        if touched:
+            write_manifest(manifest_path, manifest)
+        print(f"✅ {skill_name}: up to date ({len(entries)} files)")
+        return skill_filename
+
+    # Run validation before packaging (unless SKILL.md is unchanged and was valid)
+    if skill_md_arcname not in unchanged:
+        if verbose:
+            print("🔍 Validating skill...")
+        valid, message = validate_skill(skill_path)
+        if not valid:
+            print(f"❌ Validation failed: {message}")
+            print("   Please fix the validation errors before packaging.")
+            return None
+        if verbose:
+            print(f"✅ {message}\n")
+
+    # Create the .skill file (zip format) next to the old one, then swap it in
     try:
-        with zipfile.ZipFile(skill_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Walk through the skill directory
-            for file_path in skill_path.rglob('*'):
-                if file_path.is_file():
-                    # Calculate the relative path within the zip
-                    arcname = file_path.relative_to(skill_path.parent)
-                    zipf.write(file_path, arcname)
-                    print(f"  Added: {arcname}")
-
-        print(f"\n✅ Successfully packaged skill to: {skill_filename}")
+        compressed = {}
+        futures = {}
+        for arcname, entry in entries.items():
+            if arcname in unchanged:
+                continue
+            method = zipfile.ZIP_STORED if Path(arcname).suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            if pool is not None and entry['size'] >= PARALLEL_THRESHOLD and method == zipfile.ZIP_DEFLATED:
+                futures[arcname] = pool.submit(compress_file, entry['path'], method)
+            else:
+                compressed[arcname] = compress_file(entry['path'], method)
+
+        fd, tmp = tempfile.mkstemp(dir=output_path, prefix=f".{skill_filename.name}.")
+        try:
+            old = open(skill_filename, 'rb') if unchanged else None
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    writer = SkillArchiveWriter(f)
+                    for arcname, entry in entries.items():
+                        if arcname in unchanged:
+                            before = reusable[arcname]
+                            old.seek(before['offset'])
+                            data = old.read(before['compress_size'])
+                            method, crc = before['method'], before['crc']
+                        else:
+                            result = futures[arcname].result() if arcname in futures else compressed.pop(arcname)
+                            method, crc, _, data = result
+                            if verbose:
+                                print(f"  {'Updated' if arcname in previous else 'Added'}: {arcname}")
+                        entry.update(method=method, crc=crc, compress_size=len(data))
+                        entry['offset'] = writer.add(arcname, entry, data)
+                    writer.close()
+            finally:
+                if old is not None:
+                    old.close()
+            os.chmod(tmp, 0o666 & ~current_umask())
+            os.replace(tmp, skill_filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        removed = set(previous) - set(entries)
+        write_manifest(manifest_path, {
+            'version': MANIFEST_VERSION,
+            'archive_size': skill_filename.stat().st_size,
+            'entries': {a: {k: e[k] for k in ('size', 'mtime_ns', 'sha256', 'method', 'crc', 'compress_size', 'offset')}
+                        for a, e in entries.items()},
+        })
+        changed = len(entries) - len(unchanged)
+        print(f"✅ Packaged {skill_name} to: {skill_filename} "
+              f"({changed} of {len(entries)} files compressed, {len(unchanged)} reused"
+              + (f", {len(removed)} removed" if removed else '') + ")")
         return skill_filename
 
     except Exception as e:
@@ -82,28 +294,82 @@ def package_skill(skill_path, output_dir=None):
         return None
 
 
+def current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def write_manifest(path, manifest):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.chmod(tmp, 0o666 & ~current_umask())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def find_skills(root):
+    """Skill folders (directories with a SKILL.md) under root."""
+    return sorted(p.parent for p in Path(root).rglob('SKILL.md'))
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python utils/package_skill.py <path/to/skill-folder> [output-directory]")
+    args = sys.argv[1:]
+    flags = {a for a in args if a in ('--all', '--full', '--verbose')}
+    jobs = os.cpu_count() or 1
+    if '--jobs' in args:
+        i = args.index('--jobs')
+        try:
+            jobs = int(args[i + 1])
+            del args[i:i + 2]
+        except (IndexError, ValueError):
+            print("❌ Error: --jobs needs a number")
+            sys.exit(1)
+    positional = [a for a in args if a not in flags]
+
+    if not positional or len(positional) > 2:
+        print("Usage: python utils/package_skill.py <path/to/skill-folder> [output-directory] [--full] [--jobs N] [--verbose]")
+        print("       python utils/package_skill.py --all <path/to/skills-root> [output-directory]")
         print("\nExample:")
         print("  python utils/package_skill.py skills/public/my-skill")
         print("  python utils/package_skill.py skills/public/my-skill ./dist")
+        print("  python utils/package_skill.py --all .agents/skills ./dist")
         sys.exit(1)
 
-    skill_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    skill_path = positional[0]
+    output_dir = positional[1] if len(positional) > 1 else None
+    skills = find_skills(skill_path) if '--all' in flags else [Path(skill_path)]
+    if not skills:
+        print(f"❌ Error: No skills found under {skill_path}")
+        sys.exit(1)
 
-    print(f"📦 Packaging skill: {skill_path}")
+    print(f"📦 Packaging {len(skills)} skill(s) from: {skill_path}" if '--all' in flags else f"📦 Packaging skill: {skill_path}")
     if output_dir:
         print(f"   Output directory: {output_dir}")
     print()
 
-    result = package_skill(skill_path, output_dir)
+    start = time.perf_counter()
+    failed = 0
+    # One worker would only add pickling overhead
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for skill in skills:
+            result = package_skill(skill, output_dir, full='--full' in flags, pool=pool,
+                                   verbose='--verbose' in flags or '--all' not in flags)
+            failed += result is None
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"\n⏱  {len(skills) - failed} of {len(skills)} skill(s) packaged in {time.perf_counter() - start:.2f}s")
 
-    if result:
-        sys.exit(0)
-    else:
+    if failed:
         sys.exit(1)
+    else:
+        sys.exit(0)
 
 
 if __name__ == "__main__":
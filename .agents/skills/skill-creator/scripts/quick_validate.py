@@ -1,51 +1,128 @@
 #!/usr/bin/env python3
 """
 Quick validation script for skills - minimal version
+
+Usage:
+    python quick_validate.py <skill_directory>
+    python quick_validate.py --all <skills-root> [--json] [--jobs N] [--cache FILE | --no-cache]
+
+--all validates every skill (directory with a SKILL.md) under the root and prints one
+line per skill, or with --json a single machine-readable report. Results are cached in
+<skills-root>/.skill-validate-cache.json keyed on SKILL.md's size, mtime and SHA-256,
+so a run where nothing changed only stats the files. Changed skills are validated in
+worker processes when there are enough of them to pay for the pool.
+
+Frontmatter made of flat `key: value` lines is parsed directly; yaml is only imported
+for anything else (nested mappings, block scalars, lists, ambiguous values).
 """
 
-import sys
+import hashlib
+import json
+import locale
 import os
+import sys
 import re
-import yaml
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def validate_skill(skill_path):
-    """Basic validation of a skill"""
-    skill_path = Path(skill_path)
+# Define allowed properties
+ALLOWED_PROPERTIES = {'name', 'description', 'license', 'allowed-tools', 'metadata', 'compatibility'}
 
-    # Check SKILL.md exists
-    skill_md = skill_path / 'SKILL.md'
-    if not skill_md.exists():
-        return False, "SKILL.md not found"
+CACHE_NAME = '.skill-validate-cache.json'
+CACHE_VERSION = 1
+# Fewer changed skills than this are validated in-process: starting workers costs more
+POOL_THRESHOLD = 16
 
-    # Read and validate frontmatter
-    content = skill_md.read_text()
+SIMPLE_LINE = re.compile(r'([A-Za-z_][A-Za-z0-9_-]*):(?: (.*))?')
+SINGLE_QUOTED = re.compile(r"'((?:[^']|'')*)'")
+DOUBLE_QUOTED = re.compile(r'"([^"\\]*)"')
+# Plain scalars yaml might resolve to something other than a string, or read differently
+NON_STRING_WORDS = {'yes', 'no', 'true', 'false', 'on', 'off', 'y', 'n', 'null', '~'}
+INDICATORS = set('-?:,[]{}#&*!|>\'"%@`+.~<=0123456789')
+
+
+def simple_scalar(value):
+    """The string a one-line yaml scalar stands for, or None if it needs the yaml parser."""
+    value = value.strip(' ')
+    if '\t' in value or not value.isprintable():
+        return None
+    match = SINGLE_QUOTED.fullmatch(value)
+    if match:
+        return match.group(1).replace("''", "'")
+    match = DOUBLE_QUOTED.fullmatch(value)
+    if match:
+        return match.group(1)
+    if (not value or value[0] in INDICATORS or value.lower() in NON_STRING_WORDS
+            or ': ' in value or ' #' in value or value.endswith(':')):
+        return None
+    return value
+
+
+def parse_simple_frontmatter(text):
+    """
+    Parse frontmatter that is nothing but `key: value` lines with string values.
+
+    Returns:
+        dict, or None when the text uses anything else and must go through yaml
+    """
+    frontmatter = {}
+    for line in text.split('\n'):
+        if not line.strip() or line.startswith('#'):
+            continue
+        match = SIMPLE_LINE.fullmatch(line)
+        if not match or match.group(1).lower() in NON_STRING_WORDS or match.group(2) is None:
+            return None
+        value = simple_scalar(match.group(2))
+        if value is None:
+            return None
+        frontmatter[match.group(1)] = value
+    return frontmatter or None
+
+
+def parse_frontmatter(content):
+    """
+    Extract and parse the frontmatter of a SKILL.md.
+
+    Returns:
+        (frontmatter dict, None) or (None, error message)
+    """
     if not content.startswith('---'):
-        return False, "No YAML frontmatter found"
+        return None, "No YAML frontmatter found"
 
     # Extract frontmatter
     match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
     if not match:
-        return False, "Invalid frontmatter format"
+        return None, "Invalid frontmatter format"
 
     frontmatter_text = match.group(1)
+    frontmatter = parse_simple_frontmatter(frontmatter_text)
+    if frontmatter is not None:
+        return frontmatter, None
 
     # Parse YAML frontmatter
+    import yaml
     try:
         frontmatter = yaml.safe_load(frontmatter_text)
         if not isinstance(frontmatter, dict):
-            return False, "Frontmatter must be a YAML dictionary"
+            return None, "Frontmatter must be a YAML dictionary"
     except yaml.YAMLError as e:
-        return False, f"Invalid YAML in frontmatter: {e}"
+        return None, f"Invalid YAML in frontmatter: {e}"
+    return frontmatter, None
+
 
-    # Define allowed properties
-    ALLOWED_PROPERTIES = {'name', 'description', 'license', 'allowed-tools', 'metadata', 'compatibility'}
+def validate_content(content):
+    """Validate the text of a SKILL.md"""
+    frontmatter, error = parse_frontmatter(content)
+    if error:
+        return False, error
 
     # Check for unexpected properties (excluding nested keys under metadata)
     unexpected_keys = set(frontmatter.keys()) - ALLOWED_PROPERTIES
     if unexpected_keys:
         return False, (
-            f"Unexpected key(s) in SKILL.md frontmatter: {', '.join(sorted(unexpected_keys))}. "
+            f"Unexpected key(s) in SKILL.md frontmatter: {', '.join(sorted(map(str, unexpected_keys)))}. "
             f"Allowed properties are: {', '.join(sorted(ALLOWED_PROPERTIES))}"
         )
 
@@ -93,11 +170,184 @@ def validate_skill(skill_path):
 
     return True, "Skill is valid!"
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
+
+def validate_skill(skill_path):
+    """Basic validation of a skill"""
+    skill_path = Path(skill_path)
+
+    # Check SKILL.md exists
+    skill_md = skill_path / 'SKILL.md'
+    if not skill_md.exists():
+        return False, "SKILL.md not found"
+
+    # Read and validate frontmatter
+    return validate_content(skill_md.read_text())
+
+
+def validate_bytes(data):
+    """Validate SKILL.md bytes as read from disk (runs in worker processes)."""
+    try:
+        # Same decoding and newline handling as Path.read_text()
+        content = data.decode(locale.getpreferredencoding(False)).replace('\r\n', '\n').replace('\r', '\n')
+    except UnicodeDecodeError as e:
+        return False, f"SKILL.md is not readable text: {e}"
+    return validate_content(content)
+
+
+def validator_fingerprint():
+    """Hash of this script, so cached results are dropped when the rules change."""
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
+
+def load_cache(path, fingerprint):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+        if cache.get('version') == CACHE_VERSION and cache.get('validator') == fingerprint:
+            return cache['skills']
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def write_cache(path, cache):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(tmp, 0o666 & ~mask)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def find_skills(root):
+    """Skill folders (directories with a SKILL.md) under root."""
+    return sorted(p.parent for p in Path(root).rglob('SKILL.md'))
+
+
+def validate_all(root, jobs=None, cache_path=None, use_cache=True):
+    """
+    Validate every skill under a root.
+
+    Args:
+        root: Directory to search for skills
+        jobs: Worker processes for changed skills (defaults to the CPU count)
+        cache_path: Result cache file (defaults to <root>/.skill-validate-cache.json)
+        use_cache: Read and write the cache
+
+    Returns:
+        Report dict: {root, valid, skills, checked, cached, elapsed_ms} where skills is a
+        list of {name, path, valid, message, cached}
+    """
+    start = time.perf_counter()
+    root = Path(root)
+    cache_path = Path(cache_path) if cache_path else root / CACHE_NAME
+    fingerprint = validator_fingerprint()
+    cached = load_cache(cache_path, fingerprint) if use_cache else {}
+
+    results = {}
+    pending = {}
+    refreshed = False
+    for skill in find_skills(root):
+        key = skill.relative_to(root).as_posix()
+        skill_md = skill / 'SKILL.md'
+        entry = cached.get(key)
+        try:
+            # Stat before reading: if the file changes in between, the next run rehashes it
+            st = skill_md.stat()
+            if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                results[key] = {'valid': entry['valid'], 'message': entry['message'], 'cached': True}
+                continue
+            data = skill_md.read_bytes()
+        except OSError as e:
+            results[key] = {'valid': False, 'message': f"Cannot read SKILL.md: {e}", 'cached': False}
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        if entry and entry['sha256'] == digest:
+            # Touched but unchanged: keep the result, remember the new mtime
+            results[key] = {'valid': entry['valid'], 'message': entry['message'], 'cached': True}
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            refreshed = True
+        else:
+            pending[key] = (data, digest, st)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(pending) >= POOL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {key: pool.submit(validate_bytes, data) for key, (data, _, _) in pending.items()}
+            checks = {key: future.result() for key, future in futures.items()}
+    else:
+        checks = {key: validate_bytes(data) for key, (data, _, _) in pending.items()}
+
+    for key, (valid, message) in checks.items():
+        _, digest, st = pending[key]
+        results[key] = {'valid': valid, 'message': message, 'cached': False}
+        cached[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest,
+                       'valid': valid, 'message': message}
+        refreshed = True
+
+    removed = set(cached) - set(results)
+    for key in removed:
+        del cached[key]
+    if use_cache and (refreshed or removed):
+        write_cache(cache_path, {'version': CACHE_VERSION, 'validator': fingerprint, 'skills': cached})
+
+    skills = [{'name': Path(key).name, 'path': key, **results[key]} for key in sorted(results)]
+    return {
+        'root': str(root),
+        'valid': all(s['valid'] for s in skills),
+        'skills': skills,
+        'checked': len(checks),
+        'cached': sum(s['cached'] for s in skills),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    flags = {a for a in args if a in ('--all', '--json', '--no-cache')}
+    options = {}
+    for option in ('--jobs', '--cache'):
+        if option in args:
+            i = args.index(option)
+            if i + 1 >= len(args):
+                print(f"Error: {option} needs a value")
+                sys.exit(1)
+            options[option] = args[i + 1]
+            del args[i:i + 2]
+    positional = [a for a in args if a not in flags]
+
+    if len(positional) != 1:
         print("Usage: python quick_validate.py <skill_directory>")
+        print("       python quick_validate.py --all <skills-root> [--json] [--jobs N] [--cache FILE | --no-cache]")
         sys.exit(1)
-    
-    valid, message = validate_skill(sys.argv[1])
-    print(message)
-    sys.exit(0 if valid else 1)
\ No newline at end of file
+
+    if '--all' not in flags:
+        valid, message = validate_skill(positional[0])
+        print(message)
+        sys.exit(0 if valid else 1)
+
+    try:
+        jobs = int(options['--jobs']) if '--jobs' in options else None
+    except ValueError:
+        print("Error: --jobs needs a number")
+        sys.exit(1)
+    report = validate_all(positional[0], jobs=jobs, cache_path=options.get('--cache'),
+                          use_cache='--no-cache' not in flags)
+
+    if '--json' in flags:
+        print(json.dumps(report, indent=2))
+    else:
+        for skill in report['skills']:
+            print(f"{'✅' if skill['valid'] else '❌'} {skill['path']}: {skill['message']}")
+        print(f"\n{sum(s['valid'] for s in report['skills'])} of {len(report['skills'])} skill(s) valid "
+              f"({report['checked']} checked, {report['cached']} cached) in {report['elapsed_ms']:.1f} ms")
+    sys.exit(0 if report['valid'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Skill Index - Compiles the skills under a root into one searchable catalog file
+
+Usage:
+    skill_index.py build <skills-root> [--full]
+    skill_index.py update <skills-root> <skill-folder> [<skill-folder> ...]
+    skill_index.py search <skills-root> <keyword> [<keyword> ...] [--json]
+    skill_index.py show <skills-root> <skill-name>
+
+Examples:
+    skill_index.py build .agents/skills
+    skill_index.py update .agents/skills .agents/skills/my-skill
+    skill_index.py search .agents/skills react performance
+
+The index lives in <skills-root>/.skill-index.json. For every skill it records the
+name, description and allowed-tools from the SKILL.md frontmatter (parsed with
+quick_validate.parse_frontmatter) and the list of bundled files (references/,
+scripts/, assets/, ...). It also holds an inverted keyword index over names and
+descriptions, so a search is one file load plus a walk over the matching postings.
+
+build walks the root but only re-reads SKILL.md files whose size or mtime changed.
+update re-indexes just the given skill folders without walking the root.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from quick_validate import find_skills, parse_frontmatter
+
+INDEX_NAME = '.skill-index.json'
+INDEX_VERSION = 1
+TOKEN = re.compile(r'[a-z0-9][a-z0-9+#]*')
+STOPWORDS = {
+    'a', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'for', 'from', 'how', 'in',
+    'into', 'is', 'it', 'its', 'like', 'of', 'on', 'or', 'should', 'such', 'that', 'the',
+    'their', 'this', 'to', 'use', 'used', 'user', 'users', 'when', 'with', 'you', 'your',
+}
+SKIPPED_NAMES = {'SKILL.md', '__pycache__', '.DS_Store'}
+
+
+def keywords(text):
+    """Lowercase search tokens of a text, without stopwords."""
+    return {t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1}
+
+
+def bundled_files(skill_path):
+    """Files shipped with a skill besides SKILL.md, relative to the skill folder."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(skill_path):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d not in SKIPPED_NAMES)
+        rel = Path(dirpath).relative_to(skill_path)
+        files.extend((rel / f).as_posix() for f in sorted(filenames)
+                     if not f.startswith('.') and f not in SKIPPED_NAMES)
+    return files
+
+
+def read_skill(skill_path, st):
+    """Index entry for one skill folder, from its SKILL.md and file listing."""
+    entry = {'name': skill_path.name, 'description': '', 'allowed_tools': None,
+             'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    try:
+        frontmatter, error = parse_frontmatter((skill_path / 'SKILL.md').read_text())
+    except (OSError, UnicodeDecodeError) as e:
+        frontmatter, error = None, f"Cannot read SKILL.md: {e}"
+    if error:
+        entry['error'] = error
+    else:
+        name = frontmatter.get('name')
+        if isinstance(name, str) and name.strip():
+            entry['name'] = name.strip()
+        description = frontmatter.get('description')
+        entry['description'] = ' '.join(str(description).split()) if description is not None else ''
+        entry['allowed_tools'] = frontmatter.get('allowed-tools')
+    return entry
+
+
+def load_index(root):
+    """The index under root, or None if it is missing or from another version."""
+    try:
+        with open(Path(root) / INDEX_NAME) as f:
+            index = json.load(f)
+        return index if index.get('version') == INDEX_VERSION else None
+    except (OSError, ValueError):
+        return None
+
+
+def write_index(root, skills):
+    """Write the catalog for {path: entry}, deriving the name map and keyword postings."""
+    paths = sorted(skills)
+    names = {}
+    postings = {}
+    for i, path in enumerate(paths):
+        entry = skills[path]
+        names.setdefault(entry['name'], i)
+        for token in keywords(f"{entry['name'].replace('-', ' ')} {entry['description']}"):
+            postings.setdefault(token, []).append(i)
+    index = {
+        'version': INDEX_VERSION,
+        'skills': [{'path': path, **skills[path]} for path in paths],
+        'names': names,
+        'keywords': dict(sorted(postings.items())),
+    }
+    path = Path(root) / INDEX_NAME
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(tmp, 0o666 & ~mask)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return index
+
+
+def index_skills(root, skill_paths=None, full=False):
+    """
+    Build or refresh the catalog index of a skills root.
+
+    Args:
+        root: Directory holding the skills
+        skill_paths: Only re-index these skill folders (None walks the whole root)
+        full: Ignore the existing index
+
+    Returns:
+        (index dict, number of skills re-read)
+    """
+    root = Path(root).resolve()
+    previous = None if full else load_index(root)
+    skills = {s.pop('path'): s for s in previous['skills']} if previous else {}
+
+    if skill_paths is None:
+        targets = find_skills(root)
+        # Skills that disappeared from the root
+        found = {s.relative_to(root).as_posix() for s in targets}
+        for path in set(skills) - found:
+            del skills[path]
+    else:
+        targets = [Path(s).resolve() for s in skill_paths]
+
+    reread = 0
+    for skill_path in targets:
+        key = skill_path.relative_to(root).as_posix()
+        try:
+            st = (skill_path / 'SKILL.md').stat()
+        except OSError:
+            skills.pop(key, None)
+            continue
+        old = skills.get(key)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            entry = old
+        else:
+            entry = read_skill(skill_path, st)
+            reread += 1
+        entry['references'] = bundled_files(skill_path)
+        skills[key] = entry
+
+    return write_index(root, skills), reread
+
+
+def search(index, query):
+    """
+    Skills matching any of the query's keywords.
+
+    Returns:
+        list of skill entries, most keywords matched first, then by name
+    """
+    hits = {}
+    for token in keywords(query):
+        for i in index['keywords'].get(token, ()):
+            hits[i] = hits.get(i, 0) + 1
+    ranked = sorted(hits, key=lambda i: (-hits[i], index['skills'][i]['name']))
+    return [dict(index['skills'][i], matched=hits[i]) for i in ranked]
+
+
+def find_skill(index, name):
+    """The entry for a skill name, or None."""
+    i = index['names'].get(name)
+    return index['skills'][i] if i is not None else None
+
+
+def main():
+    args = sys.argv[1:]
+    flags = {a for a in args if a in ('--full', '--json')}
+    args = [a for a in args if a not in flags]
+    commands = {'build': 2, 'update': 3, 'search': 3, 'show': 3}
+    if not args or args[0] not in commands or len(args) < commands[args[0]] or (args[0] == 'show' and len(args) != 3):
+        print("Usage: skill_index.py build <skills-root> [--full]")
+        print("       skill_index.py update <skills-root> <skill-folder> [<skill-folder> ...]")
+        print("       skill_index.py search <skills-root> <keyword> [<keyword> ...] [--json]")
+        print("       skill_index.py show <skills-root> <skill-name>")
+        print("\nExamples:")
+        print("  skill_index.py build .agents/skills")
+        print("  skill_index.py search .agents/skills react performance")
+        sys.exit(1)
+
+    command, root = args[0], Path(args[1])
+    if not root.is_dir():
+        print(f"❌ Error: Skills root not found: {root}")
+        sys.exit(1)
+
+    if command in ('build', 'update'):
+        start = time.perf_counter()
+        try:
+            index, reread = index_skills(root, args[2:] if command == 'update' else None, full='--full' in flags)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error indexing skills: {e}")
+            sys.exit(1)
+        print(f"✅ Indexed {len(index['skills'])} skill(s) ({reread} re-read, {len(index['keywords'])} keywords) "
+              f"to {root / INDEX_NAME} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        sys.exit(0)
+
+    index = load_index(root)
+    if index is None:
+        print(f"❌ Error: No index in {root}, run: skill_index.py build {root}")
+        sys.exit(1)
+
+    if command == 'show':
+        entry = find_skill(index, args[2])
+        if entry is None:
+            print(f"❌ Skill not found: {args[2]}")
+            sys.exit(1)
+        print(json.dumps(entry, indent=2))
+        sys.exit(0)
+
+    results = search(index, ' '.join(args[2:]))
+    if '--json' in flags:
+        print(json.dumps(results, indent=2))
+    elif not results:
+        print("No matching skills")
+    else:
+        for entry in results:
+            print(f"🔍 {entry['name']} ({entry['path']}): {entry['description'][:100]}")
+    sys.exit(0 if results else 1)
+
+
+if __name__ == "__main__":
+    main()
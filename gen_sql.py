@@ -1,44 +1,608 @@
+"""
+Generate the SoapBuddy oil seed SQL from all_oils_complete.json.
+
+Usage:
+    python gen_sql.py [--input all_oils_complete.json] [--output seed_oils.sql]
+                      [--format insert|multirow|copy] [--batch-size 1000]
+                      [--delta] [--manifest seed_oils.manifest.json]
+                      [--rules category_rules.json] [--load sqlite:///path/to.db]
+
+Formats:
+    insert    Two single-row upserts per oil (the original seed_oils.sql layout)
+    multirow  Batched multi-row VALUES upserts; profiles join ingredients once per batch
+    copy      One COPY ... FROM STDIN into a staging table, then two set-based upserts
+              (psql only - COPY FROM STDIN is not understood by the Supabase SQL editor)
+
+Every run records a content hash per oil in the snapshot manifest. With --delta the
+output only upserts oils that were added or changed since that snapshot and deletes
+oils that disappeared from the catalog (their profiles go with them via ON DELETE CASCADE).
+
+The catalog is streamed: records are decoded one at a time from the JSON array and the
+SQL is written through a buffered file as it is rendered, so memory stays flat however
+large the supplier dump is (the delta manifest still holds one hash per oil name).
+A first pass only records where each name last appears: when the catalog repeats a
+name, only that last record is written and hashed, so full and delta output agree.
+
+With --load the same upserts are applied straight to a local SQLite database instead of
+writing a file (so --format is rejected): the ingredients/fatty_acid_profiles subset of
+the schema is created if missing and rows go through prepared executemany() batches
+inside one transaction.
+A load only reads and updates the manifest when --delta is given, and its manifest
+defaults to one next to the database (<db>.manifest.json), so loading never advances
+the snapshot the SQL deltas for the hosted database are cut from.
+
+Categories come from the ordered rule table in category_rules.json: the first rule with
+a keyword anywhere in the lowercased name wins, otherwise the default applies.
+"""
+
+import argparse
+import hashlib
 import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+FATTY_ACIDS = ['lauric', 'myristic', 'palmitic', 'stearic', 'ricinoleic', 'oleic', 'linoleic', 'linolenic']
+QUALITIES = ['hardness', 'cleansing', 'conditioning', 'bubbly', 'creamy', 'iodine', 'ins']
+PROFILE_COLUMNS = FATTY_ACIDS + QUALITIES
+FORMATS = ('insert', 'multirow', 'copy')
+READ_CHUNK = 1 << 16
+WRITE_BUFFER = 1 << 20
+DEFAULT_RULES = BASE_DIR / 'category_rules.json'
+SQLITE_PREFIX = 'sqlite:///'
+
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS ingredients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    category TEXT NOT NULL DEFAULT 'Other',
+    inci_code TEXT,
+    sap_naoh NUMERIC,
+    sap_koh NUMERIC,
+    unit TEXT NOT NULL DEFAULT 'g',
+    quantity_on_hand NUMERIC NOT NULL DEFAULT 0.0,
+    cost_per_unit NUMERIC NOT NULL DEFAULT 0.0,
+    supplier TEXT,
+    notes TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    reorder_threshold NUMERIC DEFAULT 0,
+    expiry_date TEXT
+);
+CREATE TABLE IF NOT EXISTS fatty_acid_profiles (
+    id INTEGER PRIMARY KEY,
+    ingredient_id INTEGER UNIQUE NOT NULL REFERENCES ingredients(id) ON DELETE CASCADE,
+    {', '.join(f"{c} NUMERIC DEFAULT 0.0" for c in PROFILE_COLUMNS)}
+);
+"""
+
+
+class Categorizer:
+    """
+    Ordered keyword rules compiled into a single regex.
+
+    All keywords are folded into one prefix-factored alternation inside a zero-width
+    lookahead, so one findall pass returns the longest keyword starting at every
+    position. Every other keyword matching at that position is a prefix of it, so
+    each keyword is mapped to the best rule among its keyword prefixes and the
+    category is the best rule over all matches - the same answer as checking the
+    rules one by one, at a cost independent of the number of keywords.
+    """
+
+    def __init__(self, rules, default='Oil', cache_size=1 << 16):
+        self.categories = [rule['category'] for rule in rules]
+        self.default = default
+
+        keyword_rule = {}
+        for index, rule in enumerate(rules):
+            for keyword in rule['keywords']:
+                keyword_rule.setdefault(keyword.lower(), index)
+        self.keyword_rule = {
+            keyword: min(keyword_rule[keyword[:i]] for i in range(1, len(keyword) + 1) if keyword[:i] in keyword_rule)
+            for keyword in keyword_rule
+        }
+
+        self.pattern = re.compile(f"(?=({trie_pattern(keyword_rule)}))") if keyword_rule else None
+        self.categorize = lru_cache(maxsize=cache_size)(self._categorize)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES):
+        with open(path) as f:
+            table = json.load(f)
+        return cls(table['rules'], table.get('default', 'Oil'))
+
+    def _categorize(self, name):
+        found = self.pattern.findall(name.lower()) if self.pattern else None
+        if not found:
+            return self.default
+        return self.categories[min(map(self.keyword_rule.__getitem__, found))]
+
+    def categorize_many(self, names):
+        """Categorize a whole catalog of names; each distinct name is matched once."""
+        names = list(names)
+        lookup = {name: self.categorize(name) for name in set(names)}
+        return [lookup[name] for name in names]
+
+
+def trie_pattern(words):
+    """Build a prefix-factored regex alternation that matches the longest word at a position."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return f"(?:{body})?" if len(branches) == 1 and len(body) > 1 else f"{body}?"
+        return body
+
+    return emit(trie)
+
+
+@lru_cache(maxsize=None)
+def default_categorizer():
+    return Categorizer.from_file(DEFAULT_RULES)
 
-with open('/home/nickj/Documents/Soapmaker_App/SoapManager/all_oils_complete.json') as f:
-    oils = json.load(f)
 
 def categorize(name):
-    n = name.lower()
-    if any(w in n for w in ['butter', 'cocoa']):
-        return 'Butter'
-    if any(w in n for w in ['wax', 'beeswax', 'candelilla']):
-        return 'Wax'
-    if any(w in n for w in ['tallow', 'lard', 'fat', 'ghee', 'milk fat', 'emu', 'mink', 'horse oil', 'salmon', 'chicken']):
-        return 'Animal Fat'
-    if 'acid' in n:
-        return 'Fatty Acid'
-    if any(w in n for w in ['crisco', 'shortening', 'soapquick']):
-        return 'Blend'
-    if 'pine tar' in n:
-        return 'Additive'
-    return 'Oil'
-
-lines = []
-lines.append("-- SoapBuddy Complete Oil/Fat/Wax Seed Data")
-lines.append(f"-- Total: {len(oils)} ingredients from SoapCalc.net")
-lines.append("")
-
-for i, oil in enumerate(oils):
-    name = oil['name'].replace("'", "''").strip()
-    cat = categorize(oil['name'])
-    sap_naoh = oil['sap_naoh']
-    sap_koh = oil['sap_koh']
-    q = oil['qualities']
-    fa = oil['fatty_acids']
-    
-    lines.append(f"INSERT INTO ingredients (name, category, sap_naoh, sap_koh, unit) VALUES ('{name}', '{cat}', {sap_naoh}, {sap_koh}, 'g') ON CONFLICT (name) DO UPDATE SET sap_naoh = {sap_naoh}, sap_koh = {sap_koh}, category = '{cat}';")
-    lines.append(f"INSERT INTO fatty_acid_profiles (ingredient_id, lauric, myristic, palmitic, stearic, ricinoleic, oleic, linoleic, linolenic, hardness, cleansing, conditioning, bubbly, creamy, iodine, ins) VALUES ((SELECT id FROM ingredients WHERE name = '{name}'), {fa['lauric']}, {fa['myristic']}, {fa['palmitic']}, {fa['stearic']}, {fa['ricinoleic']}, {fa['oleic']}, {fa['linoleic']}, {fa['linolenic']}, {q['hardness']}, {q['cleansing']}, {q['conditioning']}, {q['bubbly']}, {q['creamy']}, {q['iodine']}, {q['ins']}) ON CONFLICT (ingredient_id) DO UPDATE SET lauric = {fa['lauric']}, myristic = {fa['myristic']}, palmitic = {fa['palmitic']}, stearic = {fa['stearic']}, ricinoleic = {fa['ricinoleic']}, oleic = {fa['oleic']}, linoleic = {fa['linoleic']}, linolenic = {fa['linolenic']}, hardness = {q['hardness']}, cleansing = {q['cleansing']}, conditioning = {q['conditioning']}, bubbly = {q['bubbly']}, creamy = {q['creamy']}, iodine = {q['iodine']}, ins = {q['ins']};")
-    lines.append("")
-
-sql = "\n".join(lines)
-
-with open('/home/nickj/Documents/Soapmaker_App/SoapManager/seed_oils.sql', 'w') as f:
-    f.write(sql)
-
-print(f"Generated seed_oils.sql with {len(oils)} oil entries")
+    return default_categorizer().categorize(name)
+
+
+def sql_str(value):
+    """Quote a Python string as a SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def copy_str(value):
+    """Escape a value for COPY text format."""
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def to_row(oil, categorizer=None):
+    """Flatten one catalog entry into the values written to the seed."""
+    categorizer = categorizer or default_categorizer()
+    row = {
+        'name': oil['name'].strip(),
+        'category': categorizer.categorize(oil['name']),
+        'sap_naoh': oil['sap_naoh'],
+        'sap_koh': oil['sap_koh'],
+    }
+    row.update({k: oil['fatty_acids'][k] for k in FATTY_ACIDS})
+    row.update({k: oil['qualities'][k] for k in QUALITIES})
+    return row
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK):
+    """Yield the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Unexpected end of JSON input")
+            fill()
+            continue
+
+        if not started:
+            if buf[pos] != '[':
+                raise ValueError("Expected a JSON array of oils")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == ']':
+            return
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # Only accept the element once its delimiter is buffered - a number cut
+        # off at the chunk boundary would otherwise decode as a shorter number
+        rest = end
+        while rest < len(buf) and buf[rest].isspace():
+            rest += 1
+        if rest == len(buf) or buf[rest] not in ',]':
+            if eof:
+                raise ValueError("Expected ',' or ']' after array element")
+            fill()
+            continue
+        pos = end
+        yield value
+
+
+def dedupe(rows):
+    """Keep the last row per name - a multi-row upsert cannot touch a row twice."""
+    return list({row['name']: row for row in rows}.values())
+
+
+def row_hash(row):
+    """Content hash of a seed row; any change to a value or the category changes it."""
+    payload = json.dumps(row, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_manifest(path):
+    """Return the name -> hash map of the last snapshot, or {} if there is none."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f).get('oils', {})
+
+
+def write_manifest(path, hashes):
+    manifest = {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'count': len(hashes),
+        'oils': dict(sorted(hashes.items())),
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+
+
+def last_positions(records):
+    """Map each oil name to the position of its last record in the catalog."""
+    return {oil['name'].strip(): i for i, oil in enumerate(records)}
+
+
+def changed_rows(rows, previous, hashes, last=None):
+    """
+    Yield the rows that are new or changed compared with a snapshot.
+
+    With last (from last_positions) only the last row per name is hashed and
+    considered, so a duplicated name is written - and recorded in the manifest -
+    with the values that win in the database.
+
+    Fills hashes with the name -> hash map of the new snapshot as rows stream past;
+    once the generator is exhausted, the names removed from the catalog are
+    set(previous) - set(hashes).
+    """
+    for i, row in enumerate(rows):
+        if last is not None and last[row['name']] != i:
+            continue
+        digest = row_hash(row)
+        hashes[row['name']] = digest
+        if previous.get(row['name']) != digest:
+            yield row
+
+
+def batched(items, size):
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def insert_statements(row):
+    name = sql_str(row['name'])
+    cat = row['category']
+    sap_naoh = row['sap_naoh']
+    sap_koh = row['sap_koh']
+    values = ', '.join(str(row[c]) for c in PROFILE_COLUMNS)
+    updates = ', '.join(f"{c} = {row[c]}" for c in PROFILE_COLUMNS)
+    return [
+        f"INSERT INTO ingredients (name, category, sap_naoh, sap_koh, unit) VALUES ({name}, '{cat}', {sap_naoh}, {sap_koh}, 'g') ON CONFLICT (name) DO UPDATE SET sap_naoh = {sap_naoh}, sap_koh = {sap_koh}, category = '{cat}';",
+        f"INSERT INTO fatty_acid_profiles (ingredient_id, {', '.join(PROFILE_COLUMNS)}) VALUES ((SELECT id FROM ingredients WHERE name = {name}), {values}) ON CONFLICT (ingredient_id) DO UPDATE SET {updates};",
+        "",
+    ]
+
+
+def ingredient_upsert_tail():
+    return "ON CONFLICT (name) DO UPDATE SET sap_naoh = EXCLUDED.sap_naoh, sap_koh = EXCLUDED.sap_koh, category = EXCLUDED.category;"
+
+
+def profile_upsert_tail():
+    updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in PROFILE_COLUMNS)
+    return f"ON CONFLICT (ingredient_id) DO UPDATE SET {updates};"
+
+
+def multirow_statements(rows):
+    ingredient_values = ',\n'.join(
+        f"  ({sql_str(r['name'])}, '{r['category']}', {r['sap_naoh']}, {r['sap_koh']}, 'g')" for r in rows
+    )
+    profile_values = ',\n'.join(
+        f"  ({sql_str(r['name'])}, {', '.join(str(r[c]) for c in PROFILE_COLUMNS)})" for r in rows
+    )
+    return [
+        "INSERT INTO ingredients (name, category, sap_naoh, sap_koh, unit) VALUES",
+        ingredient_values,
+        ingredient_upsert_tail(),
+        f"WITH v (name, {', '.join(PROFILE_COLUMNS)}) AS (VALUES",
+        profile_values,
+        ")",
+        f"INSERT INTO fatty_acid_profiles (ingredient_id, {', '.join(PROFILE_COLUMNS)})",
+        f"SELECT i.id, {', '.join('v.' + c for c in PROFILE_COLUMNS)} FROM v JOIN ingredients i ON i.name = v.name",
+        profile_upsert_tail(),
+        "",
+    ]
+
+
+def copy_statements(rows):
+    """
+    Yield a COPY block for rows.
+
+    Rows are streamed straight into the staging table, so duplicate names are only
+    collapsed in SQL (DISTINCT ON keeps the last copy, matching the other formats).
+    """
+    columns = ['name', 'category', 'sap_naoh', 'sap_koh'] + PROFILE_COLUMNS
+    yield "BEGIN;"
+    yield ("CREATE TEMP TABLE oil_seed (seq BIGSERIAL, name VARCHAR, category VARCHAR, sap_naoh NUMERIC, sap_koh NUMERIC, "
+           + ', '.join(f"{c} NUMERIC" for c in PROFILE_COLUMNS) + ") ON COMMIT DROP;")
+    yield f"COPY oil_seed ({', '.join(columns)}) FROM STDIN;"
+    for r in rows:
+        yield '\t'.join(copy_str(r[c]) for c in columns)
+    yield from [
+        "\\.",
+        "CREATE TEMP VIEW oil_seed_latest AS SELECT DISTINCT ON (name) * FROM oil_seed ORDER BY name, seq DESC;",
+        "INSERT INTO ingredients (name, category, sap_naoh, sap_koh, unit)",
+        "SELECT name, category, sap_naoh, sap_koh, 'g' FROM oil_seed_latest",
+        ingredient_upsert_tail(),
+        f"INSERT INTO fatty_acid_profiles (ingredient_id, {', '.join(PROFILE_COLUMNS)})",
+        f"SELECT i.id, {', '.join('s.' + c for c in PROFILE_COLUMNS)} FROM oil_seed_latest s JOIN ingredients i ON i.name = s.name",
+        profile_upsert_tail(),
+        "DROP VIEW oil_seed_latest;",
+        "COMMIT;",
+        "",
+    ]
+
+
+def render(rows, fmt, batch_size):
+    """Yield the upsert lines for a stream of rows in the requested format."""
+    if fmt == 'insert':
+        for row in rows:
+            yield from insert_statements(row)
+    elif fmt == 'multirow':
+        for batch in batched(rows, batch_size):
+            yield from multirow_statements(dedupe(batch))
+    elif fmt == 'copy':
+        yield from copy_statements(rows)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def delete_statements(names, batch_size):
+    lines = []
+    for batch in batched(names, batch_size):
+        lines.append(f"DELETE FROM ingredients WHERE name IN ({', '.join(sql_str(n) for n in batch)});")
+    if lines:
+        lines.append("")
+    return lines
+
+
+def seed_header(count):
+    return [
+        "-- SoapBuddy Complete Oil/Fat/Wax Seed Data",
+        f"-- Total: {count} ingredients from SoapCalc.net",
+        "",
+    ]
+
+
+def delta_header(upserted, deleted):
+    return [
+        "-- SoapBuddy Oil/Fat/Wax Seed Delta",
+        f"-- Upserted: {upserted}, Deleted: {deleted}",
+        "",
+    ]
+
+
+def generate(oils, fmt='insert', batch_size=1000):
+    """Render the seed SQL for a list of catalog entries."""
+    rows = dedupe(to_row(oil) for oil in oils)
+    lines = seed_header(len(rows))
+    lines.extend(render(rows, fmt, batch_size))
+    return "\n".join(lines)
+
+
+class Counter:
+    """Pass-through iterator that counts the items it has yielded."""
+
+    def __init__(self, items):
+        self.items = iter(items)
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.items:
+            self.count += 1
+            yield item
+
+
+def write_lines(f, lines, first=True):
+    """Write lines joined by newlines; returns whether nothing has been written yet."""
+    for line in lines:
+        if not first:
+            f.write('\n')
+        f.write(line)
+        first = False
+    return first
+
+
+def current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def stream_seed(input_path, output_path, fmt='insert', batch_size=1000, previous=None, categorizer=None):
+    """
+    Stream the catalog at input_path into seed SQL at output_path.
+
+    The body is written to a temporary file next to the output while records stream
+    through, then the header (whose counts are only known at the end) is prepended
+    and the result moved into place.
+
+    Args:
+        previous: Snapshot name -> hash map; when given only the delta is written
+
+    Returns:
+        (records, upserted, deleted, hashes)
+    """
+    output_path = Path(output_path)
+    hashes = {}
+    fd, body_path = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix='.body')
+    try:
+        with open(input_path) as src:
+            last = last_positions(iter_json_array(src))
+        with open(input_path) as src, os.fdopen(fd, 'w', buffering=WRITE_BUFFER) as body:
+            records = Counter(iter_json_array(src))
+            rows = (to_row(oil, categorizer) for oil in records)
+            upserts = Counter(changed_rows(rows, previous or {}, hashes, last))
+            empty = write_lines(body, render(upserts, fmt, batch_size))
+            removed = [] if previous is None else sorted(set(previous) - set(hashes))
+            empty = write_lines(body, delete_statements(removed, batch_size), empty)
+
+        if previous is None:
+            header = seed_header(upserts.count)
+        else:
+            header = delta_header(upserts.count, len(removed))
+
+        fd, out_tmp = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', buffering=WRITE_BUFFER) as out, open(body_path) as body:
+                out.write("\n".join(header))
+                if not empty:
+                    out.write('\n')
+                    shutil.copyfileobj(body, out, WRITE_BUFFER)
+            os.chmod(out_tmp, 0o666 & ~current_umask())
+            os.replace(out_tmp, output_path)
+        except BaseException:
+            os.unlink(out_tmp)
+            raise
+    finally:
+        os.unlink(body_path)
+
+    return records.count, upserts.count, len(removed), hashes
+
+
+def sqlite_path(url):
+    """Map a sqlite:///path URL to a filesystem path (sqlite:////abs/path for absolute paths)."""
+    if not url.startswith(SQLITE_PREFIX):
+        raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+    return url[len(SQLITE_PREFIX):]
+
+
+def load_sqlite(input_path, url, batch_size=1000, previous=None, categorizer=None):
+    """
+    Upsert the catalog at input_path straight into a SQLite database.
+
+    Args:
+        previous: Snapshot name -> hash map; when given only the delta is applied
+
+    Returns:
+        (records, upserted, deleted, hashes)
+    """
+    columns = ', '.join(PROFILE_COLUMNS)
+    ingredient_sql = (
+        "INSERT INTO ingredients (name, category, sap_naoh, sap_koh, unit) VALUES (?, ?, ?, ?, 'g') "
+        "ON CONFLICT (name) DO UPDATE SET sap_naoh = excluded.sap_naoh, sap_koh = excluded.sap_koh, "
+        "category = excluded.category, updated_at = CURRENT_TIMESTAMP"
+    )
+    profile_sql = (
+        f"INSERT INTO fatty_acid_profiles (ingredient_id, {columns}) "
+        f"VALUES ((SELECT id FROM ingredients WHERE name = ?), {', '.join('?' * len(PROFILE_COLUMNS))}) "
+        f"ON CONFLICT (ingredient_id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in PROFILE_COLUMNS)}"
+    )
+
+    hashes = {}
+    conn = sqlite3.connect(sqlite_path(url))
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.executescript(SQLITE_SCHEMA)
+        with open(input_path) as src:
+            last = last_positions(iter_json_array(src))
+        with open(input_path) as src, conn:
+            records = Counter(iter_json_array(src))
+            rows = (to_row(oil, categorizer) for oil in records)
+            upserts = Counter(changed_rows(rows, previous or {}, hashes, last))
+            for batch in batched(upserts, batch_size):
+                conn.executemany(ingredient_sql, [(r['name'], r['category'], r['sap_naoh'], r['sap_koh']) for r in batch])
+                conn.executemany(profile_sql, [(r['name'], *(r[c] for c in PROFILE_COLUMNS)) for r in batch])
+            removed = [] if previous is None else sorted(set(previous) - set(hashes))
+            conn.executemany("DELETE FROM ingredients WHERE name = ?", [(name,) for name in removed])
+    finally:
+        conn.close()
+
+    return records.count, upserts.count, len(removed), hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the oil seed SQL")
+    parser.add_argument('--input', default=str(BASE_DIR / 'all_oils_complete.json'), help='Oil catalog JSON')
+    parser.add_argument('--output', help='SQL file to write (default: seed_oils.sql, or seed_oils_delta.sql with --delta)')
+    parser.add_argument('--format', choices=FORMATS, help='Statement layout (default: insert; not used with --load)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per statement in multirow format (rows per executemany with --load)')
+    parser.add_argument('--delta', action='store_true', help='Only emit changes since the last snapshot')
+    parser.add_argument('--manifest', help='Snapshot manifest of per-oil content hashes '
+                        '(default: seed_oils.manifest.json, or <db>.manifest.json with --load)')
+    parser.add_argument('--rules', default=str(DEFAULT_RULES), help='Category rule table')
+    parser.add_argument('--load', metavar='URL', help='Upsert straight into a local database (sqlite:///path) instead of writing SQL')
+    args = parser.parse_args()
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.load and not args.load.startswith(SQLITE_PREFIX):
+        parser.error(f"--load only supports {SQLITE_PREFIX}path URLs")
+    if args.load and args.format:
+        parser.error("--format only applies to SQL output, not --load")
+    args.format = args.format or 'insert'
+    output = args.output or str(BASE_DIR / ('seed_oils_delta.sql' if args.delta else 'seed_oils.sql'))
+    if not args.manifest:
+        args.manifest = sqlite_path(args.load) + '.manifest.json' if args.load else str(BASE_DIR / 'seed_oils.manifest.json')
+
+    start = time.perf_counter()
+    previous = load_manifest(args.manifest) if args.delta else None
+    categorizer = Categorizer.from_file(args.rules)
+    if args.load:
+        records, upserted, deleted, hashes = load_sqlite(args.input, args.load, args.batch_size, previous, categorizer)
+        if args.delta:
+            write_manifest(args.manifest, hashes)
+    else:
+        records, upserted, deleted, hashes = stream_seed(args.input, output, args.format, args.batch_size, previous, categorizer)
+        write_manifest(args.manifest, hashes)
+    elapsed = time.perf_counter() - start
+
+    if args.load:
+        rate = (upserted + deleted) / elapsed if elapsed > 0 else 0
+        print(f"Loaded {sqlite_path(args.load)}: {upserted} upserts, {deleted} deletes in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    elif args.delta:
+        print(f"Generated {Path(output).name}: {upserted} upserts, {deleted} deletes ({args.format} format)")
+    else:
+        print(f"Generated {Path(output).name} with {records} oil entries ({args.format} format)")
+    rate = records / elapsed if elapsed > 0 else 0
+    print(f"Processed {records} records in {elapsed:.2f}s ({rate:,.0f} records/s)")
+
+
+if __name__ == '__main__':
+    main()
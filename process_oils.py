@@ -1,16 +1,153 @@
+"""
+Merge oil catalog chunks into the single catalog gen_sql.py reads.
 
+Usage:
+    python process_oils.py [sources ...] [--output all_oils_complete.json]
+                           [--report oil_conflicts.json] [--workers N]
+
+Sources default to oils_chunk_*.json in chunk order. Each source is parsed and sorted
+in its own worker process, then the sorted runs are k-way merged by normalized name
+(case-folded, whitespace collapsed). Records for the same oil are merged field by
+field and later sources win, so a correction file can simply be listed last.
+
+Every field whose value differs between sources is written to the conflict report
+together with the value that was kept. The merged catalog is sorted by normalized
+name and serialized exactly like all_oils_complete.json, so re-running on unchanged
+inputs produces an identical file.
+"""
+
+import argparse
+import heapq
 import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def normalize_name(name):
+    return ' '.join(name.casefold().split())
+
+
+def chunk_order(path):
+    """Sort oils_chunk_10.json after oils_chunk_9.json."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', Path(path).name)]
+
+
+def load_source(args):
+    """Parse one source and return its records as a run sorted by (name, source, position)."""
+    index, path = args
+    with open(path) as f:
+        oils = json.load(f)
+    if not isinstance(oils, list):
+        raise ValueError(f"{path}: expected a JSON array of oils")
+    return sorted((normalize_name(oil['name']), index, position, oil) for position, oil in enumerate(oils))
+
+
+def load_runs(paths, workers=None):
+    jobs = list(enumerate(paths))
+    if workers == 1 or len(jobs) < 2:
+        return [load_source(job) for job in jobs]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_source, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def flatten(oil, prefix=''):
+    """Yield (dotted_field, value) pairs for every leaf value of a record."""
+    for key, value in oil.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def deep_update(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            deep_update(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def merge_group(key, entries, sources):
+    """
+    Merge every record for one normalized name.
+
+    Returns:
+        (merged_record, conflicts)
+    """
+    if all(entry[3] == entries[0][3] for entry in entries[1:]):
+        return entries[-1][3], []
+
+    merged = {}
+    seen = {}
+    for _, index, _, oil in entries:
+        deep_update(merged, oil)
+        for field, value in flatten(oil):
+            if field != 'name':
+                seen.setdefault(field, []).append({'source': sources[index], 'value': value})
+
+    kept = dict(flatten(merged))
+    conflicts = []
+    for field, values in seen.items():
+        if any(v['value'] != values[0]['value'] for v in values[1:]):
+            conflicts.append({'name': merged['name'], 'key': key, 'field': field, 'kept': kept[field], 'values': values})
+    return merged, conflicts
+
+
+def merge_sources(paths, workers=None):
+    """
+    Merge catalog sources.
+
+    Returns:
+        (oils, conflicts) - merged records sorted by normalized name and the conflict list
+    """
+    sources = [Path(p).name for p in paths]
+    runs = load_runs(paths, workers)
+    oils = []
+    conflicts = []
+    for key, entries in groupby(heapq.merge(*runs, key=lambda e: e[:3]), key=lambda e: e[0]):
+        merged, found = merge_group(key, list(entries), sources)
+        oils.append(merged)
+        conflicts.extend(found)
+    return oils, conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge oil catalog chunks")
+    parser.add_argument('sources', nargs='*', help='Catalog JSON files, lowest priority first (default: oils_chunk_*.json)')
+    parser.add_argument('--output', default=str(BASE_DIR / 'all_oils_complete.json'), help='Merged catalog to write')
+    parser.add_argument('--report', default=str(BASE_DIR / 'oil_conflicts.json'), help='Conflict report to write')
+    parser.add_argument('--workers', type=int, help='Parser processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    sources = args.sources or sorted(map(str, BASE_DIR.glob('oils_chunk_*.json')), key=chunk_order)
+    if not sources:
+        parser.error("no source files found")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    start = time.perf_counter()
+    oils, conflicts = merge_sources(sources, args.workers)
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(oils, indent=2))
+    with open(args.report, 'w') as f:
+        json.dump({'sources': [Path(p).name for p in sources], 'conflicts': conflicts}, f, indent=2)
+        f.write('\n')
 
-# Chunks from the subagent (I'm reconstructing these from my memory of the tool outputs)
-# Note: I'm only including a representative sample here to demonstrate the script, 
-# but in the actual run I will include all 149 oils.
-# Actually, I'll just write the script to process the chunks if I had them as files.
-# Since I can't easily "copy paste" 149 oils into the prompt, I'll use the browser subagent 
-# to save the data to a file on the system.
-# Wait, the subagent can't write to files. 
-# BUT I can ask the subagent to return the data in a way that I can easily parse.
+    elapsed = time.perf_counter() - start
+    print(f"Merged {len(sources)} sources into {len(oils)} oils in {elapsed:.2f}s")
+    print(f"{len(conflicts)} conflicting fields written to {Path(args.report).name}")
 
-# I'll use the browser subagent to verify the exact names of the 149 oils again 
-# and then I'll write the SQL in batches.
 
-print("Ready to process oils.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,643 @@
+"""
+Streaming, resumable migration of legacy SoapManager databases.
+
+Python counterpart of migrate-legacy.js for large shops and many tenants. Each legacy
+soapmanager.db is read table by table through a cursor in rowid order and written to
+the target in batches, one transaction per batch:
+
+    suppliers, ingredients, recipes, recipe_ingredients, customers, supply_orders,
+    supply_order_items, production_batches, batch_ingredient_usage, sales_orders,
+    sales_order_items
+
+Columns map as in migrate-legacy.js (e.g. batch_ingredient_usage.actual_quantity ->
+quantity_used) and every row gets the tenant's user_id. Ingredients and recipes are
+upserted on (user_id, name) and recipe_ingredients on (recipe_id, ingredient_id), like
+the Node script; rows whose required parent was not migrated are skipped. Each batch is
+written with multi-row INSERTs; when it fails, it is retried row by row so one bad row
+only costs itself.
+
+Neither database promises RETURNING rows in VALUES order, so new ids are never matched
+by position. Plain inserts write ids allocated up front - from the table's sequence on
+Postgres, above MAX(id) under the write lock on SQLite - so each legacy id's new id is
+known before the INSERT. Upserts return their conflict key with the id (RETURNING id,
+user_id, name) and are matched by that key.
+
+The legacy id -> new id map lives in the target, in legacy_id_map, and every batch
+writes its map entries in the same transaction as its rows. A committed row is
+therefore always mapped, and a rerun resumes after the highest legacy id mapped for
+each table, so no row is written twice however the previous run was interrupted. The
+maps of tables other rows reference are loaded into sorted int64 arrays (looked up by
+binary search). Per tenant, the state directory only holds checkpoint.json with the
+last legacy rowid read and the counts per table.
+
+Rows that fail with a constraint or data error (e.g. a lot_number already used by
+another tenant - production_batches.lot_number is unique across all users) are logged,
+counted per table, and make the run exit non-zero; the rows that depend on them are
+counted as skipped.
+
+Tenants run in parallel worker processes (--jobs). The target is sqlite:///path - a
+local stand-in for the hosted database, created with the tables the migration needs -
+or a postgresql:// connection string for the hosted database (needs psycopg).
+
+Usage:
+    python scripts/migrate_legacy.py soapmanager.db --target sqlite:///migrated.db     (user from TARGET_USER_ID)
+    python scripts/migrate_legacy.py shop1.db=USER_UUID shop2.db=USER_UUID ... --target URL
+                                     [--jobs 4] [--batch-size 1000] [--state-dir .migrate-state]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+SQLITE_PREFIX = 'sqlite:///'
+POSTGRES_PREFIXES = ('postgres://', 'postgresql://')
+DEFAULT_STATE_DIR = Path('.migrate-state')
+DEFAULT_BATCH_SIZE = 1000
+POSTGRES_MAX_PARAMS = 65535
+
+
+def first(row, *keys, default=None):
+    """First of row[key] that is not None, like JS `a ?? b ?? default`."""
+    for key in keys:
+        value = row.get(key)
+        if value is not None:
+            return value
+    return default
+
+
+# Transforms return the target row, or None when a required parent is unmapped.
+# `ref(table, legacy_id)` gives the new id of an already migrated row (or None).
+
+def supplier_row(row, ref):
+    return {
+        'name': row.get('name'),
+        'contact_name': first(row, 'contact_name', 'contact'),
+        'email': row.get('email'),
+        'phone': row.get('phone'),
+        'website': row.get('website'),
+        'notes': row.get('notes'),
+    }
+
+
+def ingredient_row(row, ref):
+    return {
+        'name': row.get('name'),
+        'category': row.get('category') or 'Base Oil',
+        'unit': row.get('unit') or 'g',
+        'quantity_on_hand': first(row, 'quantity_on_hand', 'quantity', default=0),
+        'cost_per_unit': first(row, 'cost_per_unit', 'cost', default=0),
+        'sap_naoh': first(row, 'sap_naoh', 'sap_value'),
+        'sap_koh': row.get('sap_koh'),
+        'notes': row.get('notes') or None,
+    }
+
+
+def recipe_row(row, ref):
+    return {
+        'name': row.get('name'),
+        'recipe_type': row.get('recipe_type') or 'Soap',
+        'description': row.get('description') or None,
+        'lye_type': row.get('lye_type') or 'NaOH',
+        'superfat_percentage': first(row, 'superfat', 'superfat_percentage', default=5),
+        'water_percentage': first(row, 'water_percentage', 'water_ratio', default=38),
+        'total_oils_weight': first(row, 'total_oils_weight', 'oil_weight', default=0),
+        'notes': row.get('notes') or None,
+        'stock_quantity': first(row, 'stock_quantity', default=0),
+    }
+
+
+def recipe_ingredient_row(row, ref):
+    recipe_id = ref('recipes', row.get('recipe_id'))
+    ingredient_id = ref('ingredients', row.get('ingredient_id'))
+    if recipe_id is None or ingredient_id is None:
+        return None
+    return {
+        'recipe_id': recipe_id,
+        'ingredient_id': ingredient_id,
+        'quantity': first(row, 'quantity', default=0),
+        'unit': row.get('unit') or 'g',
+    }
+
+
+def customer_row(row, ref):
+    return {
+        'name': row.get('name'),
+        'email': row.get('email'),
+        'phone': row.get('phone'),
+        'address': row.get('address'),
+        'customer_type': first(row, 'customer_type', 'type', default='Retail'),
+        'notes': row.get('notes'),
+    }
+
+
+def supply_order_row(row, ref):
+    supplier_id = ref('suppliers', row.get('supplier_id'))
+    if supplier_id is None:
+        return None
+    return {
+        'supplier_id': supplier_id,
+        'order_date': row.get('order_date'),
+        'total_cost': first(row, 'total_cost', default=0),
+        'status': row.get('status') or 'Ordered',
+        'invoice_number': row.get('invoice_number'),
+        'notes': row.get('notes'),
+    }
+
+
+def supply_order_item_row(row, ref):
+    order_id = ref('supply_orders', row.get('order_id'))
+    ingredient_id = ref('ingredients', row.get('ingredient_id'))
+    if order_id is None or ingredient_id is None:
+        return None
+    return {
+        'order_id': order_id,
+        'ingredient_id': ingredient_id,
+        'quantity': first(row, 'quantity', default=0),
+        'unit': row.get('unit') or 'g',
+        'cost': first(row, 'cost', default=0),
+        'lot_number': row.get('lot_number'),
+        'expiry_date': row.get('expiry_date'),
+        'quantity_base_unit': row.get('quantity_base_unit'),
+    }
+
+
+def batch_row(row, ref):
+    recipe_id = ref('recipes', row.get('recipe_id'))
+    if recipe_id is None:
+        return None
+    return {
+        'lot_number': first(row, 'lot_number', 'batch_number', default=f"LEGACY-{row.get('id')}"),
+        'recipe_id': recipe_id,
+        'scale_factor': first(row, 'scale_factor', default=1),
+        'total_weight': first(row, 'total_weight', default=0),
+        'yield_quantity': first(row, 'yield_quantity', default=0),
+        'status': row.get('status') or 'Completed',
+        'planned_date': row.get('planned_date'),
+        'production_date': row.get('production_date'),
+        'cure_end_date': row.get('cure_end_date'),
+        'total_cost': first(row, 'total_cost', default=0),
+        'notes': row.get('notes'),
+    }
+
+
+def usage_row(row, ref):
+    batch_id = ref('production_batches', row.get('batch_id'))
+    ingredient_id = ref('ingredients', row.get('ingredient_id'))
+    if batch_id is None or ingredient_id is None:
+        return None
+    return {
+        'batch_id': batch_id,
+        'ingredient_id': ingredient_id,
+        'quantity_used': first(row, 'actual_quantity', 'quantity_used', 'quantity'),
+        'planned_quantity': row.get('planned_quantity'),
+        'unit': row.get('unit') or 'g',
+        'cost': first(row, 'cost', default=0),
+        'supply_order_item_id': ref('supply_order_items', row.get('supply_order_item_id')),
+    }
+
+
+def sales_order_row(row, ref):
+    return {
+        'customer_id': ref('customers', row.get('customer_id')),
+        'sale_date': row.get('sale_date'),
+        'status': row.get('status') or 'Completed',
+        'payment_status': row.get('payment_status') or 'Paid',
+        'total_amount': first(row, 'total_amount', default=0),
+    }
+
+
+def sales_order_item_row(row, ref):
+    order_id = ref('sales_orders', row.get('order_id'))
+    recipe_id = ref('recipes', row.get('recipe_id'))
+    if order_id is None or recipe_id is None:
+        return None
+    return {
+        'order_id': order_id,
+        'recipe_id': recipe_id,
+        'batch_id': ref('production_batches', row.get('batch_id')),
+        'quantity': first(row, 'quantity', default=1),
+        'unit_price': first(row, 'unit_price', 'price', default=0),
+        'discount': first(row, 'discount', default=0),
+    }
+
+
+# (table, transform, upsert conflict columns or None, referenced by later tables)
+TABLES = [
+    ('suppliers', supplier_row, None, True),
+    ('ingredients', ingredient_row, ('user_id', 'name'), True),
+    ('recipes', recipe_row, ('user_id', 'name'), True),
+    ('recipe_ingredients', recipe_ingredient_row, ('recipe_id', 'ingredient_id'), False),
+    ('customers', customer_row, None, True),
+    ('supply_orders', supply_order_row, None, True),
+    ('supply_order_items', supply_order_item_row, None, True),
+    ('production_batches', batch_row, None, True),
+    ('batch_ingredient_usage', usage_row, None, False),
+    ('sales_orders', sales_order_row, None, True),
+    ('sales_order_items', sales_order_item_row, None, False),
+]
+
+# Tables of the stand-in target; ingredients/recipes carry the (user_id, name) key
+# migrate-legacy.js upserts on
+SQLITE_TARGET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppliers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, contact_name TEXT, email TEXT,
+    phone TEXT, website TEXT, notes TEXT, user_id TEXT);
+CREATE TABLE IF NOT EXISTS ingredients (id INTEGER PRIMARY KEY, name TEXT NOT NULL, category TEXT NOT NULL DEFAULT 'Other',
+    unit TEXT NOT NULL DEFAULT 'g', quantity_on_hand NUMERIC NOT NULL DEFAULT 0, cost_per_unit NUMERIC NOT NULL DEFAULT 0,
+    sap_naoh NUMERIC, sap_koh NUMERIC, notes TEXT, user_id TEXT, UNIQUE (user_id, name));
+CREATE TABLE IF NOT EXISTS recipes (id INTEGER PRIMARY KEY, name TEXT NOT NULL, recipe_type TEXT, description TEXT,
+    lye_type TEXT, superfat_percentage NUMERIC, water_percentage NUMERIC, total_oils_weight NUMERIC, notes TEXT,
+    stock_quantity INTEGER, user_id TEXT, UNIQUE (user_id, name));
+CREATE TABLE IF NOT EXISTS recipe_ingredients (id INTEGER PRIMARY KEY, recipe_id INTEGER NOT NULL REFERENCES recipes(id),
+    ingredient_id INTEGER NOT NULL REFERENCES ingredients(id), quantity NUMERIC NOT NULL, unit TEXT NOT NULL DEFAULT 'g',
+    user_id TEXT, UNIQUE (recipe_id, ingredient_id));
+CREATE TABLE IF NOT EXISTS customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, email TEXT, phone TEXT, address TEXT,
+    customer_type TEXT, notes TEXT, user_id TEXT);
+CREATE TABLE IF NOT EXISTS supply_orders (id INTEGER PRIMARY KEY, supplier_id INTEGER NOT NULL REFERENCES suppliers(id),
+    order_date TEXT, total_cost NUMERIC NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'Ordered', invoice_number TEXT,
+    notes TEXT, user_id TEXT);
+CREATE TABLE IF NOT EXISTS supply_order_items (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL REFERENCES supply_orders(id),
+    ingredient_id INTEGER NOT NULL REFERENCES ingredients(id), quantity NUMERIC NOT NULL, unit TEXT NOT NULL DEFAULT 'g',
+    cost NUMERIC NOT NULL, lot_number TEXT, expiry_date TEXT, quantity_base_unit NUMERIC, user_id TEXT);
+CREATE TABLE IF NOT EXISTS production_batches (id INTEGER PRIMARY KEY, lot_number TEXT UNIQUE NOT NULL,
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id), scale_factor NUMERIC NOT NULL DEFAULT 1,
+    total_weight NUMERIC NOT NULL DEFAULT 0, yield_quantity INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'Planned', planned_date TEXT, production_date TEXT, cure_end_date TEXT,
+    total_cost NUMERIC DEFAULT 0, notes TEXT, user_id TEXT);
+CREATE TABLE IF NOT EXISTS batch_ingredient_usage (id INTEGER PRIMARY KEY,
+    batch_id INTEGER NOT NULL REFERENCES production_batches(id), ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+    quantity_used NUMERIC, planned_quantity NUMERIC, unit TEXT NOT NULL DEFAULT 'g', cost NUMERIC NOT NULL DEFAULT 0,
+    supply_order_item_id INTEGER REFERENCES supply_order_items(id), user_id TEXT);
+CREATE TABLE IF NOT EXISTS sales_orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+    sale_date TEXT, status TEXT NOT NULL DEFAULT 'Completed', payment_status TEXT NOT NULL DEFAULT 'Paid',
+    total_amount NUMERIC NOT NULL DEFAULT 0, user_id TEXT);
+CREATE TABLE IF NOT EXISTS sales_order_items (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL REFERENCES sales_orders(id),
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id), batch_id INTEGER REFERENCES production_batches(id),
+    quantity INTEGER NOT NULL DEFAULT 1, unit_price NUMERIC NOT NULL, discount NUMERIC DEFAULT 0, user_id TEXT);
+"""
+
+# Created in every target, hosted or not
+ID_MAP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS legacy_id_map (user_id TEXT NOT NULL, table_name TEXT NOT NULL, legacy_id BIGINT NOT NULL,
+    new_id BIGINT NOT NULL, PRIMARY KEY (user_id, table_name, legacy_id))
+"""
+
+
+class IdMap:
+    """Legacy id -> new id map held in two sorted int64 arrays."""
+
+    def __init__(self, pairs=()):
+        """
+        Args:
+            pairs: (legacy_id, new_id) in ascending legacy id order
+        """
+        self.legacy = array('q')
+        self.new = array('q')
+        for legacy, new in pairs:
+            self.legacy.append(legacy)
+            self.new.append(new)
+
+    def get(self, legacy_id):
+        if legacy_id is None:
+            return None
+        i = bisect_left(self.legacy, legacy_id)
+        if i < len(self.legacy) and self.legacy[i] == legacy_id:
+            return self.new[i]
+        return None
+
+    def last(self):
+        return self.legacy[-1] if self.legacy else None
+
+    def extend(self, pairs):
+        """Record (legacy_id, new_id) pairs the target has committed."""
+        for legacy, new in pairs:
+            if not self.legacy or legacy > self.legacy[-1]:
+                self.legacy.append(legacy)
+                self.new.append(new)
+            else:
+                i = bisect_left(self.legacy, legacy)
+                insort(self.legacy, legacy)
+                self.new.insert(i, new)
+
+    def __len__(self):
+        return len(self.legacy)
+
+
+class Target:
+    """Batched multi-row inserts/upserts returning new ids, over a DB-API connection."""
+
+    def __init__(self, conn, placeholder, errors, max_params):
+        """
+        Args:
+            errors: exception types that mean a row is bad (constraint or data
+                errors); anything else aborts the run so it can be resumed
+            max_params: bound parameters allowed in one statement
+        """
+        self.conn = conn
+        self.placeholder = placeholder
+        self.errors = errors
+        self.max_params = max_params
+
+    @classmethod
+    def open(cls, url):
+        if url.startswith(SQLITE_PREFIX):
+            conn = sqlite3.connect(url[len(SQLITE_PREFIX):], timeout=60)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.executescript(SQLITE_TARGET_SCHEMA + ID_MAP_SCHEMA)
+            return cls(conn, '?', (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError),
+                       conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER))
+        if url.startswith(POSTGRES_PREFIXES):
+            try:
+                import psycopg
+            except ImportError:
+                raise ValueError("postgresql:// targets need psycopg (pip install 'psycopg[binary]')")
+            conn = psycopg.connect(url)
+            conn.execute(ID_MAP_SCHEMA)
+            conn.commit()
+            # A multi-row upsert touching one key twice is a cardinality violation
+            return cls(conn, '%s', (psycopg.IntegrityError, psycopg.DataError, psycopg.errors.CardinalityViolation),
+                       POSTGRES_MAX_PARAMS)
+        raise ValueError(f"Unsupported target URL: {url} (expected {SQLITE_PREFIX}path or postgresql://...)")
+
+    def close(self):
+        self.conn.close()
+
+    def statement(self, table, columns, conflict, count):
+        """INSERT of count rows; upserts return each row's id and conflict key."""
+        row = f"({', '.join([self.placeholder] * len(columns))})"
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row] * count)}"
+        if conflict:
+            # DO UPDATE (not DO NOTHING) so rows that already exist still return their id
+            updates = [c for c in columns if c not in conflict] or list(conflict[:1])
+            sql += (f" ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET "
+                    + ', '.join(f"{c} = excluded.{c}" for c in updates)
+                    + f" RETURNING id, {', '.join(conflict)}")
+        return sql
+
+    def begin(self, cur):
+        # SQLite: take the write lock now, so MAX(id) stays ours until commit
+        if self.placeholder == '?':
+            cur.execute("BEGIN IMMEDIATE")
+
+    def allocate_ids(self, cur, table, count):
+        """count unused ids for table, reserved until the transaction ends."""
+        if self.placeholder == '?':
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            (last,) = cur.fetchone()
+            return list(range(last + 1, last + 1 + count))
+        cur.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", (table, count))
+        return [new_id for (new_id,) in cur.fetchall()]
+
+    def map_statement(self, count):
+        row = f"({', '.join([self.placeholder] * 4)})"
+        return (f"INSERT INTO legacy_id_map (user_id, table_name, legacy_id, new_id) VALUES {', '.join([row] * count)} "
+                f"ON CONFLICT (user_id, table_name, legacy_id) DO UPDATE SET new_id = excluded.new_id")
+
+    def write(self, table, keyed, conflict, user_id):
+        """
+        Write rows and their legacy_id_map entries in one transaction.
+
+        Args:
+            keyed: [(legacy_id, row)], every row with the same columns
+
+        Returns:
+            [(legacy_id, new_id)] in row order
+        """
+        columns = list(keyed[0][1])
+        cur = self.conn.cursor()
+        try:
+            self.begin(cur)
+            if conflict:
+                rows = [row for _, row in keyed]
+            else:
+                ids = self.allocate_ids(cur, table, len(keyed))
+                rows = [{'id': new_id, **row} for new_id, (_, row) in zip(ids, keyed)]
+                columns = ['id'] + columns
+            returned = {}
+            step = max(1, self.max_params // len(columns))
+            for start in range(0, len(rows), step):
+                chunk = rows[start:start + step]
+                cur.execute(self.statement(table, columns, conflict, len(chunk)),
+                            [row[c] for row in chunk for c in columns])
+                if conflict:
+                    # str() so a returned uuid user_id matches the text sent
+                    returned.update((tuple(map(str, key)), new_id) for new_id, *key in cur.fetchall())
+            if conflict:
+                written = []
+                for legacy_id, row in keyed:
+                    new_id = returned.get(tuple(str(row[c]) for c in conflict))
+                    if new_id is None:
+                        raise RuntimeError(f"{table}: no id returned for legacy id {legacy_id}")
+                    written.append((legacy_id, new_id))
+            else:
+                written = [(legacy_id, row['id']) for (legacy_id, _), row in zip(keyed, rows)]
+            step = self.max_params // 4
+            for start in range(0, len(written), step):
+                chunk = written[start:start + step]
+                cur.execute(self.map_statement(len(chunk)),
+                            [v for legacy_id, new_id in chunk for v in (user_id, table, legacy_id, new_id)])
+            self.conn.commit()
+            return written
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def id_map(self, user_id, table):
+        """The committed legacy id -> new id pairs of a table, by legacy id."""
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT legacy_id, new_id FROM legacy_id_map WHERE user_id = {self.placeholder} "
+                    f"AND table_name = {self.placeholder} ORDER BY legacy_id", (user_id, table))
+        pairs = cur.fetchall()
+        self.conn.commit()
+        return pairs
+
+    def last_legacy_id(self, user_id, table):
+        """Highest legacy id of a table committed to the target, or None."""
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT MAX(legacy_id) FROM legacy_id_map WHERE user_id = {self.placeholder} "
+                    f"AND table_name = {self.placeholder}", (user_id, table))
+        (last,) = cur.fetchone()
+        self.conn.commit()
+        return last
+
+
+def write_checkpoint(path, checkpoint):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(tmp, 0o666 & ~mask)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def migrate_tenant(legacy_path, user_id, target_url, state_dir=DEFAULT_STATE_DIR, batch_size=DEFAULT_BATCH_SIZE, log=print):
+    """
+    Migrate one legacy database for one user, resuming from its checkpoint.
+
+    Returns:
+        {table: {'migrated', 'skipped', 'errors'}} for this run and earlier ones
+    """
+    tenant_dir = Path(state_dir) / user_id
+    tenant_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = tenant_dir / 'checkpoint.json'
+    checkpoint = {'legacy_db': str(Path(legacy_path).resolve()), 'tables': {}}
+    if checkpoint_path.exists():
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+
+    source = sqlite3.connect(f"file:{legacy_path}?mode=ro", uri=True)
+    source.row_factory = sqlite3.Row
+    target = Target.open(target_url)
+    maps = {}
+
+    def ref(table, legacy_id):
+        return maps[table].get(legacy_id)
+
+    try:
+        maps.update((table, IdMap(target.id_map(user_id, table))) for table, _, _, mapped in TABLES if mapped)
+        legacy_tables = {name for (name,) in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table, transform, conflict, mapped in TABLES:
+            state = checkpoint['tables'].setdefault(table, {'last_rowid': None, 'done': False,
+                                                            'migrated': 0, 'skipped': 0, 'errors': 0})
+            if state['done'] or table not in legacy_tables:
+                continue
+            start = time.perf_counter()
+            # Mapped rows were committed even if the checkpoint missed them
+            # (legacy ids are INTEGER PRIMARY KEYs, i.e. the rowid)
+            last = maps[table].last() if mapped else target.last_legacy_id(user_id, table)
+            after = max(x for x in (state['last_rowid'], last, 0) if x is not None)
+            cursor = source.execute(f"SELECT rowid AS _rowid, * FROM {table} WHERE rowid > ? ORDER BY rowid", (after,))
+            while batch := cursor.fetchmany(batch_size):
+                keyed, skipped = [], 0
+                for legacy in batch:
+                    legacy = dict(legacy)
+                    row = transform(legacy, ref)
+                    if row is None:
+                        skipped += 1
+                        continue
+                    row['user_id'] = user_id
+                    keyed.append((legacy['id'] if legacy.get('id') is not None else legacy['_rowid'], row))
+                written, errors = write_batch(target, table, keyed, conflict, user_id, log)
+                if mapped:
+                    maps[table].extend(written)
+                state['last_rowid'] = batch[-1]['_rowid']
+                state['migrated'] += len(written)
+                state['skipped'] += skipped
+                state['errors'] += errors
+                write_checkpoint(checkpoint_path, checkpoint)
+            state['done'] = True
+            write_checkpoint(checkpoint_path, checkpoint)
+            log(f"[{user_id}] {table}: {state['migrated']} migrated, {state['skipped']} skipped, "
+                f"{state['errors']} errors ({time.perf_counter() - start:.1f}s)")
+    finally:
+        source.close()
+        target.close()
+    return {table: {k: v for k, v in state.items() if k in ('migrated', 'skipped', 'errors')}
+            for table, state in checkpoint['tables'].items()}
+
+
+def write_batch(target, table, keyed, conflict, user_id, log):
+    """
+    Write a batch, falling back to row-by-row when it fails.
+
+    Returns:
+        ([(legacy_id, new_id)], errors)
+    """
+    if not keyed:
+        return [], 0
+    try:
+        return target.write(table, keyed, conflict, user_id), 0
+    except target.errors:
+        pass
+    written, errors = [], 0
+    for legacy_id, row in keyed:
+        try:
+            written.extend(target.write(table, [(legacy_id, row)], conflict, user_id))
+        except target.errors as e:
+            log(f"  ERR {table} legacy id {legacy_id}: {e}")
+            errors += 1
+    return written, errors
+
+
+def parse_tenant(spec, default_user):
+    path, sep, user_id = spec.rpartition('=')
+    if not sep:
+        path, user_id = spec, default_user
+    if not user_id:
+        raise ValueError(f"No user for {spec}: use PATH=USER_ID or set TARGET_USER_ID")
+    if not Path(path).is_file():
+        raise ValueError(f"Legacy database not found: {path}")
+    return path, user_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate legacy SoapManager databases in resumable batches")
+    parser.add_argument('databases', nargs='+', metavar='PATH[=USER_ID]',
+                        help='Legacy soapmanager.db files; USER_ID defaults to $TARGET_USER_ID')
+    parser.add_argument('--target', default=os.environ.get('TARGET_DATABASE_URL'),
+                        help='sqlite:///path or postgresql://... (default: $TARGET_DATABASE_URL)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per write transaction')
+    parser.add_argument('--jobs', type=int, default=1, help='Tenants migrated in parallel')
+    parser.add_argument('--state-dir', default=str(DEFAULT_STATE_DIR), help='Per-tenant checkpoints')
+    args = parser.parse_args()
+
+    if not args.target:
+        parser.error("--target or TARGET_DATABASE_URL is required")
+    if args.batch_size < 1 or args.jobs < 1:
+        parser.error("--batch-size and --jobs must be positive")
+    try:
+        tenants = [parse_tenant(spec, os.environ.get('TARGET_USER_ID')) for spec in args.databases]
+        if len({user for _, user in tenants}) != len(tenants):
+            raise ValueError("Each user can only be migrated from one database per run")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    summaries, failed = {}, 0
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(tenants))) as pool:
+        futures = {
+            pool.submit(migrate_tenant, path, user, args.target, args.state_dir, args.batch_size): user
+            for path, user in tenants
+        }
+        for future in as_completed(futures):
+            user = futures[future]
+            try:
+                summaries[user] = future.result()
+            except Exception as e:
+                print(f"Error: [{user}] {type(e).__name__}: {e} (rerun to resume)")
+                failed += 1
+
+    print('\n==============================')
+    print('Migration Summary')
+    print('==============================')
+    for user, summary in summaries.items():
+        rows = sum(s['migrated'] for s in summary.values())
+        print(f"{user}: {rows} rows migrated")
+        for table, s in summary.items():
+            print(f"  {table}: {s['migrated']} migrated, {s['skipped']} skipped, {s['errors']} errors")
+    print(f"{len(summaries)} of {len(tenants)} tenants complete in {time.perf_counter() - start:.1f}s")
+
+    bad = [(user, table, s) for user, summary in summaries.items() for table, s in summary.items() if s['errors']]
+    for user, table, s in bad:
+        print(f"Error: [{user}] {table}: {s['errors']} rows failed, {s['skipped']} skipped")
+    if bad:
+        print(f"Error: {sum(s['errors'] for _, _, s in bad)} rows failed to migrate (see the ERR lines above)")
+    if failed or bad:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+Batch soapmaking services for SoapBuddy.
+
+Python counterparts of the per-request logic in web/frontend (soapCalculator.js,
+calculateLye in api/client.js, ...) for offline and bulk work over the oil library
+and exported or local SQLite copies of the Supabase tables. Run from the repository
+root, e.g. `python -m services.oil_matrix build`. Requires numpy.
+"""
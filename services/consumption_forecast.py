@@ -0,0 +1,347 @@
+"""
+Consumption-rate forecasting for low-stock and expiry alerts.
+
+LowStockBanner.jsx compares quantity_on_hand with reorder_threshold and expiry_date
+with today - a snapshot that cannot say when stock will run out, or whether a lot
+will be used before it expires. This module keeps an exponentially weighted
+consumption rate per ingredient, fed one batch_ingredient_usage row at a time:
+
+    S <- S * exp(-(t - t_last) / tau) + q        rate = S / tau  (per day)
+
+with tau = half_life / ln 2, so usage from half_life days ago counts half as much.
+The state per ingredient is four numbers however long the history, and rows are read
+through a cursor, so years of usage stream in one pass. Rows arriving out of order
+are decayed to the current time instead. While the history is shorter than tau the
+rate is scaled up by 1 / (1 - exp(-span / tau)) so early estimates are not biased low.
+
+Usage only counts inside a window of WINDOW_HALF_LIVES half-lives back from today
+(older usage weighs under 0.1%). Counted batch ids are remembered - a batch whose
+status changes is read again - until their date leaves the window, so the state file
+stays bounded by the batches of the last window rather than the whole history.
+
+From the rate, each ingredient gets days until stockout and until its reorder
+threshold; its expiring stock - the newest received lots covering quantity_on_hand,
+used earliest expiry first (or the ingredient's own expiry_date when it has no lots)
+- is flagged with the quantity that will still be left when it expires.
+
+Usage:
+    python -m services.consumption_forecast sqlite:///soap.db [--state consumption_forecast.json]
+                                            [--half-life 30] [--horizon 30] [--as-of YYYY-MM-DD] [--output alerts.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from services.lot_costing import CONSUMING_STATUSES
+from services.material_planner import unit_factor
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STATE = BASE_DIR / 'consumption_forecast.json'
+SQLITE_PREFIX = 'sqlite:///'
+STATE_VERSION = 2
+DEFAULT_HALF_LIFE = 30.0
+WINDOW_HALF_LIVES = 10
+RECEIVED_STATUS = 'Received'
+
+
+def day_number(value):
+    """Proleptic ordinal day of an ISO date or timestamp, or None."""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class ConsumptionForecast:
+    """Exponentially weighted daily consumption per ingredient."""
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE):
+        if half_life <= 0:
+            raise ValueError("half_life must be positive")
+        self.half_life = half_life
+        self.tau = half_life / math.log(2)
+        # ingredient_id -> [decayed sum S, day of S, first day seen, total used]
+        self.state = {}
+        # Batch id -> day of the batches counted inside the window, the window's first
+        # day (it never moves back) and the highest batch updated_at read
+        self.counted = {}
+        self.cutoff = None
+        self.watermark = None
+
+    def observe(self, ingredient_id, quantity, day):
+        """Count `quantity` of an ingredient used on ordinal `day`."""
+        entry = self.state.get(ingredient_id)
+        if entry is None:
+            self.state[ingredient_id] = [quantity, day, day, quantity]
+            return
+        if day >= entry[1]:
+            entry[0] = entry[0] * math.exp(-(day - entry[1]) / self.tau) + quantity
+            entry[1] = day
+        else:
+            entry[0] += quantity * math.exp(-(entry[1] - day) / self.tau)
+        entry[2] = min(entry[2], day)
+        entry[3] += quantity
+
+    def rate(self, ingredient_id, today):
+        """Daily consumption rate as of ordinal day `today`."""
+        entry = self.state.get(ingredient_id)
+        if entry is None:
+            return 0.0
+        decayed, last, first, _ = entry
+        if today > last:
+            decayed *= math.exp(-(today - last) / self.tau)
+        span = max(today, last) - first + 1
+        return decayed / self.tau / (1 - math.exp(-span / self.tau))
+
+    def sync(self, source, units, today=None):
+        """
+        Stream usage of batches not yet counted.
+
+        Args:
+            source: object with usage_since(updated_after) yielding (batch_id,
+                batch updated_at, batch date, ingredient_id, quantity_used, unit)
+            units: {ingredient_id: unit} to convert usage into
+            today: ordinal day the window ends on (default: today)
+
+        Returns:
+            usage rows counted
+        """
+        today = today if today is not None else date.today().toordinal()
+        cutoff = today - math.ceil(WINDOW_HALF_LIVES * self.half_life)
+        self.cutoff = cutoff if self.cutoff is None else max(self.cutoff, cutoff)
+        # Batches older than the window are skipped from now on, so they can be forgotten
+        self.counted = {batch_id: day for batch_id, day in self.counted.items() if day >= self.cutoff}
+
+        rows = 0
+        seen = {}
+        for batch_id, updated_at, when, ingredient_id, quantity, unit in source.usage_since(self.watermark):
+            if updated_at is not None and (self.watermark is None or str(updated_at) > self.watermark):
+                self.watermark = str(updated_at)
+            day = day_number(when)
+            if batch_id in self.counted or day is None or day < self.cutoff or ingredient_id not in units:
+                continue
+            seen[batch_id] = day
+            self.observe(ingredient_id, float(quantity or 0) * unit_factor(unit, units[ingredient_id]), day)
+            rows += 1
+        self.counted.update(seen)
+        return rows
+
+    def project(self, ingredient, lots=(), today=None):
+        """
+        Stockout and expiry projection for one ingredients row.
+
+        Args:
+            lots: received supply_order_items rows for the ingredient (quantity in its
+                unit, expiry_date, order_date), any order
+            today: ordinal day to project from (default: today)
+
+        Returns:
+            dict with daily_rate, days_to_stockout, stockout_date,
+            days_to_reorder and expiring [{lot_number, expiry_date, quantity,
+            at_risk}] (None for days when nothing is being used)
+        """
+        today = today if today is not None else date.today().toordinal()
+        rate = self.rate(ingredient['id'], today)
+        on_hand = float(ingredient.get('quantity_on_hand') or 0)
+        threshold = float(ingredient.get('reorder_threshold') or 0)
+        days_to_stockout = on_hand / rate if rate > 0 else None
+        days_to_reorder = max(0.0, (on_hand - threshold) / rate) if rate > 0 and threshold > 0 else None
+
+        # Stock on hand is the newest lots (older ones were used first)
+        stock = []
+        left = on_hand
+        for lot in sorted(lots, key=lambda lot: (str(lot.get('order_date') or ''), lot.get('id') or 0), reverse=True):
+            if left <= 0:
+                break
+            take = min(left, float(lot.get('quantity') or 0))
+            stock.append((lot.get('expiry_date'), lot.get('lot_number'), take))
+            left -= take
+        if not lots and ingredient.get('expiry_date'):
+            stock.append((ingredient['expiry_date'], None, on_hand))
+
+        expiring = []
+        used = 0.0
+        for expiry, lot_number, quantity in sorted(stock, key=lambda s: (s[0] is None, str(s[0] or ''))):
+            expires = day_number(expiry)
+            if expires is None:
+                continue
+            # FEFO: this lot is drawn on once the ones before it are used up
+            usable = min(quantity, max(0.0, rate * (expires - today) - used))
+            used += usable
+            if quantity - usable > 1e-9:
+                expiring.append({
+                    'lot_number': lot_number,
+                    'expiry_date': str(expiry)[:10],
+                    'quantity': round(quantity, 4),
+                    'at_risk': round(quantity - usable, 4),
+                })
+
+        return {
+            'id': ingredient['id'],
+            'name': ingredient.get('name'),
+            'unit': ingredient.get('unit'),
+            'on_hand': on_hand,
+            'reorder_threshold': threshold,
+            'daily_rate': round(rate, 4),
+            'days_to_stockout': round(days_to_stockout, 1) if days_to_stockout is not None else None,
+            'stockout_date': (date.fromordinal(today) + timedelta(days=int(days_to_stockout))).isoformat()
+            if days_to_stockout is not None else None,
+            'days_to_reorder': round(days_to_reorder, 1) if days_to_reorder is not None else None,
+            'expiring': expiring,
+        }
+
+    def alerts(self, ingredients, lots_by_ingredient, horizon=30, today=None):
+        """Projections for ingredients reaching reorder/stockout or with stock expiring unused within `horizon` days."""
+        today = today if today is not None else date.today().toordinal()
+        alerts = []
+        for ingredient in ingredients:
+            projection = self.project(ingredient, lots_by_ingredient.get(ingredient['id'], ()), today)
+            soon = [d for d in (projection['days_to_reorder'], projection['days_to_stockout']) if d is not None]
+            expiring = [e for e in projection['expiring'] if day_number(e['expiry_date']) - today <= horizon]
+            if (soon and min(soon) <= horizon) or expiring:
+                alerts.append({**projection, 'expiring': expiring})
+        return sorted(alerts, key=lambda a: (a['days_to_stockout'] is None, a['days_to_stockout'] or 0))
+
+    def save(self, path=DEFAULT_STATE):
+        """Write the rates, window and watermark atomically."""
+        path = Path(path)
+        state = {
+            'version': STATE_VERSION,
+            'half_life': self.half_life,
+            'watermark': self.watermark,
+            'cutoff': self.cutoff,
+            'counted': sorted(self.counted.items()),
+            'state': [[ingredient_id, *entry] for ingredient_id, entry in self.state.items()],
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE, half_life=DEFAULT_HALF_LIFE):
+        """Forecast from a saved state; a missing file starts empty with `half_life`."""
+        if not Path(path).exists():
+            return cls(half_life)
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"{path}: unsupported forecast state version")
+        if state['half_life'] != half_life:
+            raise ValueError(f"{path} was built with --half-life {state['half_life']}; delete it to rebuild")
+        forecast = cls(state['half_life'])
+        forecast.watermark = state['watermark']
+        forecast.cutoff = state['cutoff']
+        forecast.counted = dict(state['counted'])
+        forecast.state = {ingredient_id: entry for ingredient_id, *entry in state['state']}
+        return forecast
+
+
+class SQLiteForecastSource:
+    """Streams usage and reads ingredients and lots from a SQLite database."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):])
+
+    def close(self):
+        self.conn.close()
+
+    def usage_since(self, updated_after):
+        sql = ("SELECT b.id, b.updated_at, COALESCE(b.production_date, b.planned_date, b.created_at), "
+               "u.ingredient_id, u.quantity_used, u.unit FROM batch_ingredient_usage u "
+               "JOIN production_batches b ON b.id = u.batch_id "
+               f"WHERE b.status IN ({', '.join('?' * len(CONSUMING_STATUSES))})")
+        params = list(CONSUMING_STATUSES)
+        if updated_after is not None:
+            # >= so batches sharing the watermark's timestamp are not missed; counted ones are skipped
+            sql += " AND b.updated_at >= ?"
+            params.append(updated_after)
+        # Iterating the cursor streams rows without loading the history
+        return self.conn.execute(sql, params)
+
+    def ingredients(self):
+        cursor = self.conn.execute("SELECT * FROM ingredients")
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def lots(self, units):
+        """Received lots per ingredient, quantities in the ingredient's unit."""
+        lots = {}
+        rows = self.conn.execute(
+            "SELECT i.id, i.ingredient_id, COALESCE(i.quantity_base_unit, i.quantity), "
+            "CASE WHEN i.quantity_base_unit IS NULL THEN i.unit ELSE 'g' END, "
+            "i.lot_number, i.expiry_date, o.order_date FROM supply_order_items i "
+            "JOIN supply_orders o ON o.id = i.order_id WHERE o.status = ?", (RECEIVED_STATUS,))
+        for lot_id, ingredient_id, quantity, unit, lot_number, expiry, ordered in rows:
+            if ingredient_id in units:
+                lots.setdefault(ingredient_id, []).append({
+                    'id': lot_id,
+                    'quantity': float(quantity or 0) * unit_factor(unit, units[ingredient_id]),
+                    'lot_number': lot_number,
+                    'expiry_date': expiry,
+                    'order_date': ordered,
+                })
+        return lots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast stockouts and unused expiring stock")
+    parser.add_argument('url', help='Database URL (sqlite:///path)')
+    parser.add_argument('--state', default=str(DEFAULT_STATE), help='Forecast state file')
+    parser.add_argument('--half-life', type=float, default=DEFAULT_HALF_LIFE, help='Days for usage to lose half its weight')
+    parser.add_argument('--horizon', type=float, default=30, help='Alert on events within this many days')
+    parser.add_argument('--as-of', help='Project from this date (YYYY-MM-DD, default today)')
+    parser.add_argument('--output', '-o', help='Write alerts as JSON instead of printing them')
+    args = parser.parse_args()
+
+    today = day_number(args.as_of) if args.as_of else date.today().toordinal()
+    if today is None:
+        parser.error("--as-of must be YYYY-MM-DD")
+    try:
+        forecast = ConsumptionForecast.load(args.state, args.half_life)
+        source = SQLiteForecastSource(args.url)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        ingredients = source.ingredients()
+        units = {row['id']: row.get('unit') for row in ingredients}
+        rows = forecast.sync(source, units, today)
+        alerts = forecast.alerts(ingredients, source.lots(units), args.horizon, today)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        source.close()
+    forecast.save(args.state)
+    elapsed = time.perf_counter() - start
+
+    output = json.dumps(alerts, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Read {rows} new usage rows, {len(alerts)} alerts in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Incremental financial rollups.
+
+Replaces getFinancialSummary's full download of sales_orders and expenses with
+running totals that are updated from new or changed rows only. Totals are kept for
+every (user, period) bucket - user is a user_id or '*' for everyone, period is 'all',
+a month 'YYYY-MM' or a day 'YYYY-MM-DD' - so a summary is a dictionary lookup:
+
+    revenue by status, expenses by category, and from those total_revenue
+    (Completed orders, as getFinancialSummary counts it), total_expenses,
+    net_profit and margin
+
+Each row's last contribution is remembered, so a changed row moves its amount
+between buckets instead of being counted twice, and a deleted row can be retracted.
+Amounts are summed as Decimal, so totals do not drift however often rows change.
+
+Rows arrive either from an exported dataset ({"sales_orders": [...], "expenses":
+[...]}) or from a database: sync() reads rows past an id watermark, plus rows at or
+past a timestamp watermark when the table has a change column (e.g. updated_at).
+Neither sales_orders nor expenses has one in the Supabase schema, so sync() then
+reconciles: it reads (id, digest of the counted columns) for every row, re-reads the
+rows whose digest differs from the contribution counted for them and retracts the
+ids that are gone - status changes, edits and deletions included. --no-reconcile
+skips that pass when only new rows matter.
+SQLiteFinanceSource is the local stand-in for the Supabase tables.
+
+Usage:
+    python -m services.financial_rollups sync sqlite:///soap.db [--state financial_rollups.json] [--changed-column updated_at]
+                                              [--no-reconcile]
+    python -m services.financial_rollups load export.json [--state financial_rollups.json]
+    python -m services.financial_rollups summary [--state financial_rollups.json] [--user ID] [--month YYYY-MM | --day YYYY-MM-DD]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STATE = BASE_DIR / 'financial_rollups.json'
+SQLITE_PREFIX = 'sqlite:///'
+STATE_VERSION = 1
+ALL_USERS = '*'
+ALL_TIME = 'all'
+REVENUE_STATUS = 'Completed'
+
+# table -> (date column, bucket column, amount column, metric)
+TABLES = {
+    'sales_orders': ('sale_date', 'status', 'total_amount', 'revenue'),
+    'expenses': ('date', 'category', 'amount', 'expenses'),
+}
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def contribution(table, row):
+    """(user, date, bucket, amount) a row adds to the totals."""
+    date_column, bucket_column, amount_column, _ = TABLES[table]
+    return (str(row.get('user_id') or ''), str(row.get(date_column) or ''), str(row.get(bucket_column) or ''),
+            to_decimal(row.get(amount_column)))
+
+
+def digest(contribution):
+    """Short hash of a contribution; equal amounts hash alike however they are written."""
+    user, date, bucket, amount = contribution
+    payload = json.dumps([user, date, bucket, str(amount.normalize())])
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def periods(date):
+    """Buckets a row dated `date` (ISO string) contributes to."""
+    date = str(date or '')
+    if len(date) < 10:
+        return (ALL_TIME,)
+    return ALL_TIME, date[:7], date[:10]
+
+
+class FinancialRollups:
+    """Running revenue and expense totals per user and period."""
+
+    def __init__(self):
+        # (user, period) -> {'revenue': {status: Decimal}, 'expenses': {category: Decimal}}
+        self.totals = defaultdict(lambda: {'revenue': defaultdict(Decimal), 'expenses': defaultdict(Decimal)})
+        # table -> {row id: (user, date, bucket, amount)} - the contribution currently counted
+        self.rows = {table: {} for table in TABLES}
+        # table -> {'id': highest id seen, 'changed': highest change timestamp seen}
+        self.watermarks = {table: {'id': None, 'changed': None} for table in TABLES}
+
+    def apply(self, table, row):
+        """
+        Count a new or changed row, replacing its previous contribution.
+
+        Returns:
+            True if the totals changed
+        """
+        new = contribution(table, row)
+        row_id = row['id']
+        old = self.rows[table].get(row_id)
+        if old == new:
+            return False
+        if old is not None:
+            self._add(table, *old, sign=-1)
+        self._add(table, *new, sign=1)
+        self.rows[table][row_id] = new
+        mark = self.watermarks[table]
+        if mark['id'] is None or row_id > mark['id']:
+            mark['id'] = row_id
+        return True
+
+    def remove(self, table, row_id):
+        """Retract a deleted row."""
+        old = self.rows[table].pop(row_id, None)
+        if old is not None:
+            self._add(table, *old, sign=-1)
+        return old is not None
+
+    def apply_dataset(self, data):
+        """Apply an exported {"sales_orders": [...], "expenses": [...]} dataset; returns rows changed."""
+        return sum(self.apply(table, row) for table in TABLES for row in data.get(table) or [])
+
+    def sync(self, source, changed_column=None, reconcile=True):
+        """
+        Pull rows past the watermarks from a source and apply them.
+
+        Args:
+            source: object with fetch(table, after_id, changed_column, changed_after),
+                digests(table) yielding (id, digest) for every row and
+                fetch_ids(table, ids)
+            changed_column: timestamp column marking updated rows, if the tables have one
+            reconcile: also re-apply rows whose digest changed and retract deleted ones
+
+        Returns:
+            rows changed
+        """
+        changed = 0
+        for table in TABLES:
+            mark = self.watermarks[table]
+            # Rows sharing the watermark's timestamp come back; apply() ignores unchanged ones
+            for row in source.fetch(table, mark['id'], changed_column, mark['changed']):
+                changed += self.apply(table, row)
+                stamp = row.get(changed_column) if changed_column else None
+                if stamp is not None and (mark['changed'] is None or str(stamp) > mark['changed']):
+                    mark['changed'] = str(stamp)
+            if reconcile:
+                changed += self.reconcile(table, source)
+        return changed
+
+    def reconcile(self, table, source):
+        """Bring a table's counted rows in line with the source's digests; returns rows changed."""
+        counted = self.rows[table]
+        present, stale = set(), []
+        for row_id, row_digest in source.digests(table):
+            present.add(row_id)
+            old = counted.get(row_id)
+            if old is None or digest(old) != row_digest:
+                stale.append(row_id)
+        changed = sum(self.remove(table, row_id) for row_id in set(counted) - present)
+        for row in source.fetch_ids(table, stale):
+            changed += self.apply(table, row)
+        return changed
+
+    def summary(self, user=ALL_USERS, period=ALL_TIME):
+        """getFinancialSummary for one user (or '*') and period ('all', 'YYYY-MM' or 'YYYY-MM-DD')."""
+        bucket = self.totals.get((user, period))
+        revenue_by_status = dict(bucket['revenue']) if bucket else {}
+        expenses_by_category = dict(bucket['expenses']) if bucket else {}
+        revenue = revenue_by_status.get(REVENUE_STATUS, Decimal(0))
+        expenses = sum(expenses_by_category.values(), Decimal(0))
+        return {
+            'total_revenue': float(revenue),
+            'total_expenses': float(expenses),
+            'net_profit': float(revenue - expenses),
+            'margin': float((revenue - expenses) / revenue * 100) if revenue > 0 else 0,
+            'revenue_by_status': {k: float(v) for k, v in revenue_by_status.items() if v},
+            'expenses_by_category': {k: float(v) for k, v in expenses_by_category.items() if v},
+        }
+
+    def _add(self, table, user, date, bucket, amount, sign):
+        metric = TABLES[table][3]
+        for who in (user, ALL_USERS):
+            for period in periods(date):
+                totals = self.totals[(who, period)][metric]
+                totals[bucket] += sign * amount
+                if not totals[bucket]:
+                    del totals[bucket]
+
+    def save(self, path=DEFAULT_STATE):
+        """Write the rollup state atomically."""
+        path = Path(path)
+        state = {
+            'version': STATE_VERSION,
+            'watermarks': self.watermarks,
+            'totals': [[user, period, metric, bucket, str(amount)]
+                       for (user, period), metrics in self.totals.items()
+                       for metric, buckets in metrics.items() for bucket, amount in buckets.items()],
+            'rows': {table: [[row_id, *old[:3], str(old[3])] for row_id, old in rows.items()]
+                     for table, rows in self.rows.items()},
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE):
+        """Rollups from a saved state; a missing file gives empty rollups."""
+        rollups = cls()
+        if not Path(path).exists():
+            return rollups
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"{path}: unsupported rollup state version")
+        rollups.watermarks = state['watermarks']
+        for user, period, metric, bucket, amount in state['totals']:
+            rollups.totals[(user, period)][metric][bucket] = Decimal(amount)
+        for table, rows in state['rows'].items():
+            rollups.rows[table] = {row_id: (user, date, bucket, Decimal(amount))
+                                   for row_id, user, date, bucket, amount in rows}
+        return rollups
+
+
+class SQLiteFinanceSource:
+    """Reads sales_orders and expenses rows from a SQLite database."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):])
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        self.conn.close()
+
+    def fetch(self, table, after_id, changed_column=None, changed_after=None):
+        """Rows with id > after_id, or changed_column >= changed_after, in id order."""
+        sql, params = f"SELECT * FROM {table}", []
+        if after_id is not None:
+            sql += " WHERE id > ?"
+            params.append(after_id)
+            if changed_column and changed_after is not None:
+                sql += f" OR {changed_column} >= ?"
+                params.append(changed_after)
+        return (dict(row) for row in self.conn.execute(sql + " ORDER BY id", params))
+
+    def digests(self, table):
+        """(id, digest of the counted columns) for every row of a table."""
+        available = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        columns = [c for c in ('id', 'user_id', *TABLES[table][:3]) if c in available]
+        for row in self.conn.execute(f"SELECT {', '.join(columns)} FROM {table}"):
+            row = dict(row)
+            yield row['id'], digest(contribution(table, row))
+
+    def fetch_ids(self, table, ids, chunk=500):
+        """Rows with the given ids."""
+        ids = list(ids)
+        for start in range(0, len(ids), chunk):
+            batch = ids[start:start + chunk]
+            sql = f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(batch))}) ORDER BY id"
+            yield from (dict(row) for row in self.conn.execute(sql, batch))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain incremental financial rollups")
+    parser.add_argument('--state', default=str(DEFAULT_STATE), help='Rollup state file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync_cmd = sub.add_parser('sync', help='Apply new and changed rows from a database')
+    sync_cmd.add_argument('url', help='Database URL (sqlite:///path)')
+    sync_cmd.add_argument('--changed-column', help='Timestamp column marking updated rows (e.g. updated_at)')
+    sync_cmd.add_argument('--no-reconcile', action='store_true',
+                          help='Only read rows past the watermarks (misses edits and deletions without a change column)')
+    load_cmd = sub.add_parser('load', help='Apply an exported dataset')
+    load_cmd.add_argument('export', help='JSON {"sales_orders": [...], "expenses": [...]}')
+    summary_cmd = sub.add_parser('summary', help='Print a financial summary from the rollups')
+    summary_cmd.add_argument('--user', default=ALL_USERS, help='user_id (default: all users)')
+    period = summary_cmd.add_mutually_exclusive_group()
+    period.add_argument('--month', help='YYYY-MM')
+    period.add_argument('--day', help='YYYY-MM-DD')
+    args = parser.parse_args()
+
+    try:
+        rollups = FinancialRollups.load(args.state)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.command == 'summary':
+        print(json.dumps(rollups.summary(args.user, args.day or args.month or ALL_TIME), indent=2))
+        return
+
+    start = time.perf_counter()
+    try:
+        if args.command == 'sync':
+            source = SQLiteFinanceSource(args.url)
+            try:
+                changed = rollups.sync(source, args.changed_column, not args.no_reconcile)
+            finally:
+                source.close()
+        else:
+            with open(args.export) as f:
+                changed = rollups.apply_dataset(json.load(f))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    rollups.save(args.state)
+    elapsed = time.perf_counter() - start
+    print(f"Applied {changed} new or changed rows in {elapsed * 1000:.1f} ms")
+    print("Watermarks: " + ', '.join(f"{t} id {m['id']}" for t, m in rollups.watermarks.items()))
+
+
+if __name__ == '__main__':
+    main()
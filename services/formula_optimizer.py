@@ -0,0 +1,300 @@
+"""
+Target-driven formula optimizer over the oil library.
+
+Finds oil percentages whose blended qualities land inside target ranges, optionally
+preferring cheaper oils, subject to per-oil min/max limits. Blend qualities are the
+percentage-weighted averages calculateLye reports, i.e. linear in the percentages,
+so the problem is a convex quadratic program:
+
+    minimize   sum_q w_q * (distance of Q_q.x outside [lo_q, hi_q] / range width)^2
+               + cost_weight * (c.x / max c) + mu * |x - x0|^2
+    subject to sum x = 1, min_i <= x_i <= max_i
+
+It is solved with a log-barrier interior point method: Newton steps on the oil
+limits' barrier with sum(x) = 1 kept exactly. The Hessian is diagonal plus rank 7
+(one term per quality), so each step is a Woodbury solve of a 7 x 7 system rather
+than a k x k one. The current blend x0 is projected onto the limits and used as the
+starting point. Many problems over the same candidate oils are solved together as
+one batch of arrays.
+
+Usage:
+    python -m services.formula_optimizer problems.json [--matrix oil_matrix.bin] [--output results.json]
+
+problems.json is a list of
+    {"oils": [{"name", "percentage", "min", "max", "cost_per_unit"}],
+     "targets": {"hardness": [29, 54], ...}}
+where percentage is the current blend (warm start) and min/max are percentages.
+Targets default to the FormulaDesigner recommended ranges.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.oil_matrix import DEFAULT_OUTPUT, OilMatrix, normalize_name
+
+QUALITIES = ['hardness', 'cleansing', 'conditioning', 'bubbly', 'creamy', 'iodine', 'ins']
+
+# Recommended ranges shown in FormulaDesigner.jsx
+DEFAULT_TARGETS = {
+    'hardness': (29, 54),
+    'cleansing': (12, 22),
+    'conditioning': (44, 69),
+    'bubbly': (14, 33),
+    'creamy': (16, 35),
+    'iodine': (41, 70),
+    'ins': (136, 165),
+}
+
+
+def project_capped_simplex(y, lo, hi, tau=None, tol=1e-12, max_iter=100):
+    """
+    Euclidean projection of each row of y onto {x : sum x = 1, lo <= x <= hi}.
+
+    x = clip(y - tau, lo, hi) for the tau where the row sums to 1; sum(clip) is
+    piecewise linear and decreasing in tau, so Newton steps inside a bisection
+    bracket find it exactly in a few iterations, fewer still when warm-started.
+
+    Returns:
+        (x, tau)
+    """
+    t_low = (y - hi).min(axis=1) - 1.0
+    t_high = (y - lo).max(axis=1) + 1.0
+    if tau is None:
+        tau = (y.sum(axis=1) - 1.0) / y.shape[1]
+    tau = np.clip(tau, t_low, t_high)
+
+    for _ in range(max_iter):
+        shifted = y - tau[:, None]
+        x = np.clip(shifted, lo, hi)
+        excess = x.sum(axis=1) - 1.0
+        if np.all(np.abs(excess) <= tol):
+            break
+        t_low = np.where(excess > 0, tau, t_low)
+        t_high = np.where(excess < 0, tau, t_high)
+        free = ((shifted > lo) & (shifted < hi)).sum(axis=1)
+        newton = tau + excess / np.maximum(free, 1)
+        inside = (free > 0) & (newton > t_low) & (newton < t_high)
+        tau = np.where(inside, newton, (t_low + t_high) / 2)
+    return np.clip(y - tau[:, None], lo, hi), tau
+
+
+class FormulaOptimizer:
+    """Optimizes blends over a fixed set of candidate oils."""
+
+    def __init__(self, matrix, candidates=None):
+        """
+        Args:
+            matrix: OilMatrix of the library
+            candidates: oil names the optimizer may use (default: every oil)
+        """
+        self.matrix = matrix
+        lookup = matrix.lookup()
+        if candidates is None:
+            self.rows = np.arange(matrix.n_oils)
+        else:
+            missing = [n for n in candidates if normalize_name(n) not in lookup]
+            if missing:
+                raise ValueError(f"Oil not in library: {', '.join(missing)}")
+            self.rows = np.array([lookup[normalize_name(n)] for n in candidates], dtype=np.intp)
+        self.names = [matrix.names[int(i)] for i in self.rows]
+        self.qualities = matrix.widened(QUALITIES)[self.rows]
+
+    @classmethod
+    def open(cls, path=DEFAULT_OUTPUT, candidates=None):
+        return cls(OilMatrix.open(path), candidates)
+
+    def solve(self, targets=None, x0=None, lower=None, upper=None, cost=None,
+              weights=None, cost_weight=0.1, mu=1e-3, gap=1e-7, max_newton=200):
+        """
+        Solve a batch of problems over the candidate oils.
+
+        Args:
+            targets: (B, 7, 2) array or dict quality -> (lo, hi) shared by the batch
+            x0: (B, k) or (k,) current blend fractions (default: uniform)
+            lower, upper: (B, k) or (k,) fraction limits (default 0 and 1)
+            cost: (B, k) or (k,) cost per gram; None to ignore cost
+            weights: (7,) importance of each quality (default 1)
+            cost_weight: weight of the normalized cost against a miss of one range width
+            mu: pull toward x0, so ties keep the current blend
+            gap: duality gap at which the barrier path stops
+
+        Returns:
+            dict with 'fractions' (B, k), 'qualities' (B, 7), 'cost' (B,) and 'iterations'
+        """
+        k = len(self.rows)
+        bounds = self._targets(targets)
+        batch = max([bounds.shape[0] if bounds.ndim == 3 else 1]
+                    + [np.shape(a)[0] for a in (x0, lower, upper, cost) if a is not None and np.ndim(a) == 2])
+        bounds = np.broadcast_to(bounds, (batch, len(QUALITIES), 2))
+        lower = np.broadcast_to(np.zeros(k) if lower is None else np.asarray(lower, dtype=np.float64), (batch, k))
+        upper = np.broadcast_to(np.ones(k) if upper is None else np.asarray(upper, dtype=np.float64), (batch, k))
+        if np.any(lower.sum(axis=1) > 1 + 1e-9) or np.any(upper.sum(axis=1) < 1 - 1e-9) or np.any(lower > upper):
+            raise ValueError("Oil limits are infeasible: minimums exceed 100% or maximums cannot reach it")
+
+        if x0 is None:
+            x0 = np.full((batch, k), 1.0 / k)
+        x0, _ = project_capped_simplex(np.broadcast_to(np.asarray(x0, dtype=np.float64), (batch, k)), lower, upper)
+
+        lo_q, hi_q = bounds[..., 0], bounds[..., 1]
+        scale = np.where(hi_q - lo_q > 0, hi_q - lo_q, 1.0)
+        w = np.ones(len(QUALITIES)) if weights is None else np.asarray(weights, dtype=np.float64)
+        coef = w / scale ** 2                                     # (B, 7)
+
+        linear = np.zeros((batch, k))
+        if cost is not None:
+            cost = np.broadcast_to(np.asarray(cost, dtype=np.float64), (batch, k))
+            top = cost.max(axis=1, keepdims=True)
+            linear = cost_weight * np.where(top > 0, cost / np.where(top > 0, top, 1), 0.0)
+
+        q = self.qualities                                        # (k, 7)
+
+        # Oils pinned by their limits (or by limits that leave no slack) do not move
+        width = upper - lower
+        share = (1 - lower.sum(axis=1)) / np.where(width.sum(axis=1) > 0, width.sum(axis=1), 1)
+        pinned = (width <= 1e-12) | (share[:, None] <= 1e-12) | (share[:, None] >= 1 - 1e-12)
+        free = ~pinned
+        n_barrier = np.maximum(2 * free.sum(axis=1), 1)
+
+        # Strictly interior start: the warm blend nudged toward the centre of the box
+        centre = lower + width * share[:, None]
+        x = np.where(pinned, centre, 0.99 * x0 + 0.01 * centre)
+
+        def objective(x):
+            v = x @ q
+            miss = np.maximum(lo_q - v, 0) + np.maximum(v - hi_q, 0)
+            return (coef * miss ** 2).sum(axis=1) + (linear * x).sum(axis=1) + mu * ((x - x0) ** 2).sum(axis=1)
+
+        def barrier(x):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                logs = np.log(x - lower) + np.log(upper - x)
+            return -np.where(free, logs, 0).sum(axis=1)
+
+        t = np.full(batch, 1.0)
+        iterations = 0
+        while True:
+            # Centering: Newton steps on t * objective + barrier with sum(x) fixed
+            for _ in range(50):
+                iterations += 1
+                v = x @ q
+                signed = np.minimum(v - lo_q, 0) + np.maximum(v - hi_q, 0)
+                below, above = np.where(free, x - lower, 1), np.where(free, upper - x, 1)
+                grad = t[:, None] * ((2 * coef * signed) @ q.T + linear + 2 * mu * (x - x0))
+                grad += np.where(free, 1 / above - 1 / below, 0)
+                diag = 2 * mu * t[:, None] + np.where(free, 1 / below ** 2 + 1 / above ** 2, 0)
+                d_inv = np.where(free, 1 / diag, 0)
+
+                # Hessian = diag + U U^T with U = q * sqrt(2 t coef) on the out-of-range
+                # qualities; invert with Woodbury so each step is O(k * 7^2)
+                u = q[None] * np.sqrt(2 * t[:, None] * coef * (signed != 0))[:, None, :]
+                du = d_inv[:, :, None] * u
+                du_t = du.transpose(0, 2, 1)
+                core = np.eye(len(QUALITIES)) + du_t @ u
+                rhs = np.stack([grad, np.ones_like(grad)], axis=2)
+                solved = d_inv[:, :, None] * rhs - du @ np.linalg.solve(core, du_t @ rhs)
+                h_grad, h_ones = solved[..., 0], solved[..., 1]
+                nu = (h_grad * free).sum(axis=1) / np.maximum((h_ones * free).sum(axis=1), 1e-300)
+                dx = np.where(free, -(h_grad - nu[:, None] * h_ones), 0)
+
+                decrement = -(grad * dx).sum(axis=1)
+                centred = decrement / 2 <= 1e-8
+                if centred.all():
+                    break
+
+                # Longest step that stays strictly inside the limits, then backtrack
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    room = np.where(dx < 0, (x - lower) / -dx, np.where(dx > 0, (upper - x) / dx, np.inf))
+                step = np.where(centred, 0.0, np.minimum(1.0, 0.99 * np.where(free, room, np.inf).min(axis=1)))
+                current = t * objective(x) + barrier(x)
+                for _ in range(40):
+                    trial = x + step[:, None] * dx
+                    worse = ~(t * objective(trial) + barrier(trial) <= current - 0.25 * step * decrement) & ~centred
+                    if not worse.any():
+                        break
+                    step = np.where(worse, step / 2, step)
+                x = x + step[:, None] * dx
+
+            if np.all(n_barrier / t <= gap) or iterations >= max_newton:
+                break
+            t = t * 50
+
+        return {
+            'fractions': x,
+            'qualities': x @ q,
+            'cost': (x * cost).sum(axis=1) if cost is not None else np.zeros(batch),
+            'iterations': iterations,
+        }
+
+    def _targets(self, targets):
+        if targets is None or isinstance(targets, dict):
+            ranges = dict(DEFAULT_TARGETS)
+            ranges.update(targets or {})
+            return np.array([ranges[name] for name in QUALITIES], dtype=np.float64)
+        return np.asarray(targets, dtype=np.float64)
+
+
+def optimize(matrix, problem):
+    """
+    Optimize one problem dict (see the module docstring) against its own oils.
+
+    Returns:
+        dict with 'oils' [{name, percentage}], 'qualities', 'cost_per_gram', 'iterations'
+    """
+    oils = problem['oils']
+    optimizer = FormulaOptimizer(matrix, [o['name'] for o in oils])
+    has_cost = any(o.get('cost_per_unit') is not None for o in oils)
+    current = [float(o.get('percentage') or 0) for o in oils]
+    result = optimizer.solve(
+        targets=problem.get('targets'),
+        x0=np.array(current) / sum(current) if sum(current) > 0 else None,
+        lower=[float(o.get('min') or 0) / 100 for o in oils],
+        upper=[float(o['max']) / 100 if o.get('max') is not None else 1.0 for o in oils],
+        cost=[float(o.get('cost_per_unit') or 0) for o in oils] if has_cost else None,
+        cost_weight=float(problem.get('cost_weight', 0.1)),
+    )
+    return {
+        'oils': [{'name': o['name'], 'percentage': round(float(p) * 100, 2)} for o, p in zip(oils, result['fractions'][0])],
+        'qualities': dict(zip(QUALITIES, np.round(result['qualities'][0], 1).tolist())),
+        'cost_per_gram': round(float(result['cost'][0]), 4) if has_cost else None,
+        'iterations': result['iterations'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize oil percentages toward quality targets")
+    parser.add_argument('problems', help='JSON list of optimization problems')
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--output', '-o', help='Write results as JSON instead of printing them')
+    args = parser.parse_args()
+
+    with open(args.problems) as f:
+        problems = json.load(f)
+    try:
+        matrix = OilMatrix.open(args.matrix)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = []
+    for problem in problems:
+        try:
+            results.append(optimize(matrix, problem))
+        except ValueError as e:
+            results.append({'error': str(e)})
+    elapsed = time.perf_counter() - start
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Optimized {len(problems)} formulas in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+What-if sweeps of one formula over superfat, water and oil shares.
+
+The base blend's weighted sums (SAP, qualities, fatty acids) are computed once.
+Changing the shares of a few oils j, with the rest of the blend scaled by alpha to
+keep the total oil weight, changes the per-gram profile P by a scale plus one rank-1
+term per swept oil:
+
+    P' = alpha * P + sum_j (s_j' - alpha * s_j) * r_j
+
+where s_j is oil j's share and r_j its row of the library table. Every grid point is
+one row of that update, evaluated for the whole grid at once, and superfat, KOH
+purity and the water method are applied on top with LyeCalculator.from_sums, so
+points agree with calculateLye run on the adjusted blend.
+
+Usage:
+    python -m services.formula_sweep base.json [--superfat 0 10 11] [--water 25 38 14]
+                                     [--share "Olive Oil=-15:15:31" ...] [--output sweep.json]
+
+base.json is one calculateLye request. --superfat and --water take START STOP COUNT;
+--share sweeps an oil's share of the blend by START..STOP percentage points. The
+output is a list of records (one per grid point) with the swept parameters, the lye
+amounts and the quality keys QualityChart.jsx reads.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.lye_calculator import QUALITIES, LyeCalculator, js_round
+from services.oil_matrix import DEFAULT_OUTPUT, FATTY_ACIDS, normalize_name
+
+AMOUNTS = ['lye_naoh', 'lye_koh', 'water', 'fragrance', 'total_oils', 'total_batch_weight']
+
+
+class FormulaSweep:
+    """Evaluates parameter grids around one base calculateLye request."""
+
+    def __init__(self, calculator, base):
+        """
+        Args:
+            calculator: LyeCalculator over the oil library
+            base: calculateLye request ({"oils": [{"name", "weight"}], ...})
+        """
+        self.calculator = calculator
+        self.base = base
+        weights, self.missing = calculator.weights_for([base])
+        self.weights = weights[0]
+        self.total = self.weights.sum()
+        if self.total <= 0:
+            raise ValueError("Base blend has no oil weight")
+        # Per-gram profile of the base blend: sums / total
+        self.profile = self.weights @ calculator.table / self.total
+
+    def sweep(self, superfat=None, water_value=None, shares=None):
+        """
+        Evaluate the full grid of the given axes.
+
+        Args:
+            superfat: superfat percentages (default: the base request's)
+            water_value: water method values (default: the base request's)
+            shares: {oil_name: share changes in percentage points}
+
+        Returns:
+            dict with 'axes' (name -> per-point values), 'valid' (points whose shares
+            stay within 0..100%) and unrounded result arrays as in calculate_arrays
+        """
+        base = self.base
+        axes = {
+            'superfat_percentage': np.asarray(superfat if superfat is not None else [float(base.get('superfat_percentage') or 0)], dtype=np.float64),
+            'water_value': np.asarray(water_value if water_value is not None else [float(base.get('water_value') or 0)], dtype=np.float64),
+        }
+        lookup = self.calculator.matrix.lookup()
+        rows = []
+        for name, deltas in (shares or {}).items():
+            i = lookup.get(normalize_name(name))
+            if i is None:
+                raise ValueError(f"Oil not in library: {name}")
+            rows.append(i)
+            axes[f"share:{name}"] = np.asarray(deltas, dtype=np.float64)
+
+        grid = np.meshgrid(*axes.values(), indexing='ij')
+        points = {name: g.ravel() for name, g in zip(axes, grid)}
+        n = grid[0].size
+
+        profile = np.broadcast_to(self.profile, (n, len(self.profile)))
+        valid = np.ones(n, dtype=bool)
+        if rows:
+            shares_now = self.weights[rows] / self.total                       # (m,)
+            changes = np.stack([points[f"share:{name}"] for name in shares], axis=1) / 100
+            shares_new = shares_now + changes                                  # (n, m)
+            rest_now = 1 - shares_now.sum()
+            rest_new = 1 - shares_new.sum(axis=1)
+            if rest_now > 1e-12:
+                alpha = rest_new / rest_now
+            else:
+                # Nothing else in the blend to scale: only points that still sum to 100% exist
+                alpha = np.where(np.abs(rest_new) <= 1e-12, 0.0, np.nan)
+            valid = (shares_new >= -1e-12).all(axis=1) & (alpha >= -1e-12)
+            profile = alpha[:, None] * self.profile + (shares_new - alpha[:, None] * shares_now) @ self.calculator.table[rows]
+
+        count = np.count_nonzero(valid)
+        arrays = self.calculator.from_sums(
+            profile[valid] * self.total,
+            np.full(count, self.total),
+            lye_type=np.full(count, base.get('lye_type', 'NaOH')),
+            superfat=points['superfat_percentage'][valid],
+            koh_purity_90=np.full(count, bool(base.get('koh_purity_90'))),
+            water_method=np.full(count, base.get('water_method') or ''),
+            water_value=points['water_value'][valid],
+            fragrance_ratio=np.full(count, float(base.get('fragrance_ratio') or 0)),
+        )
+        return {'axes': {name: values[valid] for name, values in points.items()}, 'valid': valid, **arrays}
+
+    @staticmethod
+    def records(result):
+        """Grid results as a list of flat dicts, rounded like calculateLye, for charting."""
+        columns = {name: values.tolist() for name, values in result['axes'].items()}
+        columns.update({key: js_round(result[key], 2).tolist() for key in AMOUNTS})
+        columns.update(zip(QUALITIES, js_round(result['qualities']).T.tolist()))
+        columns.update(zip(FATTY_ACIDS, js_round(result['fatty_acids']).T.tolist()))
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def linspace_arg(values):
+    start, stop, count = values
+    if count < 1 or count != int(count):
+        raise ValueError("COUNT must be a positive integer")
+    return np.linspace(start, stop, int(count))
+
+
+def parse_share(item):
+    """"Olive Oil=-15:15:31" -> ("Olive Oil", linspace(-15, 15, 31))"""
+    name, sep, spec = item.rpartition('=')
+    parts = spec.split(':')
+    if not sep or len(parts) != 3:
+        raise ValueError(f"Expected NAME=START:STOP:COUNT, got '{item}'")
+    return name.strip(), linspace_arg([float(p) for p in parts])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep a formula over superfat, water and oil shares")
+    parser.add_argument('base', help='JSON calculateLye request for the base formula')
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--superfat', nargs=3, type=float, metavar=('START', 'STOP', 'COUNT'), help='Superfat percentages')
+    parser.add_argument('--water', nargs=3, type=float, metavar=('START', 'STOP', 'COUNT'), help='Water method values')
+    parser.add_argument('--share', action='append', default=[], metavar='NAME=START:STOP:COUNT',
+                        help="Change an oil's share by START..STOP percentage points (repeatable)")
+    parser.add_argument('--output', '-o', help='Write records as JSON instead of printing them')
+    args = parser.parse_args()
+
+    try:
+        with open(args.base) as f:
+            base = json.load(f)
+        calculator = LyeCalculator.open(args.matrix)
+        superfat = linspace_arg(args.superfat) if args.superfat else None
+        water = linspace_arg(args.water) if args.water else None
+        shares = dict(parse_share(item) for item in args.share)
+        start = time.perf_counter()
+        engine = FormulaSweep(calculator, base)
+        result = engine.sweep(superfat, water, shares)
+        elapsed = time.perf_counter() - start
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for _, name in engine.missing:
+        print(f"Warning: '{name}' is not in the oil library")
+
+    records = FormulaSweep.records(result)
+    skipped = result['valid'].size - len(records)
+    output = json.dumps(records, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Evaluated {len(records)} points in {elapsed * 1000:.1f} ms, written to {args.output}"
+              + (f" ({skipped} points outside 0-100% shares skipped)" if skipped else ''))
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+"""
+Lot costing for production batches.
+
+batch_ingredient_usage.cost and production_batches.total_cost are otherwise
+quantity x ingredients.cost_per_unit. This engine prices each usage row from the
+supply lots it actually draws on (supply_order_items: cost, quantity_base_unit,
+expiry_date) and consumes those lots:
+
+    fifo      oldest order first
+    fefo      earliest expiry first (lots without one last), then oldest order
+    average   moving weighted average cost over the lots received so far
+
+Each ingredient keeps a heap of open lots keyed by the method's order, so a usage
+row costs O(lots it touches x log lots). Only lots of Received orders are stock; one
+becomes available from its order_date (orders carry no receipt date), so batches are
+costed in production order against the lots that had arrived by then. A supply item's cost is the line total (as SupplyOrders.jsx enters
+it); quantities are compared in grams using convert_weight's factors, with
+quantity_base_unit taken as grams when set. Usage beyond the open lots is priced at
+the ingredient's last unit cost and reported as unallocated.
+
+--write stores costs only (batch_ingredient_usage.cost, production_batches.total_cost).
+The lots a usage row was priced against are an estimate, so they stay in the --output
+allocations and never touch the supply_order_item_id traceability link.
+
+recompute replays the whole history in one pass; sync keeps the open lots in a state
+file, adds the lots of orders received since (matched by item id, as supply_orders has
+no change column) and costs only batches not costed yet. Batches
+are picked up when they reach a consuming status, whatever their id: candidates are
+those updated since the last sync (every update bumps updated_at), less the ids
+already costed. A batch dated before ones already costed is priced against the
+current lots until the next recompute.
+
+Usage:
+    python -m services.lot_costing recompute sqlite:///soap.db [--method fifo|fefo|average] [--write] [--output costs.json]
+    python -m services.lot_costing sync sqlite:///soap.db [--state lot_costing.json] [--method fifo] [--write]
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STATE = BASE_DIR / 'lot_costing.json'
+SQLITE_PREFIX = 'sqlite:///'
+STATE_VERSION = 3
+METHODS = ['fifo', 'fefo', 'average']
+# Batches whose ingredients have been drawn from stock. The app writes 'Complete';
+# the complete_batch / finalize_batch RPCs write 'Completed'.
+CONSUMING_STATUSES = ('In Progress', 'Curing', 'Complete', 'Completed')
+# Orders whose lots are in stock (receive_supply_order sets it)
+RECEIVED_STATUS = 'Received'
+# convert_weight() in supabase-schema.sql
+UNIT_GRAMS = {'g': 1, 'kg': 1000, 'oz': 28.3495, 'lb': 453.592, 'ml': 1, 'l': 1000, 'floz': 29.5735}
+NO_EXPIRY = '9999-12-31'
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def grams(quantity, unit):
+    return to_decimal(quantity) * Decimal(str(UNIT_GRAMS.get((unit or 'g').lower(), 1)))
+
+
+def lot_from_row(row):
+    """Lot dict from a supply_order_items row joined with its order's order_date."""
+    if row.get('quantity_base_unit') is not None:
+        quantity = to_decimal(row['quantity_base_unit'])
+    else:
+        quantity = grams(row.get('quantity'), row.get('unit'))
+    cost = to_decimal(row.get('cost'))
+    return {
+        'id': row['id'],
+        'ingredient_id': row['ingredient_id'],
+        'date': str(row.get('order_date') or ''),
+        'expiry': str(row.get('expiry_date') or '') or NO_EXPIRY,
+        'quantity': quantity,
+        'unit_cost': cost / quantity if quantity > 0 else Decimal(0),
+    }
+
+
+def batch_date(batch):
+    return str(batch.get('production_date') or batch.get('planned_date') or batch.get('created_at') or '')
+
+
+class LotCosting:
+    """Open supply lots per ingredient and the batches costed against them."""
+
+    def __init__(self, method='fifo'):
+        if method not in METHODS:
+            raise ValueError(f"Unknown costing method: {method} (expected one of {', '.join(METHODS)})")
+        self.method = method
+        # ingredient_id -> lots not yet arrived, sorted by date descending (pop() is the next)
+        self.pending = {}
+        # ingredient_id -> heap of (key..., lot_id); remaining quantities in self.remaining
+        self.heaps = {}
+        self.remaining = {}
+        self.lots = {}
+        # ingredient_id -> [grams, value] for the average method
+        self.average = {}
+        # ingredient_id -> last unit cost seen, for usage beyond the open lots
+        self.last_cost = {}
+        # Batches already costed; 'batch' is the latest updated_at among them
+        self.costed = set()
+        self.watermarks = {'batch': None}
+
+    def add_lots(self, lots):
+        """Register supply lots (dicts from lot_from_row); they open on their order date."""
+        touched = set()
+        for lot in lots:
+            if lot['id'] in self.lots or lot['quantity'] <= 0:
+                continue
+            self.lots[lot['id']] = lot
+            self.pending.setdefault(lot['ingredient_id'], []).append(lot)
+            touched.add(lot['ingredient_id'])
+        for ingredient_id in touched:
+            self.pending[ingredient_id].sort(key=lambda lot: (lot['date'], lot['id']), reverse=True)
+
+    def _open(self, ingredient_id, date):
+        pending = self.pending.get(ingredient_id)
+        while pending and pending[-1]['date'] <= date:
+            lot = pending.pop()
+            self.last_cost[ingredient_id] = lot['unit_cost']
+            if self.method == 'average':
+                totals = self.average.setdefault(ingredient_id, [Decimal(0), Decimal(0)])
+                totals[0] += lot['quantity']
+                totals[1] += lot['quantity'] * lot['unit_cost']
+                continue
+            key = (lot['expiry'], lot['date'], lot['id']) if self.method == 'fefo' else (lot['date'], lot['id'])
+            heapq.heappush(self.heaps.setdefault(ingredient_id, []), key)
+            self.remaining[lot['id']] = lot['quantity']
+
+    def consume(self, ingredient_id, quantity, date):
+        """
+        Draw `quantity` grams of an ingredient on `date`.
+
+        Returns:
+            (cost, allocations, unallocated) - allocations is [(lot_id, grams, cost)];
+            unallocated is the quantity no open lot covered, priced at the last unit cost
+        """
+        self._open(ingredient_id, date)
+        cost = Decimal(0)
+        allocations = []
+        left = quantity
+        if self.method == 'average':
+            totals = self.average.get(ingredient_id)
+            if totals and totals[0] > 0:
+                take = min(left, totals[0])
+                unit = totals[1] / totals[0]
+                totals[0] -= take
+                totals[1] -= take * unit
+                cost += take * unit
+                left -= take
+        else:
+            heap = self.heaps.get(ingredient_id, [])
+            while left > 0 and heap:
+                lot_id = heap[0][-1]
+                take = min(left, self.remaining[lot_id])
+                part = take * self.lots[lot_id]['unit_cost']
+                allocations.append((lot_id, take, part))
+                cost += part
+                left -= take
+                self.remaining[lot_id] -= take
+                if self.remaining[lot_id] <= 0:
+                    heapq.heappop(heap)
+                    del self.remaining[lot_id]
+        if left > 0:
+            cost += left * self.last_cost.get(ingredient_id, Decimal(0))
+        return cost, allocations, left
+
+    def cost_batches(self, batches, usages):
+        """
+        Cost batches in production order.
+
+        Args:
+            batches: production_batches rows (only consuming statuses are costed)
+            usages: batch_ingredient_usage rows for those batches
+
+        Returns:
+            list of {batch_id, lot_number, total_cost, usages: [{id, ingredient_id,
+            cost, allocations, unallocated}]}
+        """
+        by_batch = {}
+        for usage in usages:
+            by_batch.setdefault(usage['batch_id'], []).append(usage)
+        results = []
+        for batch in sorted(batches, key=lambda b: (batch_date(b), b['id'])):
+            if batch.get('status') not in CONSUMING_STATUSES or batch['id'] in self.costed:
+                continue
+            date = batch_date(batch)
+            costed = []
+            total = Decimal(0)
+            for usage in sorted(by_batch.get(batch['id'], []), key=lambda u: u['id']):
+                cost, allocations, left = self.consume(
+                    usage['ingredient_id'], grams(usage.get('quantity_used'), usage.get('unit')), date)
+                total += cost
+                costed.append({
+                    'id': usage['id'],
+                    'ingredient_id': usage['ingredient_id'],
+                    'cost': float(cost.quantize(CENT)),
+                    'allocations': [[lot_id, float(q), float(c.quantize(CENT))] for lot_id, q, c in allocations],
+                    'unallocated': float(left),
+                })
+            results.append({
+                'batch_id': batch['id'],
+                'lot_number': batch.get('lot_number'),
+                'total_cost': float(total.quantize(CENT)),
+                'usages': costed,
+            })
+            self.costed.add(batch['id'])
+            updated = batch.get('updated_at')
+            if updated is not None and (self.watermarks['batch'] is None or str(updated) > self.watermarks['batch']):
+                self.watermarks['batch'] = str(updated)
+        return results
+
+    def save(self, path=DEFAULT_STATE):
+        """Write the open lots and watermarks atomically."""
+        path = Path(path)
+        lots = [{**lot, 'quantity': str(lot['quantity']), 'unit_cost': str(lot['unit_cost'])}
+                for lot in self.lots.values()]
+        state = {
+            'version': STATE_VERSION,
+            'method': self.method,
+            'watermarks': self.watermarks,
+            'costed': sorted(self.costed),
+            'lots': lots,
+            'pending': {str(k): [lot['id'] for lot in v] for k, v in self.pending.items()},
+            'heaps': {str(k): v for k, v in self.heaps.items()},
+            'remaining': [[lot_id, str(q)] for lot_id, q in self.remaining.items()],
+            'average': {str(k): [str(q), str(v)] for k, (q, v) in self.average.items()},
+            'last_cost': {str(k): str(v) for k, v in self.last_cost.items()},
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE, method='fifo'):
+        """Costing state from a file; a missing file starts empty with `method`."""
+        if not Path(path).exists():
+            return cls(method)
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"{path}: unsupported lot costing state version")
+        if state['method'] != method:
+            raise ValueError(f"{path} was built with --method {state['method']}; recompute to switch methods")
+        costing = cls(state['method'])
+        costing.watermarks = state['watermarks']
+        costing.costed = set(state['costed'])
+        costing.lots = {lot['id']: {**lot, 'quantity': Decimal(lot['quantity']), 'unit_cost': Decimal(lot['unit_cost'])}
+                        for lot in state['lots']}
+        # JSON object keys are strings; ingredient ids come back from the lots themselves
+        ingredient_ids = {str(lot['ingredient_id']): lot['ingredient_id'] for lot in costing.lots.values()}
+        costing.pending = {ingredient_ids[k]: [costing.lots[i] for i in v] for k, v in state['pending'].items()}
+        costing.heaps = {ingredient_ids[k]: [tuple(key) for key in v] for k, v in state['heaps'].items()}
+        costing.remaining = {lot_id: Decimal(q) for lot_id, q in state['remaining']}
+        costing.average = {ingredient_ids[k]: [Decimal(q), Decimal(v)] for k, (q, v) in state['average'].items()}
+        costing.last_cost = {ingredient_ids[k]: Decimal(v) for k, v in state['last_cost'].items()}
+        return costing
+
+
+class SQLiteCostingSource:
+    """Reads lots, batches and usage rows from a SQLite database and writes costs back."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):])
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        self.conn.close()
+
+    def fetch_lots(self, known=()):
+        """Lots of received orders, less the item ids in `known`."""
+        rows = self.conn.execute(
+            "SELECT i.*, o.order_date FROM supply_order_items i JOIN supply_orders o ON o.id = i.order_id "
+            "WHERE o.status = ?", (RECEIVED_STATUS,))
+        return [lot_from_row(dict(row)) for row in rows if row['id'] not in known]
+
+    def fetch_batches(self, updated_since=None, costed=()):
+        """
+        Consuming batches not costed yet, with their usage rows.
+
+        Args:
+            updated_since: Only batches with updated_at at or after this (skipped when
+                the table has no updated_at column)
+            costed: Batch ids to leave out
+        """
+        where = f"b.status IN ({', '.join('?' * len(CONSUMING_STATUSES))})"
+        params = list(CONSUMING_STATUSES)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(production_batches)")}
+        if updated_since is not None and 'updated_at' in columns:
+            # >= so batches sharing the watermark's timestamp are not missed; costed filters repeats
+            where += " AND b.updated_at >= ?"
+            params.append(updated_since)
+        batches = [dict(row) for row in self.conn.execute(f"SELECT b.* FROM production_batches b WHERE {where}", params)
+                   if row['id'] not in costed]
+        usages = [dict(row) for row in self.conn.execute(
+            f"SELECT u.* FROM batch_ingredient_usage u JOIN production_batches b ON b.id = u.batch_id WHERE {where}",
+            params) if row['batch_id'] not in costed]
+        return batches, usages
+
+    def write(self, results):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE batch_ingredient_usage SET cost = ? WHERE id = ?",
+                [(u['cost'], u['id']) for r in results for u in r['usages']])
+            self.conn.executemany(
+                "UPDATE production_batches SET total_cost = ? WHERE id = ?",
+                [(r['total_cost'], r['batch_id']) for r in results])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost production batches from the supply lots they consume")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('recompute', 'Replay the full lot and batch history'),
+                            ('sync', 'Cost new lots and batches not costed yet')):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument('url', help='Database URL (sqlite:///path)')
+        cmd.add_argument('--method', choices=METHODS, default='fifo', help='Lot consumption order')
+        cmd.add_argument('--write', action='store_true', help='Write usage and batch costs back to the database')
+        cmd.add_argument('--output', '-o', help='Write batch costs as JSON')
+        if name == 'sync':
+            cmd.add_argument('--state', default=str(DEFAULT_STATE), help='Costing state file')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'sync':
+            costing = LotCosting.load(args.state, args.method)
+        else:
+            costing = LotCosting(args.method)
+        source = SQLiteCostingSource(args.url)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        costing.add_lots(source.fetch_lots(costing.lots))
+        batches, usages = source.fetch_batches(costing.watermarks['batch'], costing.costed)
+        results = costing.cost_batches(batches, usages)
+        if args.write:
+            source.write(results)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        source.close()
+    elapsed = time.perf_counter() - start
+    if args.command == 'sync':
+        costing.save(args.state)
+
+    short = sum(1 for r in results for u in r['usages'] if u['unallocated'] > 0)
+    print(f"Costed {len(results)} batches ({args.method}) in {elapsed * 1000:.1f} ms"
+          + (f", {short} usage rows exceeded the open lots" if short else ''))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + '\n')
+        print(f"Batch costs written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
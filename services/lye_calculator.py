@@ -0,0 +1,203 @@
+"""
+Batch lye, water and fragrance calculator.
+
+Python counterpart of calculateLye in web/frontend/src/api/client.js for whole
+production plans. Oils are resolved once against the indexed oil matrix, every
+request becomes a row of a requests x oils weight matrix, and all weighted sums
+(SAP NaOH/KOH, qualities, fatty acids) come out of one matrix product. Superfat,
+90% KOH purity and the percentage/ratio/concentration water methods are then
+applied column-wise.
+
+Usage:
+    python -m services.lye_calculator plan.json [--matrix oil_matrix.bin] [--output results.json]
+
+plan.json is a list of calculateLye requests:
+    {"oils": [{"name", "weight"}], "lye_type": "NaOH"|"KOH", "superfat_percentage",
+     "koh_purity_90", "water_method": "percentage"|"ratio"|"concentration",
+     "water_value", "fragrance_ratio"}
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.oil_matrix import DEFAULT_OUTPUT, FATTY_ACIDS, OilMatrix, normalize_name
+
+QUALITIES = ['hardness', 'cleansing', 'conditioning', 'bubbly', 'creamy', 'iodine', 'ins']
+WATER_METHODS = ('percentage', 'ratio', 'concentration')
+KOH_PURITY = 0.90
+
+
+def js_round(values, digits=0):
+    """Math.round(x * 10**digits) / 10**digits, element-wise."""
+    scale = 10.0 ** digits
+    return np.floor(np.asarray(values) * scale + 0.5) / scale + 0.0
+
+
+def water_amounts(total_oils, lye, method, value):
+    """
+    Water for each request.
+
+    Args:
+        total_oils, lye, value: per-request arrays
+        method: per-request array of WATER_METHODS names; anything else yields 0 like the JS
+    """
+    method = np.asarray(method)
+    value = np.asarray(value, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.select(
+            [method == 'percentage', method == 'ratio', method == 'concentration'],
+            [total_oils * (value / 100), lye * value, lye / (value / 100) - lye],
+            0.0,
+        )
+
+
+class LyeCalculator:
+    """Resolves oils against one oil matrix and calculates many requests per call."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        # sap_naoh, sap_koh, qualities, fatty acids - the sums calculateLye accumulates
+        self.sum_columns = ['sap_naoh', 'sap_koh'] + QUALITIES + FATTY_ACIDS
+        self.table = matrix.widened(self.sum_columns)
+
+    @classmethod
+    def open(cls, path=DEFAULT_OUTPUT):
+        return cls(OilMatrix.open(path))
+
+    def weights_for(self, requests):
+        """
+        Requests x oils weight matrix; unknown oils are skipped like calculateLye does.
+
+        Returns:
+            (weights, missing) - missing lists (request_position, oil_name) pairs
+        """
+        weights = np.zeros((len(requests), self.matrix.n_oils))
+        missing = []
+        lookup = self.matrix.lookup()
+        for r, request in enumerate(requests):
+            for oil in request.get('oils', []):
+                i = lookup.get(normalize_name(oil['name']))
+                if i is None:
+                    missing.append((r, oil['name']))
+                    continue
+                try:
+                    weights[r, i] += float(oil.get('weight') or 0)
+                except (TypeError, ValueError):
+                    pass
+        return weights, missing
+
+    def calculate_arrays(self, weights, lye_type, superfat, koh_purity_90, water_method, water_value, fragrance_ratio):
+        """
+        Vectorized calculateLye over per-request parameter arrays (unrounded).
+
+        Returns:
+            dict of arrays: total_oils, lye_naoh, lye_koh, water, fragrance,
+            total_batch_weight, qualities (requests x 7), fatty_acids (requests x 8)
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        return self.from_sums(weights @ self.table, weights.sum(axis=1), lye_type, superfat, koh_purity_90,
+                              water_method, water_value, fragrance_ratio)
+
+    def from_sums(self, sums, total, lye_type, superfat, koh_purity_90, water_method, water_value, fragrance_ratio):
+        """
+        calculate_arrays from precomputed weighted sums.
+
+        Args:
+            sums: requests x len(sum_columns) oil-weighted sums of the table columns
+            total: per-request total oil weight
+        """
+        naoh = sums[:, 0] * (1 - np.asarray(superfat, dtype=np.float64) / 100)
+        koh = sums[:, 1] * (1 - np.asarray(superfat, dtype=np.float64) / 100)
+        koh = np.where(np.asarray(koh_purity_90, dtype=bool), koh / KOH_PURITY, koh)
+
+        profile = sums[:, 2:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profile = np.where(total[:, None] > 0, profile / total[:, None], profile)
+
+        lye = np.where(np.asarray(lye_type) == 'NaOH', naoh, koh)
+        water = water_amounts(total, lye, water_method, water_value)
+        fragrance = total * np.asarray(fragrance_ratio, dtype=np.float64)
+
+        return {
+            'total_oils': total,
+            'lye_naoh': naoh,
+            'lye_koh': koh,
+            'water': water,
+            'fragrance': fragrance,
+            'total_batch_weight': total + lye + water + fragrance,
+            'qualities': profile[:, :len(QUALITIES)],
+            'fatty_acids': profile[:, len(QUALITIES):],
+        }
+
+    def calculate_batch(self, requests):
+        """
+        calculateLye for a list of requests.
+
+        Returns:
+            (results, missing) - one result dict per request, shaped and rounded like
+            the JS response, and the (request_position, oil_name) pairs not found
+        """
+        weights, missing = self.weights_for(requests)
+        arrays = self.calculate_arrays(
+            weights,
+            lye_type=[r.get('lye_type', 'NaOH') for r in requests],
+            superfat=[float(r.get('superfat_percentage') or 0) for r in requests],
+            koh_purity_90=[bool(r.get('koh_purity_90')) for r in requests],
+            water_method=[r.get('water_method') or '' for r in requests],
+            water_value=[float(r.get('water_value') or 0) for r in requests],
+            fragrance_ratio=[float(r.get('fragrance_ratio') or 0) for r in requests],
+        )
+
+        amounts = {key: js_round(arrays[key], 2).tolist()
+                   for key in ('lye_naoh', 'lye_koh', 'water', 'fragrance', 'total_oils', 'total_batch_weight')}
+        qualities = js_round(arrays['qualities']).tolist()
+        fatty_acids = js_round(arrays['fatty_acids']).tolist()
+
+        results = []
+        for r, request in enumerate(requests):
+            result = {key: amounts[key][r] for key in amounts}
+            result['qualities'] = dict(zip(QUALITIES, qualities[r]))
+            result['fattyAcids'] = dict(zip(FATTY_ACIDS, fatty_acids[r]))
+            result['lye_type'] = request.get('lye_type', 'NaOH')
+            result['superfat_percentage'] = request.get('superfat_percentage')
+            results.append(result)
+        return results, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculate lye and water for a production plan")
+    parser.add_argument('plan', help='JSON list of calculateLye requests')
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--output', '-o', help='Write results as JSON instead of printing them')
+    args = parser.parse_args()
+
+    with open(args.plan) as f:
+        requests = json.load(f)
+    try:
+        calculator = LyeCalculator.open(args.matrix)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results, missing = calculator.calculate_batch(requests)
+    elapsed = time.perf_counter() - start
+
+    for r, name in missing:
+        print(f"Warning: '{name}' in request {r} is not in the oil library")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Calculated {len(requests)} batches in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
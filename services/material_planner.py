@@ -0,0 +1,221 @@
+"""
+Material requirements planning for the shopping list.
+
+ShoppingList.jsx walks every Planned batch's recipe ingredient by ingredient and
+compares the sum against quantity_on_hand alone. Here recipe_ingredients is held once
+as a sparse recipe x ingredient matrix (COO arrays, quantities converted to the
+ingredient's unit), and a plan is three vectorized steps:
+
+    gross     = scale factors summed per recipe, pushed through the matrix
+    available = quantity_on_hand + open supply order quantities (Ordered / Shipped)
+    shortfall = max(0, gross + reorder_threshold - available)
+
+so the stock left after the planned batches stays at or above reorder_threshold, and
+ingredients already below it are reordered even when no batch needs them. Shortfalls
+are priced at cost_per_unit and grouped by supplier - the ingredient's supplier, or
+failing that the supplier it was last ordered from.
+
+Usage:
+    python -m services.material_planner sqlite:///soap.db [--output shopping.json]
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.lot_costing import UNIT_GRAMS
+
+SQLITE_PREFIX = 'sqlite:///'
+PLANNED_STATUS = 'Planned'
+OPEN_ORDER_STATUSES = ('Ordered', 'Shipped')
+UNASSIGNED = 'Unassigned'
+
+
+def unit_factor(from_unit, to_unit):
+    """Multiplier from one unit to another, by convert_weight's gram factors."""
+    from_unit, to_unit = (from_unit or 'g').lower(), (to_unit or 'g').lower()
+    if from_unit == to_unit:
+        return 1.0
+    return UNIT_GRAMS.get(from_unit, 1) / UNIT_GRAMS.get(to_unit, 1)
+
+
+class MaterialPlanner:
+    """Recipe -> ingredient requirements over a fixed ingredient and recipe set."""
+
+    def __init__(self, ingredients, recipe_ingredients):
+        """
+        Args:
+            ingredients: ingredients rows (id, name, unit, quantity_on_hand,
+                cost_per_unit, reorder_threshold, supplier)
+            recipe_ingredients: recipe_ingredients rows (recipe_id, ingredient_id,
+                quantity, unit)
+        """
+        self.ingredients = list(ingredients)
+        self.index = {row['id']: i for i, row in enumerate(self.ingredients)}
+        units = [row.get('unit') for row in self.ingredients]
+
+        lines = [r for r in recipe_ingredients if r.get('ingredient_id') in self.index]
+        self.recipe_index = {}
+        for r in lines:
+            self.recipe_index.setdefault(r['recipe_id'], len(self.recipe_index))
+        # Sparse recipe x ingredient matrix in COO form
+        self.rows = np.array([self.recipe_index[r['recipe_id']] for r in lines], dtype=np.int64)
+        self.cols = np.array([self.index[r['ingredient_id']] for r in lines], dtype=np.int64)
+        self.values = np.array([
+            float(r.get('quantity') or 0) * unit_factor(r.get('unit'), units[self.index[r['ingredient_id']]])
+            for r in lines
+        ], dtype=np.float64)
+
+        self.on_hand = np.array([float(row.get('quantity_on_hand') or 0) for row in self.ingredients])
+        self.threshold = np.array([float(row.get('reorder_threshold') or 0) for row in self.ingredients])
+        self.cost = np.array([float(row.get('cost_per_unit') or 0) for row in self.ingredients])
+
+    def explode(self, batches):
+        """Gross requirement per ingredient for the given batches (recipe_id, scale_factor)."""
+        known = [b for b in batches if b.get('recipe_id') in self.recipe_index]
+        recipes = np.array([self.recipe_index[b['recipe_id']] for b in known], dtype=np.int64)
+        scale = np.array([float(b['scale_factor']) if b.get('scale_factor') is not None else 1.0 for b in known])
+        runs = np.bincount(recipes, weights=scale, minlength=len(self.recipe_index))
+        return np.bincount(self.cols, weights=runs[self.rows] * self.values, minlength=len(self.ingredients))
+
+    def on_order(self, open_items):
+        """Open supply order quantities per ingredient, in the ingredient's unit."""
+        on_order = np.zeros(len(self.ingredients))
+        for item in open_items:
+            i = self.index.get(item.get('ingredient_id'))
+            if i is not None:
+                on_order[i] += float(item.get('quantity') or 0) * unit_factor(item.get('unit'), self.ingredients[i].get('unit'))
+        return on_order
+
+    def plan(self, batches, open_items=(), last_suppliers=None):
+        """
+        Net the planned batches against stock and open orders.
+
+        Args:
+            batches: Planned production_batches rows
+            open_items: supply_order_items rows on open supply orders
+            last_suppliers: {ingredient_id: supplier name} for ingredients without one
+
+        Returns:
+            list of {supplier, items, estimated_cost}, suppliers by name, where items
+            are {id, name, unit, needed, on_hand, on_order, reorder_threshold,
+            shortfall, cost_per_unit, estimated_cost}
+        """
+        gross = self.explode(batches)
+        on_order = self.on_order(open_items)
+        shortfall = np.maximum(0.0, gross + self.threshold - self.on_hand - on_order)
+        short = np.flatnonzero(shortfall > 1e-9)
+        estimated = shortfall * self.cost
+        columns = [a.tolist() for a in (gross, self.on_hand, on_order, self.threshold, shortfall, self.cost, estimated)]
+
+        groups = {}
+        last_suppliers = last_suppliers or {}
+        for i in short.tolist():
+            needed, on_hand, ordered, threshold, missing, cost, estimate = (column[i] for column in columns)
+            row = self.ingredients[i]
+            supplier = row.get('supplier') or last_suppliers.get(row['id']) or UNASSIGNED
+            groups.setdefault(supplier, []).append({
+                'id': row['id'],
+                'name': row.get('name'),
+                'unit': row.get('unit'),
+                'needed': round(needed, 4),
+                'on_hand': on_hand,
+                'on_order': round(ordered, 4),
+                'reorder_threshold': threshold,
+                'shortfall': round(missing, 4),
+                'cost_per_unit': cost,
+                'estimated_cost': round(estimate, 2),
+            })
+        return [
+            {
+                'supplier': supplier,
+                'items': sorted(items, key=lambda item: str(item['name'])),
+                'estimated_cost': round(sum(item['estimated_cost'] for item in items), 2),
+            }
+            for supplier, items in sorted(groups.items(), key=lambda group: (group[0] == UNASSIGNED, group[0]))
+        ]
+
+
+class SQLitePlanningSource:
+    """Reads the planning tables from a SQLite database."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):])
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        self.conn.close()
+
+    def _rows(self, sql, params=()):
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def ingredients(self):
+        return self._rows("SELECT * FROM ingredients")
+
+    def recipe_ingredients(self):
+        return self._rows("SELECT recipe_id, ingredient_id, quantity, unit FROM recipe_ingredients")
+
+    def planned_batches(self):
+        return self._rows("SELECT id, lot_number, recipe_id, scale_factor FROM production_batches WHERE status = ?",
+                          (PLANNED_STATUS,))
+
+    def open_items(self):
+        return self._rows(
+            "SELECT i.ingredient_id, i.quantity, i.unit FROM supply_order_items i "
+            f"JOIN supply_orders o ON o.id = i.order_id WHERE o.status IN ({', '.join('?' * len(OPEN_ORDER_STATUSES))})",
+            OPEN_ORDER_STATUSES)
+
+    def last_suppliers(self):
+        """Supplier each ingredient was most recently ordered from."""
+        rows = self.conn.execute(
+            "SELECT i.ingredient_id, s.name FROM supply_order_items i "
+            "JOIN supply_orders o ON o.id = i.order_id JOIN suppliers s ON s.id = o.supplier_id "
+            "ORDER BY o.order_date, o.id")
+        return {ingredient_id: name for ingredient_id, name in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan ingredient purchases for the Planned batches")
+    parser.add_argument('url', help='Database URL (sqlite:///path)')
+    parser.add_argument('--output', '-o', help='Write the shopping list as JSON instead of printing it')
+    args = parser.parse_args()
+
+    try:
+        source = SQLitePlanningSource(args.url)
+        try:
+            ingredients = source.ingredients()
+            recipe_ingredients = source.recipe_ingredients()
+            batches = source.planned_batches()
+            open_items = source.open_items()
+            last_suppliers = source.last_suppliers()
+        finally:
+            source.close()
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    planner = MaterialPlanner(ingredients, recipe_ingredients)
+    groups = planner.plan(batches, open_items, last_suppliers)
+    elapsed = time.perf_counter() - start
+
+    output = json.dumps(groups, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        items = sum(len(group['items']) for group in groups)
+        total = sum(group['estimated_cost'] for group in groups)
+        print(f"Planned {len(batches)} batches: {items} ingredients to order from {len(groups)} suppliers "
+              f"(${total:,.2f}) in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
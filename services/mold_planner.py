@@ -0,0 +1,177 @@
+"""
+Batch recipe-to-mold scaling across the mold catalogue.
+
+Every amount calculateLye produces (lye, water for all three water methods,
+fragrance) is proportional to the oil weight, so each recipe is calculated once
+and reduced to per-gram-of-oil factors. A mold holds volume_ml * density * fill
+grams of batter; dividing that by the recipe's batter-per-gram-of-oil gives the oil
+weight that fills it, and every recipe x mold amount is then one outer product.
+
+Mold volume is volume_ml, or length x width x height (cm, 1 cm3 = 1 mL) like
+MoldManager.jsx derives it. Recipes can be calculateLye requests or recipes rows
+with their ingredients; a recipe's water_percentage is the percentage water method.
+
+Usage:
+    python -m services.mold_planner recipes.json molds.json [--density 0.95] [--fill 1.0] [--output plan.json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from services.lye_calculator import LyeCalculator, js_round
+from services.oil_matrix import DEFAULT_OUTPUT
+
+# Raw soap batter, g/mL
+DEFAULT_DENSITY = 0.95
+AMOUNTS = ['lye_naoh', 'lye_koh', 'water', 'fragrance', 'total_batch_weight']
+
+
+def mold_volumes(molds):
+    """volume_ml per mold, falling back to its dimensions; 0 when neither is set."""
+    volumes = np.zeros(len(molds))
+    for i, mold in enumerate(molds):
+        try:
+            volume = float(mold.get('volume_ml') or 0)
+            if volume <= 0:
+                volume = float(mold['length_cm']) * float(mold['width_cm']) * float(mold['height_cm'])
+        except (KeyError, TypeError, ValueError):
+            volume = 0.0
+        volumes[i] = max(volume, 0.0)
+    return volumes
+
+
+def as_request(recipe):
+    """
+    calculateLye request for a recipe row or request dict.
+
+    Recipe rows from getRecipes nest the ingredient under `ingredient`; lines with
+    no name or weight are left out.
+
+    >>> as_request({'name': 'Castile', 'ingredients': [
+    ...     {'ingredient_id': 3, 'quantity': 500, 'unit': 'g', 'ingredient': {'id': 3, 'name': 'Olive Oil'}},
+    ...     {'ingredient_id': 9, 'quantity': None, 'ingredient': {'id': 9, 'name': 'Lavender'}},
+    ...     {'ingredient_id': 4, 'quantity': 20, 'ingredient': None}]})['oils']
+    [{'name': 'Olive Oil', 'weight': 500}]
+    """
+    request = dict(recipe)
+    if 'oils' not in request:
+        oils = []
+        for line in recipe.get('ingredients') or []:
+            name = line.get('name') or (line.get('ingredient') or {}).get('name')
+            if name and line.get('quantity') is not None:
+                oils.append({'name': name, 'weight': line['quantity']})
+        request['oils'] = oils
+    if not request.get('water_method') and request.get('water_percentage') is not None:
+        request['water_method'] = 'percentage'
+        request['water_value'] = request['water_percentage']
+    return request
+
+
+class MoldPlanner:
+    """Scales a set of recipes to every mold in one vectorized job."""
+
+    def __init__(self, calculator, density=DEFAULT_DENSITY, fill=1.0):
+        """
+        Args:
+            calculator: LyeCalculator over the oil library
+            density: batter density in g/mL
+            fill: fraction of the mold volume to fill
+        """
+        self.calculator = calculator
+        self.density = density
+        self.fill = fill
+
+    def plan(self, recipes, molds):
+        """
+        Amounts for every recipe x mold pair.
+
+        Returns:
+            (arrays, missing) - arrays maps 'total_oils', 'scale_factor' and AMOUNTS to
+            recipes x molds arrays plus a 'feasible' mask (recipe has oils, mold has a
+            volume); missing lists (recipe_position, oil_name) pairs not in the library
+        """
+        requests = [as_request(r) for r in recipes]
+        weights, missing = self.calculator.weights_for(requests)
+        base = self.calculator.calculate_arrays(
+            weights,
+            lye_type=[r.get('lye_type', 'NaOH') for r in requests],
+            superfat=[float(r.get('superfat_percentage') or 0) for r in requests],
+            koh_purity_90=[bool(r.get('koh_purity_90')) for r in requests],
+            water_method=[r.get('water_method') or '' for r in requests],
+            water_value=[float(r.get('water_value') or 0) for r in requests],
+            fragrance_ratio=[float(r.get('fragrance_ratio') or 0) for r in requests],
+        )
+        total = base['total_oils']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_gram = {key: np.where(total > 0, base[key] / total, 0.0) for key in AMOUNTS}
+            capacity = mold_volumes(molds) * self.density * self.fill                 # (M,)
+            batter = per_gram['total_batch_weight']                                   # (R,)
+            oils = np.where(batter[:, None] > 0, capacity[None, :] / batter[:, None], 0.0)
+            scale = np.where(total[:, None] > 0, oils / total[:, None], 0.0)
+
+        arrays = {key: per_gram[key][:, None] * oils for key in AMOUNTS}
+        arrays['total_oils'] = oils
+        arrays['scale_factor'] = scale
+        arrays['feasible'] = (total[:, None] > 0) & (capacity[None, :] > 0)
+        return arrays, missing
+
+    @staticmethod
+    def records(recipes, molds, arrays):
+        """Feasible pairs as flat dicts rounded like calculateLye."""
+        rows, cols = np.nonzero(arrays['feasible'])
+        columns = {'scale_factor': js_round(arrays['scale_factor'][rows, cols], 4).tolist()}
+        columns.update({key: js_round(arrays[key][rows, cols], 2).tolist() for key in ['total_oils'] + AMOUNTS})
+        names = list(columns)
+        return [
+            {'recipe': recipes[r].get('name', r), 'mold': molds[m].get('name', m), **dict(zip(names, values))}
+            for r, m, *values in zip(rows.tolist(), cols.tolist(), *columns.values())
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scale every recipe to every mold")
+    parser.add_argument('recipes', help='JSON list of calculateLye requests or recipes with ingredients')
+    parser.add_argument('molds', help='JSON list of molds rows')
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY, help='Batter density in g/mL')
+    parser.add_argument('--fill', type=float, default=1.0, help='Fraction of the mold volume to fill')
+    parser.add_argument('--output', '-o', help='Write the plan as JSON instead of printing it')
+    args = parser.parse_args()
+
+    if args.density <= 0 or not 0 < args.fill <= 1:
+        parser.error("--density must be positive and --fill in (0, 1]")
+    try:
+        with open(args.recipes) as f:
+            recipes = json.load(f)
+        with open(args.molds) as f:
+            molds = json.load(f)
+        calculator = LyeCalculator.open(args.matrix)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    planner = MoldPlanner(calculator, args.density, args.fill)
+    arrays, missing = planner.plan(recipes, molds)
+    elapsed = time.perf_counter() - start
+
+    for r, name in missing:
+        print(f"Warning: '{name}' in recipe {recipes[r].get('name', r)} is not in the oil library")
+
+    results = MoldPlanner.records(recipes, molds, arrays)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Planned {len(recipes)} recipes x {len(molds)} molds ({len(results)} feasible pairs) "
+              f"in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Columnar oil library matrix - the build artifact batch tools load instead of JSON.
+
+Usage:
+    python -m services.oil_matrix build [--input all_oils_complete.json] [--output oil_matrix.bin]
+    python -m services.oil_matrix info [oil_matrix.bin]
+
+File layout (little endian, sections 64-byte aligned):
+    8 bytes   magic b'SBOILMX1'
+    4 bytes   uint32 length of the JSON header that follows
+    header    {"version", "n_oils", "columns", "sections": {name: [offset, nbytes]}, "source_sha256"}
+    values    float32 [n_columns, n_oils] - one contiguous run per column
+    name_offsets  uint32 [n_oils + 1] into name_blob
+    name_blob     UTF-8 names, concatenated
+    name_order    uint32 [n_oils] - oil indices sorted by normalized name
+
+OilMatrix.open() maps the file and wraps the sections with numpy.frombuffer, so a
+load is an mmap plus a small header parse; nothing is copied or decoded until a
+column or name is actually read.
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_INPUT = BASE_DIR / 'all_oils_complete.json'
+DEFAULT_OUTPUT = BASE_DIR / 'oil_matrix.bin'
+
+MAGIC = b'SBOILMX1'
+VERSION = 1
+ALIGN = 64
+
+FATTY_ACIDS = ['lauric', 'myristic', 'palmitic', 'stearic', 'ricinoleic', 'oleic', 'linoleic', 'linolenic']
+SAP = ['sap_naoh', 'sap_koh']
+QUALITIES = ['hardness', 'cleansing', 'conditioning', 'bubbly', 'creamy', 'iodine', 'ins']
+COLUMNS = FATTY_ACIDS + SAP + QUALITIES
+
+
+def normalize_name(name):
+    return ' '.join(name.casefold().split())
+
+
+def flat_record(record):
+    """
+    Column values of one oil as floats.
+
+    Accepts catalog entries (nested 'fatty_acids'/'qualities'), flat
+    fatty_acid_profiles rows joined with their ingredient, and ingredients selected
+    with a nested 'fatty_acid_profile' like the API client does; missing values are 0.
+    """
+    values = {}
+    for group in ('fatty_acids', 'qualities', 'fatty_acid_profile'):
+        if isinstance(record.get(group), dict):
+            values.update(record[group])
+    for column in COLUMNS:
+        if column in record and not isinstance(record[column], dict):
+            values[column] = record[column]
+    return [float(values.get(column) or 0) for column in COLUMNS]
+
+
+class OilMatrix:
+    """Oils x columns float32 matrix with a name index."""
+
+    def __init__(self, names, values, name_order=None, mm=None):
+        self._names = names
+        self.values = values
+        self._name_order = name_order
+        self._keys = None
+        self._lookup = None
+        self._mmap = mm
+        self.n_oils = values.shape[1]
+        self._column_index = {column: i for i, column in enumerate(COLUMNS)}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build an in-memory matrix from catalog entries or profile rows."""
+        records = list(records)
+        values = np.array([flat_record(r) for r in records], dtype=np.float32).reshape(len(records), len(COLUMNS)).T.copy()
+        return cls([r['name'].strip() for r in records], values)
+
+    @classmethod
+    def open(cls, path=DEFAULT_OUTPUT):
+        """Memory-map a matrix file written by write()."""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            raise ValueError(f"{path}: not an oil matrix file")
+        (header_len,) = struct.unpack_from('<I', mm, len(MAGIC))
+        header = json.loads(mm[len(MAGIC) + 4:len(MAGIC) + 4 + header_len])
+        if header['version'] != VERSION or header['columns'] != COLUMNS:
+            mm.close()
+            raise ValueError(f"{path}: unsupported matrix version or column layout, rebuild it")
+
+        n = header['n_oils']
+        sections = header['sections']
+
+        def section(name, dtype, count):
+            offset, _ = sections[name]
+            return np.frombuffer(mm, dtype=dtype, count=count, offset=offset)
+
+        values = section('values', '<f4', len(COLUMNS) * n).reshape(len(COLUMNS), n)
+        names = MappedNames(mm, section('name_offsets', '<u4', n + 1), sections['name_blob'][0])
+        return cls(names, values, section('name_order', '<u4', n), mm)
+
+    def close(self):
+        if self._mmap is not None:
+            # numpy views keep exports on the map alive; drop ours and let GC release it
+            self.values = None
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_oils
+
+    @property
+    def names(self):
+        return self._names
+
+    def column(self, name):
+        """One column as a contiguous float32 view over all oils."""
+        return self.values[self._column_index[name]]
+
+    def block(self, columns):
+        """Oils x len(columns) view/array of several columns."""
+        rows = [self._column_index[c] for c in columns]
+        if rows == list(range(rows[0], rows[0] + len(rows))):
+            return self.values[rows[0]:rows[-1] + 1].T
+        return self.values[rows].T
+
+    def widened(self, columns):
+        """
+        Oils x len(columns) float64 copy of several columns.
+
+        Each float32 is widened to its shortest decimal repr rather than its exact
+        binary value, so a SAP of 0.12 comes back as 0.12 and sums agree with
+        float64 arithmetic on the source data (the JS calculators).
+        """
+        return self.block(columns).astype(str).astype(np.float64)
+
+    @property
+    def fatty_acids(self):
+        return self.block(FATTY_ACIDS)
+
+    @property
+    def qualities(self):
+        return self.block(QUALITIES)
+
+    @property
+    def sap_naoh(self):
+        return self.column('sap_naoh')
+
+    @property
+    def sap_koh(self):
+        return self.column('sap_koh')
+
+    def index(self, name):
+        """Row of an oil by name (case and whitespace insensitive); KeyError if absent."""
+        key = normalize_name(name)
+        if self._lookup is not None:
+            return self._lookup[key]
+        order = self._sorted_order()
+        keys = self._sorted_keys()
+        pos = bisect_left(keys, key)
+        if pos == len(keys) or keys[pos] != key:
+            raise KeyError(name)
+        return int(order[pos])
+
+    def lookup(self):
+        """
+        Normalized name -> row dict for bulk resolution.
+
+        Built once on first use (decoding every name); single lookups before that
+        bisect the stored name order instead.
+        """
+        if self._lookup is None:
+            self._lookup = {normalize_name(name): i for i, name in enumerate(self._names)}
+        return self._lookup
+
+    def indices(self, names):
+        lookup = self.lookup()
+        return np.fromiter((lookup[normalize_name(n)] for n in names), dtype=np.intp)
+
+    def _sorted_order(self):
+        if self._name_order is None:
+            self._name_order = np.array(sorted(range(self.n_oils), key=lambda i: normalize_name(self._names[i])), dtype=np.uint32)
+        return self._name_order
+
+    def _sorted_keys(self):
+        if self._keys is None:
+            self._keys = SortedKeys(self._names, self._sorted_order())
+        return self._keys
+
+    def write(self, path, source_sha256=None):
+        """Write the matrix file atomically."""
+        path = Path(path)
+        encoded = [name.encode('utf-8') for name in self._names]
+        name_offsets = np.zeros(self.n_oils + 1, dtype='<u4')
+        np.cumsum([len(b) for b in encoded], out=name_offsets[1:])
+        payloads = [
+            ('values', np.ascontiguousarray(self.values, dtype='<f4').tobytes()),
+            ('name_offsets', name_offsets.tobytes()),
+            ('name_blob', b''.join(encoded)),
+            ('name_order', np.asarray(self._sorted_order(), dtype='<u4').tobytes()),
+        ]
+
+        # Header size depends on the offsets it records; reserve generously and pad
+        header = {'version': VERSION, 'n_oils': self.n_oils, 'columns': COLUMNS, 'sections': {}, 'source_sha256': source_sha256}
+        reserve = len(json.dumps(header)) + 64 * len(payloads) + ALIGN
+        offset = align(len(MAGIC) + 4 + reserve)
+        for name, data in payloads:
+            header['sections'][name] = [offset, len(data)]
+            offset = align(offset + len(data))
+        header_bytes = json.dumps(header).encode('utf-8').ljust(reserve)
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                f.write(struct.pack('<I', len(header_bytes)))
+                f.write(header_bytes)
+                for name, data in payloads:
+                    f.seek(header['sections'][name][0])
+                    f.write(data)
+                f.truncate(offset)
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class MappedNames:
+    """Sequence of names decoded on demand from the mapped blob."""
+
+    def __init__(self, mm, offsets, blob_offset):
+        self._mm = mm
+        self._offsets = offsets
+        self._base = blob_offset
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._mm[self._base + start:self._base + end].decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class SortedKeys:
+    """Normalized names in sorted order, decoded only at the positions bisect probes."""
+
+    def __init__(self, names, order):
+        self._names = names
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, pos):
+        return normalize_name(self._names[int(self._order[pos])])
+
+
+def align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build(input_path=DEFAULT_INPUT, output_path=DEFAULT_OUTPUT):
+    data = Path(input_path).read_bytes()
+    matrix = OilMatrix.from_records(json.loads(data))
+    matrix.write(output_path, hashlib.sha256(data).hexdigest())
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the columnar oil matrix")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='Build the matrix from the oil catalog')
+    build_cmd.add_argument('--input', default=str(DEFAULT_INPUT), help='Oil catalog JSON')
+    build_cmd.add_argument('--output', default=str(DEFAULT_OUTPUT), help='Matrix file to write')
+    info_cmd = sub.add_parser('info', help='Show a matrix file summary')
+    info_cmd.add_argument('path', nargs='?', default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        matrix = build(args.input, args.output)
+        elapsed = time.perf_counter() - start
+        size = Path(args.output).stat().st_size
+        print(f"Built {Path(args.output).name}: {matrix.n_oils} oils x {len(COLUMNS)} columns, {size:,} bytes in {elapsed:.3f}s")
+    else:
+        start = time.perf_counter()
+        try:
+            matrix = OilMatrix.open(args.path)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        elapsed = time.perf_counter() - start
+        print(f"{args.path}: {matrix.n_oils} oils, columns: {', '.join(COLUMNS)}")
+        print(f"Opened in {elapsed * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
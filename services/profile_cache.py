@@ -0,0 +1,251 @@
+"""
+Bounded, invalidating fatty acid profile cache.
+
+Python counterpart of the profileCache in web/frontend/src/utils/soapMath.js, without
+its two problems: entries are evicted least-recently-used once the cache is full and
+expire after a TTL, and every lookup is checked against the ingredient's updated_at
+so an edited profile is never served from the cache.
+
+A lookup costs one light version query (ingredient id -> updated_at) for the
+requested ids plus, only when something is missing, stale or expired, one batched
+profile query for exactly those ids. Sources implement two methods:
+
+    fetch_versions(ids) -> {ingredient_id: updated_at}
+    fetch_profiles(ids) -> {ingredient_id: (updated_at, profile_row)}
+
+SQLiteProfileSource reads the schema gen_sql.py --load creates, as a local stand-in
+for the Supabase tables.
+
+Usage:
+    python -m services.profile_cache sqlite:///soap.db 1 2 3 [--repeat 1000] [--size 1024] [--ttl 300]
+"""
+
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from services.oil_matrix import FATTY_ACIDS
+from services.soap_calculator import PROFILE_KEYS, QUALITIES, formula_matrix, round_js
+
+SQLITE_PREFIX = 'sqlite:///'
+PROFILE_COLUMNS = FATTY_ACIDS + QUALITIES
+# SQLite's default limit on bound parameters is 999
+QUERY_CHUNK = 500
+
+
+class ProfileCache:
+    """LRU + TTL cache of fatty_acid_profiles rows keyed by ingredient id."""
+
+    def __init__(self, source, max_entries=1024, ttl=300.0, clock=time.monotonic):
+        """
+        Args:
+            source: object with fetch_versions(ids) and fetch_profiles(ids)
+            max_entries: entries kept before the least recently used are evicted
+            ttl: seconds an entry may be served before it is re-fetched (None: no expiry)
+            clock: monotonic time source, replaceable for simulations
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.source = source
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # ingredient_id -> (updated_at, profile or None, stored_at); None caches "no profile"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get_many(self, ids):
+        """
+        Profiles for the given ingredient ids.
+
+        Returns:
+            {ingredient_id: profile_row} for the ids that have a profile
+        """
+        ids = list(dict.fromkeys(i for i in ids if i is not None))
+        if not ids:
+            return {}
+        versions = self.source.fetch_versions(ids)
+        now = self.clock()
+
+        result = {}
+        wanted = []
+        with self._lock:
+            for i in ids:
+                entry = self._entries.get(i)
+                if entry is None:
+                    self.misses += 1
+                    if i in versions:
+                        wanted.append(i)
+                    continue
+                updated_at, profile, stored_at = entry
+                if i not in versions:
+                    # Ingredient deleted since it was cached
+                    del self._entries[i]
+                    self.stale += 1
+                elif updated_at != versions[i]:
+                    self.stale += 1
+                    wanted.append(i)
+                elif self.ttl is not None and now - stored_at > self.ttl:
+                    self.expired += 1
+                    wanted.append(i)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(i)
+                    if profile is not None:
+                        result[i] = profile
+
+        if wanted:
+            fetched = self.source.fetch_profiles(wanted)
+            with self._lock:
+                for i in wanted:
+                    updated_at, profile = fetched.get(i, (versions[i], None))
+                    self._store(i, updated_at, profile, now)
+                    if profile is not None:
+                        result[i] = profile
+        return result
+
+    def get(self, ingredient_id):
+        return self.get_many([ingredient_id]).get(ingredient_id)
+
+    def invalidate(self, ingredient_id=None):
+        """Drop one entry, or everything when no id is given (clearProfileCache)."""
+        with self._lock:
+            if ingredient_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ingredient_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.stale + self.expired
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, ingredient_id, updated_at, profile, now):
+        self._entries[ingredient_id] = (updated_at, profile, now)
+        self._entries.move_to_end(ingredient_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class SQLiteProfileSource:
+    """Profile source over the ingredients / fatty_acid_profiles tables in SQLite."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):], check_same_thread=False)
+        self.queries = 0
+
+    def close(self):
+        self.conn.close()
+
+    def _select(self, sql, ids):
+        rows = []
+        for start in range(0, len(ids), QUERY_CHUNK):
+            chunk = ids[start:start + QUERY_CHUNK]
+            self.queries += 1
+            rows.extend(self.conn.execute(sql.format(', '.join('?' * len(chunk))), chunk))
+        return rows
+
+    def fetch_versions(self, ids):
+        return dict(self._select("SELECT id, updated_at FROM ingredients WHERE id IN ({})", ids))
+
+    def fetch_profiles(self, ids):
+        columns = ', '.join(f"p.{c}" for c in PROFILE_COLUMNS)
+        rows = self._select(
+            f"SELECT i.id, i.updated_at, {columns} FROM ingredients i "
+            f"JOIN fatty_acid_profiles p ON p.ingredient_id = i.id WHERE i.id IN ({{}})", ids)
+        return {
+            row[0]: (row[1], {'ingredient_id': row[0], **dict(zip(PROFILE_COLUMNS, row[2:]))})
+            for row in rows
+        }
+
+
+def preview_qualities(cache, ingredients):
+    """
+    computeQualities from soapMath.js, with profiles served by the cache.
+
+    Args:
+        ingredients: list of {ingredient_id, quantity}
+
+    Returns:
+        quality dict rounded like calculateSoapQualities, or None when no ingredient
+        has a positive quantity and a profile
+    """
+    valid = []
+    for item in ingredients or []:
+        try:
+            quantity = float(item.get('quantity') or 0)
+        except (TypeError, ValueError):
+            quantity = 0.0
+        if item.get('ingredient_id') and quantity > 0:
+            valid.append((item['ingredient_id'], quantity))
+    if not valid:
+        return None
+
+    profiles = cache.get_many(i for i, _ in valid)
+    used = [(profiles[i], q) for i, q in valid if i in profiles]
+    if not used:
+        return None
+    weights = np.array([q for _, q in used])
+    values = np.array([[float(p.get(key) or 0) for key in PROFILE_KEYS] for p, _ in used])
+    scores = (weights / weights.sum()) @ values @ formula_matrix()
+    return dict(zip(QUALITIES, round_js(scores, 1).tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the profile cache against a database")
+    parser.add_argument('url', help='Database URL (sqlite:///path, e.g. one loaded with gen_sql.py --load)')
+    parser.add_argument('ids', nargs='+', type=int, help='Ingredient ids to look up')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of lookups of the id set')
+    parser.add_argument('--size', type=int, default=1024, help='Maximum cached profiles')
+    parser.add_argument('--ttl', type=float, default=300.0, help='Seconds before an entry is re-fetched')
+    args = parser.parse_args()
+
+    try:
+        source = SQLiteProfileSource(args.url)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    cache = ProfileCache(source, args.size, args.ttl)
+    start = time.perf_counter()
+    try:
+        for _ in range(args.repeat):
+            profiles = cache.get_many(args.ids)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    stats = cache.stats()
+    print(f"{len(profiles)} of {len(set(args.ids))} ingredients have profiles")
+    print(f"{args.repeat} lookups in {elapsed * 1000:.1f} ms, {source.queries} queries")
+    print(f"hits {stats['hits']}, misses {stats['misses']}, stale {stats['stale']}, "
+          f"expired {stats['expired']}, evictions {stats['evictions']} (hit rate {stats['hit_rate']:.1%})")
+    source.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Batch soap quality engine.
+
+Python counterpart of web/frontend/src/utils/soapCalculator.js (itself a port of the
+original src/services/soap_calculator.py). Qualities are linear in the fatty acid
+profile, so each oil's contribution to every quality is folded into one
+oils x qualities matrix up front and a whole recipe catalog is scored with a single
+matrix product:
+
+    qualities = (W @ (P @ Q)) / W.sum(axis=1)
+
+W is recipes x oils weights, P the oils x (8 fatty acids, iodine, ins) profiles and
+Q the fixed fatty acid -> quality map used by the JS calculator.
+
+Usage:
+    python -m services.soap_calculator recipes.json [--matrix oil_matrix.bin] [--output scores.json]
+
+recipes.json is a list of {"name", "oils": [{"name", "quantity"|"weight"|"percentage"}]}
+(the formulations.oils shape); oils are matched to the library by name.
+"""
+
+import argparse
+import json
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import numpy as np
+
+from services.oil_matrix import DEFAULT_OUTPUT, FATTY_ACIDS, OilMatrix, normalize_name
+
+QUALITIES = ['hardness', 'cleansing', 'conditioning', 'bubbly', 'creamy', 'iodine', 'ins']
+PROFILE_KEYS = FATTY_ACIDS + ['iodine', 'ins']
+
+# Which profile values add up to each quality (standard soapmaking formulas)
+QUALITY_FORMULAS = {
+    'hardness': ['lauric', 'myristic', 'palmitic', 'stearic'],
+    'cleansing': ['lauric', 'myristic'],
+    'conditioning': ['oleic', 'linoleic', 'linolenic', 'ricinoleic'],
+    'bubbly': ['lauric', 'myristic', 'ricinoleic'],
+    'creamy': ['palmitic', 'stearic', 'ricinoleic'],
+    'iodine': ['iodine'],
+    'ins': ['ins'],
+}
+
+
+def formula_matrix():
+    """The profile -> quality map Q as a len(PROFILE_KEYS) x len(QUALITIES) 0/1 matrix."""
+    q = np.zeros((len(PROFILE_KEYS), len(QUALITIES)))
+    for j, quality in enumerate(QUALITIES):
+        for key in QUALITY_FORMULAS[quality]:
+            q[PROFILE_KEYS.index(key), j] = 1.0
+    return q
+
+
+def round_js(values, digits=1):
+    """
+    Round like JavaScript Number(x.toFixed(digits)).
+
+    toFixed rounds the exact binary value half-up, which differs from np.round
+    (half-to-even on the scaled float) right at the ties. Only values within a hair
+    of a tie are re-rounded exactly with Decimal.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** digits
+    scaled = np.abs(values) * scale
+    rounded = np.sign(values) * np.floor(scaled + 0.5) / scale
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        quantum = Decimal(1).scaleb(-digits)
+        exact = [float(Decimal(float(v)).quantize(quantum, rounding=ROUND_HALF_UP)) for v in values[near_tie]]
+        rounded[near_tie] = exact
+    return rounded + 0.0
+
+
+class SoapCalculator:
+    """Scores recipes against a fixed oil library."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.contributions = matrix.widened(PROFILE_KEYS) @ formula_matrix()
+
+    @classmethod
+    def open(cls, path=DEFAULT_OUTPUT):
+        return cls(OilMatrix.open(path))
+
+    def calculate_batch(self, weights, digits=None):
+        """
+        Qualities for many recipes at once.
+
+        Args:
+            weights: recipes x oils array of oil quantities; non-positive entries are
+                ignored, like the JS calculator skips quantities <= 0
+            digits: round like toFixed(digits) when given
+
+        Returns:
+            recipes x len(QUALITIES) array; recipes with no oil weight score 0
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        weights = np.where(weights > 0, weights, 0.0)
+        totals = weights.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(totals > 0, (weights @ self.contributions) / totals, 0.0)
+        return round_js(scores, digits) if digits is not None else scores
+
+    def calculate_sparse(self, recipe_index, oil_index, quantity, n_recipes, digits=None):
+        """
+        Qualities from (recipe, oil, quantity) triplets, e.g. recipe_ingredients rows.
+
+        Avoids materialising the dense weight matrix when the catalog is large and
+        each recipe only uses a handful of oils.
+        """
+        recipe_index = np.asarray(recipe_index, dtype=np.intp)
+        oil_index = np.asarray(oil_index, dtype=np.intp)
+        quantity = np.asarray(quantity, dtype=np.float64)
+        keep = quantity > 0
+        recipe_index, oil_index, quantity = recipe_index[keep], oil_index[keep], quantity[keep]
+
+        totals = np.bincount(recipe_index, weights=quantity, minlength=n_recipes)
+        sums = np.zeros((n_recipes, len(QUALITIES)))
+        np.add.at(sums, recipe_index, quantity[:, None] * self.contributions[oil_index])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(totals[:, None] > 0, sums / totals[:, None], 0.0)
+        return round_js(scores, digits) if digits is not None else scores
+
+    def weights_for(self, recipes):
+        """
+        Build the recipes x oils weight matrix from recipe dicts.
+
+        Returns:
+            (weights, missing) - missing lists (recipe_position, oil_name) pairs not in the library
+        """
+        weights = np.zeros((len(recipes), self.matrix.n_oils))
+        missing = []
+        lookup = self.matrix.lookup()
+        for r, recipe in enumerate(recipes):
+            for oil in recipe.get('oils', []):
+                i = lookup.get(normalize_name(oil['name']))
+                if i is None:
+                    missing.append((r, oil['name']))
+                    continue
+                weights[r, i] += parse_quantity(oil)
+        return weights, missing
+
+    def calculate(self, oils):
+        """Qualities of one recipe as the dict soapCalculator.js returns."""
+        weights, _ = self.weights_for([{'oils': oils}])
+        return dict(zip(QUALITIES, self.calculate_batch(weights, digits=1)[0].tolist()))
+
+
+def parse_quantity(oil):
+    for key in ('quantity', 'weight', 'percentage'):
+        if oil.get(key) is not None:
+            try:
+                return float(oil[key])
+            except (TypeError, ValueError):
+                return 0.0
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a recipe catalog against the oil library")
+    parser.add_argument('recipes', help='JSON list of {"name", "oils": [{"name", "quantity"}]}')
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--output', '-o', help='Write scores as JSON instead of printing them')
+    args = parser.parse_args()
+
+    with open(args.recipes) as f:
+        recipes = json.load(f)
+    try:
+        calculator = SoapCalculator.open(args.matrix)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    weights, missing = calculator.weights_for(recipes)
+    scores = calculator.calculate_batch(weights, digits=1)
+    elapsed = time.perf_counter() - start
+
+    results = [{'name': r.get('name'), **dict(zip(QUALITIES, s.tolist()))} for r, s in zip(recipes, scores)]
+    for r, name in missing:
+        print(f"Warning: '{name}' in recipe {recipes[r].get('name', r)} is not in the oil library")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"Scored {len(recipes)} recipes in {elapsed * 1000:.1f} ms, written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Nearest-neighbour substitution index over fatty acid profiles.
+
+Every oil (the library plus any fatty_acid_profiles rows) and every saved formulation
+is a point in the 8-dimensional fatty acid space; a formulation's point is the
+percentage-weighted average of its oils. Points are held in a KD-tree so the top-k
+closest oils or formulations come from a best-first search that only opens the
+few leaves near the query instead of scanning the whole set.
+
+Usage:
+    python -m services.substitution_index substitutes "Olive Oil" [-k 5] [--profiles profiles.json]
+    python -m services.substitution_index formulations formulations.json --blend "Olive Oil=60" "Coconut Oil, 76 deg=40" [-k 5]
+
+profiles.json is a list of ingredients with their fatty acid profile (flat columns
+or a nested 'fatty_acid_profile'); formulations.json is a list of formulations rows
+({"name", "oils": [{"name", "percentage"}]}).
+"""
+
+import argparse
+import heapq
+import json
+import sys
+import time
+
+import numpy as np
+
+from services.oil_matrix import DEFAULT_OUTPUT, FATTY_ACIDS, OilMatrix, normalize_name
+from services.soap_calculator import parse_quantity
+
+
+class KDTree:
+    """
+    Static KD-tree for k-nearest-neighbour queries under Euclidean distance.
+
+    Nodes are stored in flat arrays; each covers a contiguous run of the permuted
+    point order and keeps its bounding box, so the search can bound the distance to
+    a whole subtree before opening it.
+    """
+
+    def __init__(self, points, leaf_size=64):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        n = len(self.points)
+        self.order = np.arange(n)
+        self.start, self.end, self.left, self.right = [], [], [], []
+        mins, maxs = [], []
+
+        stack = [(0, n, None, None)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(self.start)
+            if parent is not None:
+                (self.left if side == 0 else self.right)[parent] = node
+            block = self.points[self.order[start:end]]
+            low, high = (block.min(axis=0), block.max(axis=0)) if end > start else (np.zeros(self.points.shape[1]),) * 2
+            self.start.append(start)
+            self.end.append(end)
+            self.left.append(-1)
+            self.right.append(-1)
+            mins.append(low)
+            maxs.append(high)
+            if end - start <= leaf_size:
+                continue
+            # Split at the median of the widest dimension
+            dim = int(np.argmax(high - low))
+            mid = (start + end) // 2
+            run = self.order[start:end]
+            self.order[start:end] = run[np.argpartition(self.points[run, dim], mid - start)]
+            stack.append((mid, end, node, 1))
+            stack.append((start, mid, node, 0))
+
+        self.mins = np.array(mins)
+        self.maxs = np.array(maxs)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _bound(self, node, point):
+        """Squared distance from point to the node's bounding box."""
+        gap = np.maximum(self.mins[node] - point, 0) + np.maximum(point - self.maxs[node], 0)
+        return float(gap @ gap)
+
+    def query(self, point, k=1, exclude=()):
+        """
+        The k nearest points.
+
+        Args:
+            point: query vector
+            k: number of neighbours
+            exclude: point indices to skip (e.g. the query oil itself)
+
+        Returns:
+            list of (distance, index), nearest first
+        """
+        point = np.asarray(point, dtype=np.float64)
+        if not len(self.points) or k <= 0:
+            return []
+        best = []                                    # max-heap of (-d2, index), size <= k
+        frontier = [(self._bound(0, point), 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            if self.left[node] < 0:
+                run = self.order[self.start[node]:self.end[node]]
+                diff = self.points[run] - point
+                d2s = np.einsum('ij,ij->i', diff, diff)
+                if len(best) == k:
+                    near = d2s < -best[0][0]
+                    run, d2s = run[near], d2s[near]
+                for d2, i in zip(d2s.tolist(), run.tolist()):
+                    if i in exclude:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, i))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, i))
+                continue
+            for child in (self.left[node], self.right[node]):
+                child_bound = self._bound(child, point)
+                if len(best) < k or child_bound <= -best[0][0]:
+                    heapq.heappush(frontier, (child_bound, child))
+        return [(d2 ** 0.5, i) for d2, i in sorted((-d, i) for d, i in best)]
+
+
+class SubstitutionIndex:
+    """Finds substitute oils and similar formulations by fatty acid profile."""
+
+    def __init__(self, matrix, profiles=(), formulations=(), leaf_size=64):
+        """
+        Args:
+            matrix: OilMatrix of the library
+            profiles: extra oils (e.g. fatty_acid_profiles rows); they shadow library
+                oils of the same name
+            formulations: formulations rows to index for blend queries
+        """
+        extra = OilMatrix.from_records(profiles) if profiles else None
+        names = list(matrix.names)
+        vectors = matrix.widened(FATTY_ACIDS)
+        if extra is not None and extra.n_oils:
+            shadowed = set(extra.lookup())
+            keep = [i for i, name in enumerate(names) if normalize_name(name) not in shadowed]
+            names = [names[i] for i in keep] + list(extra.names)
+            vectors = np.vstack([vectors[keep], extra.widened(FATTY_ACIDS)])
+
+        self.oil_names = names
+        self.oil_vectors = vectors
+        self.lookup = {normalize_name(name): i for i, name in enumerate(names)}
+        self.oils = KDTree(vectors, leaf_size)
+
+        self.formulations = list(formulations)
+        blends = [self.blend_vector(f.get('oils', []))[0] for f in self.formulations]
+        indexed = [i for i, v in enumerate(blends) if v is not None]
+        self.formulation_rows = indexed
+        self.formulation_tree = KDTree(np.array([blends[i] for i in indexed]).reshape(len(indexed), len(FATTY_ACIDS)), leaf_size)
+
+    def blend_vector(self, oils):
+        """
+        Percentage-weighted fatty acid profile of a blend.
+
+        Returns:
+            (vector, missing) - vector is None when no oil is known or weights are 0
+        """
+        rows, weights, missing = [], [], []
+        for oil in oils:
+            i = self.lookup.get(normalize_name(oil.get('name', '')))
+            if i is None:
+                missing.append(oil.get('name'))
+                continue
+            weight = parse_quantity(oil)
+            if weight > 0:
+                rows.append(i)
+                weights.append(weight)
+        if not rows:
+            return None, missing
+        weights = np.array(weights)
+        return weights @ self.oil_vectors[rows] / weights.sum(), missing
+
+    def substitutes(self, name, k=5):
+        """Top-k oils closest to the named oil, excluding itself."""
+        i = self.lookup.get(normalize_name(name))
+        if i is None:
+            raise KeyError(name)
+        return [{'name': self.oil_names[j], 'distance': round(d, 3)}
+                for d, j in self.oils.query(self.oil_vectors[i], k, exclude={i})]
+
+    def similar_formulations(self, oils, k=5):
+        """Top-k saved formulations closest to a blend of {name, percentage} oils."""
+        vector, missing = self.blend_vector(oils)
+        if vector is None:
+            raise ValueError(f"Blend has no known oils: {', '.join(map(str, missing)) or 'empty'}")
+        return [{'formulation': self.formulations[self.formulation_rows[j]], 'distance': round(d, 3)}
+                for d, j in self.formulation_tree.query(vector, k)]
+
+
+def parse_blend(items):
+    """["Olive Oil=60", ...] -> [{"name", "percentage"}]"""
+    oils = []
+    for item in items:
+        name, sep, value = item.rpartition('=')
+        if not sep:
+            raise ValueError(f"Expected NAME=PERCENTAGE, got '{item}'")
+        oils.append({'name': name.strip(), 'percentage': float(value)})
+    return oils
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find substitute oils and similar formulations")
+    parser.add_argument('--matrix', default=str(DEFAULT_OUTPUT), help='Oil matrix built by services.oil_matrix')
+    parser.add_argument('--profiles', help='JSON list of extra oils with fatty acid profiles')
+    sub = parser.add_subparsers(dest='command', required=True)
+    oil_cmd = sub.add_parser('substitutes', help='Oils closest to an oil')
+    oil_cmd.add_argument('name')
+    oil_cmd.add_argument('-k', type=int, default=5)
+    blend_cmd = sub.add_parser('formulations', help='Saved formulations closest to a blend')
+    blend_cmd.add_argument('formulations', help='JSON list of formulations rows')
+    blend_cmd.add_argument('--blend', nargs='+', required=True, help='NAME=PERCENTAGE pairs')
+    blend_cmd.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        matrix = OilMatrix.open(args.matrix)
+        profiles = load_json(args.profiles) if args.profiles else ()
+        formulations = load_json(args.formulations) if args.command == 'formulations' else ()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    index = SubstitutionIndex(matrix, profiles, formulations)
+    start = time.perf_counter()
+    try:
+        if args.command == 'substitutes':
+            results = index.substitutes(args.name, args.k)
+            for r in results:
+                print(f"{r['distance']:8.3f}  {r['name']}")
+        else:
+            results = index.similar_formulations(parse_blend(args.blend), args.k)
+            for r in results:
+                print(f"{r['distance']:8.3f}  {r['formulation'].get('name')}")
+    except KeyError as e:
+        print(f"Error: oil not found: {e.args[0]}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"Answered in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
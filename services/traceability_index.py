@@ -0,0 +1,402 @@
+"""
+Lot traceability index for recalls.
+
+Keeps the supplier-lot -> batch -> customer graph that Traceability.jsx and a recall
+otherwise rebuild with chained queries:
+
+    supply_order_items.lot_number -> supply_order_items
+    batch_ingredient_usage.supply_order_item_id -> production_batches
+    sales_order_items.batch_id -> sales_orders -> customers
+
+Every link is held in both directions, so "which customers received product from
+supplier lot X" walks forward and "which supplier lots went into batch Y" walks back,
+each touching only the rows in the answer. Links are counted, so two usage rows for
+the same item and batch leave the link in place when one of them is removed.
+
+Lot numbers are only unique per user, so supplier and batch lots are keyed by
+(user_id, lot_number) and every lookup names the user: a recall never reaches another
+tenant's customers. A database without user_id (a single shop) keys them on
+(None, lot_number), which is what the queries use when no user is given.
+
+The index is maintained row by row: apply() takes a new or changed row (its previous
+links are replaced), remove() a deleted one, and sync() pulls rows past per-table id
+watermarks (plus rows at or past a change column such as updated_at where a table has
+one). Most of these tables have no change column, so sync() then reconciles each
+table: it reads (id, digest of the kept columns, user_id included) for every row,
+re-reads rows whose digest differs from the indexed record and removes the ids that
+are gone, so edited and deleted rows never linger in a recall. --no-reconcile skips
+that pass. SQLiteTraceSource is the local stand-in for the Supabase tables.
+
+Usage:
+    python -m services.traceability_index sync sqlite:///soap.db [--state traceability.json] [--changed-column updated_at]
+                                               [--no-reconcile]
+    python -m services.traceability_index load export.json [--state traceability.json]
+    python -m services.traceability_index customers LOT [--user USER_ID] [--supplier ID] [--state traceability.json]
+    python -m services.traceability_index lots BATCH_LOT [--user USER_ID] [--state traceability.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STATE = BASE_DIR / 'traceability.json'
+SQLITE_PREFIX = 'sqlite:///'
+STATE_VERSION = 2
+
+# Columns kept per table
+FIELDS = {
+    'suppliers': ['user_id', 'name'],
+    'supply_orders': ['user_id', 'supplier_id', 'order_date'],
+    'supply_order_items': ['user_id', 'order_id', 'ingredient_id', 'lot_number', 'expiry_date'],
+    'production_batches': ['user_id', 'lot_number', 'recipe_id', 'production_date'],
+    'batch_ingredient_usage': ['user_id', 'batch_id', 'supply_order_item_id', 'ingredient_id'],
+    'customers': ['user_id', 'name'],
+    'sales_orders': ['user_id', 'customer_id', 'sale_date'],
+    'sales_order_items': ['user_id', 'order_id', 'batch_id'],
+}
+
+# table -> [(link, from column(s), to column)]; 'id' is the row's own id, and a tuple
+# of columns keys the link on their values (None when the last one is missing)
+LINKS = {
+    'supply_orders': [('supplier', 'id', 'supplier_id')],
+    'supply_order_items': [('supply_lot', ('user_id', 'lot_number'), 'id'), ('item_order', 'id', 'order_id')],
+    'production_batches': [('batch_lot', ('user_id', 'lot_number'), 'id')],
+    'batch_ingredient_usage': [('usage', 'supply_order_item_id', 'batch_id')],
+    'sales_order_items': [('sale', 'batch_id', 'order_id')],
+    'sales_orders': [('customer', 'id', 'customer_id')],
+}
+
+
+class Link:
+    """Counted many-to-many relation held in both directions."""
+
+    def __init__(self):
+        self.forward = defaultdict(Counter)
+        self.backward = defaultdict(Counter)
+
+    def add(self, a, b):
+        self.forward[a][b] += 1
+        self.backward[b][a] += 1
+
+    def discard(self, a, b):
+        for index, key, value in ((self.forward, a, b), (self.backward, b, a)):
+            counts = index.get(key)
+            if counts is None:
+                continue
+            counts[value] -= 1
+            if counts[value] <= 0:
+                del counts[value]
+            if not counts:
+                del index[key]
+
+    def targets(self, keys):
+        return {b for a in keys for b in self.forward.get(a, ())}
+
+    def sources(self, keys):
+        return {a for b in keys for a in self.backward.get(b, ())}
+
+
+def digest(table, record):
+    """Short hash of the kept columns of a row."""
+    # repr of ints, strings and None is stable, and much cheaper than JSON here
+    payload = repr(tuple(record.get(column) for column in FIELDS[table]))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def link_key(record, columns):
+    """Value of a link column, or the tuple of a column group's values."""
+    if isinstance(columns, str):
+        return record.get(columns)
+    if record.get(columns[-1]) is None:
+        return None
+    return tuple(record.get(column) for column in columns)
+
+
+class TraceabilityIndex:
+    """Bidirectional supplier lot / batch / customer graph."""
+
+    def __init__(self):
+        self.rows = {table: {} for table in FIELDS}
+        self.links = {name: Link() for specs in LINKS.values() for name, _, _ in specs}
+        self.watermarks = {table: {'id': None, 'changed': None} for table in FIELDS}
+
+    def apply(self, table, row):
+        """Add or replace one row; returns True if anything changed."""
+        record = {column: row.get(column) for column in FIELDS[table]}
+        record['id'] = row['id']
+        old = self.rows[table].get(row['id'])
+        if old == record:
+            return False
+        if old is not None:
+            self._link(table, old, discard=True)
+        self._link(table, record)
+        self.rows[table][row['id']] = record
+        mark = self.watermarks[table]
+        if mark['id'] is None or row['id'] > mark['id']:
+            mark['id'] = row['id']
+        return True
+
+    def remove(self, table, row_id):
+        """Drop a deleted row and its links."""
+        old = self.rows[table].pop(row_id, None)
+        if old is not None:
+            self._link(table, old, discard=True)
+        return old is not None
+
+    def _link(self, table, record, discard=False):
+        for name, source, target in LINKS.get(table, ()):
+            a, b = link_key(record, source), record.get(target)
+            if a is None or b is None:
+                continue
+            if discard:
+                self.links[name].discard(a, b)
+            else:
+                self.links[name].add(a, b)
+
+    def apply_dataset(self, data):
+        """Apply an exported {table: [rows]} dataset; returns rows changed."""
+        return sum(self.apply(table, row) for table in FIELDS for row in data.get(table) or [])
+
+    def sync(self, source, changed_column=None, reconcile=True):
+        """
+        Pull rows past the watermarks from a source; returns rows changed.
+
+        Args:
+            source: object with fetch(table, after_id, changed_column, changed_after),
+                digests(table) yielding (id, digest) for every row and
+                fetch_ids(table, ids)
+            reconcile: also re-apply rows whose digest changed and remove deleted ones
+        """
+        changed = 0
+        for table in FIELDS:
+            mark = self.watermarks[table]
+            # Rows sharing the watermark's timestamp come back; apply() ignores unchanged ones
+            for row in source.fetch(table, mark['id'], changed_column, mark['changed']):
+                changed += self.apply(table, row)
+                stamp = row.get(changed_column) if changed_column else None
+                if stamp is not None and (mark['changed'] is None or str(stamp) > mark['changed']):
+                    mark['changed'] = str(stamp)
+            if reconcile:
+                changed += self.reconcile(table, source)
+        return changed
+
+    def reconcile(self, table, source):
+        """Bring a table's indexed rows in line with the source's digests; returns rows changed."""
+        indexed = self.rows[table]
+        present, stale = set(), []
+        for row_id, row_digest in source.digests(table):
+            present.add(row_id)
+            old = indexed.get(row_id)
+            if old is None or digest(table, old) != row_digest:
+                stale.append(row_id)
+        changed = sum(self.remove(table, row_id) for row_id in set(indexed) - present)
+        for row in source.fetch_ids(table, stale):
+            changed += self.apply(table, row)
+        return changed
+
+    def customers_for_supplier_lot(self, lot_number, user_id=None, supplier_id=None):
+        """
+        Everyone who received product made with one user's supplier lot.
+
+        Returns:
+            list of {customer_id, customer, orders, batches} - batches are the
+            production lot numbers that carried the supplier lot to that customer
+        """
+        links = self.links
+        items = links['supply_lot'].targets([(user_id, lot_number)])
+        if supplier_id is not None:
+            items = {i for i in items if supplier_id in links['supplier'].targets(links['item_order'].targets([i]))}
+
+        received = defaultdict(lambda: {'orders': set(), 'batches': set()})
+        for batch in links['usage'].targets(items):
+            for order in links['sale'].targets([batch]):
+                for customer in links['customer'].targets([order]) or [None]:
+                    received[customer]['orders'].add(order)
+                    received[customer]['batches'].add(batch)
+
+        batch_lots = self.rows['production_batches']
+        customers = self.rows['customers']
+        return [
+            {
+                'customer_id': customer,
+                'customer': customers.get(customer, {}).get('name'),
+                'orders': sorted(found['orders']),
+                'batches': sorted(batch_lots.get(b, {}).get('lot_number') or str(b) for b in found['batches']),
+            }
+            for customer, found in sorted(received.items(), key=lambda item: (item[0] is None, str(item[0])))
+        ]
+
+    def supplier_lots_for_batch(self, batch_lot, user_id=None):
+        """
+        Supplier lots that went into one user's production batch (by lot number).
+
+        Returns:
+            list of {supply_order_item_id, lot_number, ingredient_id, expiry_date,
+            supplier_id, supplier, order_date}
+        """
+        links = self.links
+        results = []
+        for item_id in sorted(links['usage'].sources(links['batch_lot'].targets([(user_id, batch_lot)]))):
+            item = self.rows['supply_order_items'].get(item_id, {})
+            order = self.rows['supply_orders'].get(item.get('order_id'), {})
+            supplier = self.rows['suppliers'].get(order.get('supplier_id'), {})
+            results.append({
+                'supply_order_item_id': item_id,
+                'lot_number': item.get('lot_number'),
+                'ingredient_id': item.get('ingredient_id'),
+                'expiry_date': item.get('expiry_date'),
+                'supplier_id': order.get('supplier_id'),
+                'supplier': supplier.get('name'),
+                'order_date': order.get('order_date'),
+            })
+        return results
+
+    def save(self, path=DEFAULT_STATE):
+        """Write the index state atomically; links are rebuilt from the rows on load."""
+        path = Path(path)
+        state = {
+            'version': STATE_VERSION,
+            'watermarks': self.watermarks,
+            'rows': {table: [[r.get(c) for c in ['id'] + FIELDS[table]] for r in rows.values()]
+                     for table, rows in self.rows.items()},
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            mask = os.umask(0)
+            os.umask(mask)
+            os.chmod(tmp, 0o666 & ~mask)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE):
+        """Index from a saved state; a missing file gives an empty index."""
+        index = cls()
+        if not Path(path).exists():
+            return index
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"{path}: unsupported traceability state version")
+        for table, rows in state['rows'].items():
+            columns = ['id'] + FIELDS[table]
+            for values in rows:
+                index.apply(table, dict(zip(columns, values)))
+        index.watermarks = state['watermarks']
+        return index
+
+
+class SQLiteTraceSource:
+    """Reads the traceability tables from a SQLite database."""
+
+    def __init__(self, url):
+        if not url.startswith(SQLITE_PREFIX):
+            raise ValueError(f"Unsupported database URL: {url} (expected {SQLITE_PREFIX}path)")
+        self.conn = sqlite3.connect(url[len(SQLITE_PREFIX):])
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        self.conn.close()
+
+    def fetch(self, table, after_id, changed_column=None, changed_after=None):
+        """Rows with id > after_id, or changed_column >= changed_after where the table has it."""
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if not columns:
+            return iter(())
+        sql, params = f"SELECT * FROM {table}", []
+        if after_id is not None:
+            sql += " WHERE id > ?"
+            params.append(after_id)
+            if changed_column in columns and changed_after is not None:
+                sql += f" OR {changed_column} >= ?"
+                params.append(changed_after)
+        return (dict(row) for row in self.conn.execute(sql + " ORDER BY id", params))
+
+    def digests(self, table):
+        """(id, digest of the kept columns) for every row of a table."""
+        available = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if not available:
+            return
+        columns = ['id'] + [c for c in FIELDS[table] if c in available]
+        for row in self.conn.execute(f"SELECT {', '.join(columns)} FROM {table}"):
+            row = dict(row)
+            yield row['id'], digest(table, row)
+
+    def fetch_ids(self, table, ids, chunk=500):
+        """Rows with the given ids."""
+        ids = list(ids)
+        for start in range(0, len(ids), chunk):
+            batch = ids[start:start + chunk]
+            sql = f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(batch))}) ORDER BY id"
+            yield from (dict(row) for row in self.conn.execute(sql, batch))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and query the lot traceability index")
+    parser.add_argument('--state', default=str(DEFAULT_STATE), help='Index state file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync_cmd = sub.add_parser('sync', help='Apply new and changed rows from a database')
+    sync_cmd.add_argument('url', help='Database URL (sqlite:///path)')
+    sync_cmd.add_argument('--changed-column', help='Timestamp column marking updated rows (e.g. updated_at)')
+    sync_cmd.add_argument('--no-reconcile', action='store_true',
+                          help='Only read rows past the watermarks (misses edits and deletions without a change column)')
+    load_cmd = sub.add_parser('load', help='Apply an exported dataset')
+    load_cmd.add_argument('export', help='JSON {table: [rows]} for the traceability tables')
+    customers_cmd = sub.add_parser('customers', help='Customers who received product from a supplier lot')
+    customers_cmd.add_argument('lot', help='Supplier lot number')
+    customers_cmd.add_argument('--user', help='User the lot belongs to (omit for a database without user_id)')
+    customers_cmd.add_argument('--supplier', type=int, help='Only this supplier id')
+    lots_cmd = sub.add_parser('lots', help='Supplier lots that went into a batch')
+    lots_cmd.add_argument('batch', help='Production batch lot number')
+    lots_cmd.add_argument('--user', help='User the batch belongs to (omit for a database without user_id)')
+    args = parser.parse_args()
+
+    try:
+        index = TraceabilityIndex.load(args.state)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    if args.command in ('sync', 'load'):
+        try:
+            if args.command == 'sync':
+                source = SQLiteTraceSource(args.url)
+                try:
+                    changed = index.sync(source, args.changed_column, not args.no_reconcile)
+                finally:
+                    source.close()
+            else:
+                with open(args.export) as f:
+                    changed = index.apply_dataset(json.load(f))
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        index.save(args.state)
+        elapsed = time.perf_counter() - start
+        print(f"Applied {changed} new or changed rows in {elapsed * 1000:.1f} ms")
+        return
+
+    if args.command == 'customers':
+        results = index.customers_for_supplier_lot(args.lot, args.user, args.supplier)
+    else:
+        results = index.supplier_lots_for_batch(args.batch, args.user)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(results, indent=2))
+    print(f"{len(results)} results in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()